@@ -0,0 +1,442 @@
+'''
+Benchmarks for the data processing helpers of the Illuminati Map project.
+
+Run "python benchmark.py -h" in a terminal for details.
+
+Authors: Jacob Smilg and Markus Leschly
+'''
+
+import io
+import sys
+import json
+import heapq
+import time
+import timeit
+import platform
+import argparse
+import contextlib
+import subprocess
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from get_data import format_data
+from graph import CategoryGraph, top_k
+from helpers import common_links, dict_to_nodes, sort_dict, trim_dict
+
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_NUM_RESULTS = 150
+DEFAULT_REPEATS = 5
+
+DEFAULT_PIPELINE_SIZES = [1000, 10000]
+DEFAULT_LINKS_PER_PAGE = 100
+DEFAULT_NUM_DAYS = 60
+DEFAULT_WITHIN_FRACTION = 0.05      # fraction of links that come from inside the category
+LINKS_PER_FRAGMENT = 500            # the most links the API returns for a page at once (lhlimit)
+
+
+def time_function(function, repeats=DEFAULT_REPEATS):
+    '''
+    Times a function, taking the best of several runs to reduce noise from other processes.
+
+    Parameters:
+        function: A function that takes no arguments.
+        repeats: Optional. The number of times to run the function. Defaults to DEFAULT_REPEATS.
+
+    Returns:
+        A float representing the shortest run time in seconds.
+    '''
+    return min(timeit.repeat(function, number=1, repeat=repeats))
+
+
+def make_views(num_pages, seed=0):
+    '''
+    Makes a nested dictionary of random total views shaped like the data from get_data.py, with
+    a long-tailed distribution similar to real page views and plenty of ties.
+
+    Parameters:
+        num_pages: An int representing the number of pages to make.
+        seed: Optional. An int used to seed the random number generator. Defaults to 0.
+
+    Returns:
+        A dictionary mapping page titles to dictionaries with a 'total_views' key.
+    '''
+    views = np.random.default_rng(seed).zipf(1.5, num_pages).tolist()
+    return {f'Page {i}': {'total_views': view} for i, view in enumerate(views)}
+
+
+def benchmark_sort(sizes=None, num_results=DEFAULT_NUM_RESULTS, repeats=DEFAULT_REPEATS):
+    '''
+    Compares sorting a whole dictionary by total views and slicing off the top results (how
+    sort_dict() used to work) to the partial sorts used by sort_dict() and CategoryGraph.
+
+    Parameters:
+        sizes: Optional. A list of ints representing the numbers of pages to benchmark. Defaults
+            to DEFAULT_SIZES.
+        num_results: Optional. The number of top results to ask for. Defaults to
+            DEFAULT_NUM_RESULTS.
+        repeats: Optional. The number of times to run each function. Defaults to DEFAULT_REPEATS.
+
+    Returns:
+        A list of dictionaries, one per size, with the time each method took in seconds.
+    '''
+    if sizes is None:
+        sizes = DEFAULT_SIZES
+    results = []
+    for size in sizes:
+        data = make_views(size)
+        views = np.array([entry['total_views'] for entry in data.values()])
+
+        def full_sort():
+            return sorted(data, key=lambda x: data[x]['total_views'], reverse=True)[:num_results]
+
+        def heap_sort():
+            return heapq.nlargest(num_results, data, key=lambda x: data[x]['total_views'])
+
+        result = {
+            'size': size,
+            'full sort': time_function(full_sort, repeats),
+            'sort_dict': time_function(
+                lambda: sort_dict(data, 'total_views', num_results), repeats),
+            'heapq': time_function(heap_sort, repeats),
+            'argsort': time_function(
+                lambda: np.argsort(-views, kind='stable')[:num_results], repeats),
+            'top_k': time_function(lambda: top_k(views, num_results), repeats),
+        }
+        results.append(result)
+    return results
+
+
+def make_category(num_pages, num_links, num_days=DEFAULT_NUM_DAYS,
+                  within_fraction=DEFAULT_WITHIN_FRACTION, seed=0):
+    '''
+    Makes a synthetic category shaped like the raw data returned by get_data.get_generator().
+
+    Like the real API, each page's data is split into several fragments: one with its page views,
+    and one for every LINKS_PER_FRAGMENT links to it. Links are spread over the pages with a
+    long-tailed distribution, so a few pages get most of them, and page views are drawn the same
+    way.
+
+    Parameters:
+        num_pages: An int representing the number of pages in the category.
+        num_links: An int representing the total number of links to pages in the category.
+        num_days: Optional. An int representing the number of days of page views for each page.
+            Defaults to DEFAULT_NUM_DAYS.
+        within_fraction: Optional. A float representing the fraction of links that come from
+            other pages in the category. Defaults to DEFAULT_WITHIN_FRACTION.
+        seed: Optional. An int used to seed the random number generator. Defaults to 0.
+
+    Returns:
+        A list of page dictionaries, formatted the same as the return of get_generator().
+    '''
+    rng = np.random.default_rng(seed)
+    titles = [f'Page {i}' for i in range(num_pages)]
+    dates = [f'2021-{1 + day // 28:02d}-{1 + day % 28:02d}' for day in range(num_days)]
+
+    # which page each link goes to, with a few very popular pages
+    weights = 1 / np.arange(1, num_pages + 1)
+    targets = rng.choice(num_pages, size=num_links, p=weights / weights.sum())
+    within = rng.random(num_links) < within_fraction
+    sources = np.where(within, rng.integers(0, num_pages, num_links),
+                       rng.integers(0, 10 * max(num_links // 10, 1), num_links))
+    order = np.argsort(targets, kind='stable')
+    targets, within, sources = targets[order], within[order], sources[order]
+    bounds = np.searchsorted(targets, np.arange(num_pages + 1))
+
+    daily_views = rng.zipf(1.5, num_pages) * 10
+    pages = []
+    for page, title in enumerate(titles):
+        noise = rng.integers(0, 10, num_days).tolist()
+        pages.append({'pageid': page, 'ns': 0, 'title': title,
+                      'pageviews': {date: int(daily_views[page]) + extra
+                                    for date, extra in zip(dates, noise)}})
+        links = [titles[source] if is_within else f'External page {source}'
+                 for source, is_within in zip(sources[bounds[page]:bounds[page + 1]].tolist(),
+                                              within[bounds[page]:bounds[page + 1]].tolist())]
+        for start in range(0, len(links), LINKS_PER_FRAGMENT):
+            pages.append({'pageid': page, 'ns': 0, 'title': title,
+                          'linkshere': [{'ns': 0, 'title': link}
+                                        for link in links[start:start + LINKS_PER_FRAGMENT]]})
+    return pages
+
+
+def measure(function, make_input, repeats=DEFAULT_REPEATS):
+    '''
+    Times a function and measures the peak memory it allocates. A fresh input is made for every
+    run (without being timed), since some of the helpers modify their input.
+
+    Parameters:
+        function: A function that takes one argument.
+        make_input: A function that takes no arguments and returns the input for function.
+        repeats: Optional. The number of times to time the function. Defaults to DEFAULT_REPEATS.
+
+    Returns:
+        A tuple of (seconds, peak_bytes), where seconds is the shortest run time and peak_bytes is
+        the most memory allocated at once during a separate run.
+    '''
+    times = []
+    for _ in range(repeats):
+        argument = make_input()
+        start = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - start)
+
+    argument = make_input()
+    tracemalloc.start()
+    try:
+        function(argument)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(times), peak_bytes
+
+
+def benchmark_pipeline(sizes=None, links_per_page=DEFAULT_LINKS_PER_PAGE,
+                       num_days=DEFAULT_NUM_DAYS, num_results=DEFAULT_NUM_RESULTS,
+                       repeats=DEFAULT_REPEATS):
+    '''
+    Times each stage of processing a category, from the raw API data to the nodes and links for
+    the network plot, on synthetic categories of different sizes.
+
+    Parameters:
+        sizes: Optional. A list of ints representing the numbers of pages to benchmark. Defaults
+            to DEFAULT_PIPELINE_SIZES.
+        links_per_page: Optional. The average number of links to each page. Defaults to
+            DEFAULT_LINKS_PER_PAGE.
+        num_days: Optional. The number of days of page views for each page. Defaults to
+            DEFAULT_NUM_DAYS.
+        num_results: Optional. The number of pages to trim to. Defaults to DEFAULT_NUM_RESULTS.
+        repeats: Optional. The number of times to run each stage. Defaults to DEFAULT_REPEATS.
+
+    Returns:
+        A list of dictionaries, one per stage and size, with the keys 'stage', 'pages', 'links',
+        'seconds', 'pages_per_second', 'links_per_second' and 'peak_bytes'.
+    '''
+    if sizes is None:
+        sizes = DEFAULT_PIPELINE_SIZES
+    results = []
+    for size in sizes:
+        num_links = size * links_per_page
+        raw = make_category(size, num_links, num_days)
+        # format_data prints its progress, which would get in the way of the results
+        with contextlib.redirect_stdout(io.StringIO()):
+            formatted = format_data(raw)
+        graph = common_links(CategoryGraph.from_dict(formatted))
+
+        def copy_links(data=formatted):
+            # a copy deep enough that the helpers can't change the original
+            return {title: dict(entry, linkshere_within_category=list(
+                entry['linkshere_within_category'])) for title, entry in data.items()}
+
+        def quiet_format_data(data):
+            with contextlib.redirect_stdout(io.StringIO()):
+                return format_data(data)
+
+        stages = [
+            ('format_data', quiet_format_data, lambda: raw),
+            ('common_links', common_links, copy_links),
+            ('sort_dict', lambda data: sort_dict(data, 'total_views', num_results), copy_links),
+            ('trim_dict', lambda data: trim_dict(data, num_results), copy_links),
+            ('dict_to_nodes', dict_to_nodes,
+             lambda: trim_dict(copy_links(), num_results)),
+            ('graph.from_dict', CategoryGraph.from_dict, lambda: formatted),
+            ('graph.common_links', common_links, lambda: graph),
+            ('graph.sort', lambda data: sort_dict(data, num_results=num_results),
+             lambda: graph),
+            ('graph.trim', lambda data: trim_dict(data, num_results), lambda: graph),
+            ('graph.to_nodes', dict_to_nodes, lambda: trim_dict(graph, num_results)),
+        ]
+        for stage, function, make_input in stages:
+            seconds, peak_bytes = measure(function, make_input, repeats)
+            results.append({
+                'stage': stage,
+                'pages': size,
+                'links': num_links,
+                'seconds': seconds,
+                'pages_per_second': size / seconds if seconds else float('inf'),
+                'links_per_second': num_links / seconds if seconds else float('inf'),
+                'peak_bytes': peak_bytes,
+            })
+    return results
+
+
+def current_commit():
+    '''
+    Returns:
+        A string representing the git commit the benchmarks are being run on, or None if it
+        can't be found.
+    '''
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results, path, parameters):
+    '''
+    Saves benchmark results to a JSON file, along with enough information about how they were
+    made to compare them with results from other commits.
+
+    Parameters:
+        results: A list of dictionaries, such as the return of benchmark_pipeline().
+        path: A string representing the path to save the results (.json) to.
+        parameters: A dictionary of the parameters the benchmarks were run with.
+    '''
+    with open(path, 'w') as file:
+        json.dump({
+            'commit': current_commit(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.platform(),
+            'parameters': parameters,
+            'results': results,
+        }, file, indent=2)
+
+
+def compare_results(results, path):
+    '''
+    Compares benchmark results with ones saved by save_results(), for example from a previous
+    commit.
+
+    Parameters:
+        results: A list of dictionaries, such as the return of benchmark_pipeline().
+        path: A string representing the path of the saved results (.json) to compare with.
+
+    Returns:
+        A list of dictionaries with the keys 'stage', 'pages', 'old', 'new' and 'speedup' for each
+        stage and size in both sets of results, with times in seconds.
+    '''
+    with open(path) as file:
+        saved = json.load(file)
+    old_times = {(result['stage'], result['pages']): result['seconds']
+                 for result in saved['results']}
+    comparison = []
+    for result in results:
+        old = old_times.get((result['stage'], result['pages']))
+        if old is not None:
+            comparison.append({'stage': result['stage'], 'pages': result['pages'], 'old': old,
+                               'new': result['seconds'],
+                               'speedup': old / result['seconds'] if result['seconds'] else 0})
+    return comparison
+
+
+def print_results(results):
+    '''
+    Prints benchmark results as a table, with times in milliseconds.
+
+    Parameters:
+        results: A list of dictionaries with the same keys, such as the return of
+            benchmark_sort().
+    '''
+    if not results:
+        return
+    columns = list(results[0])
+    print(''.join(column.rjust(19) for column in columns))
+    for result in results:
+        print(''.join(format_value(column, value).rjust(19) for column, value in result.items()))
+
+
+def format_value(column, value):
+    '''
+    Formats a value in a table of benchmark results.
+
+    Parameters:
+        column: A string representing the name of the value's column.
+        value: The value to format.
+
+    Returns:
+        A string representing the value.
+    '''
+    if column.endswith('_per_second'):
+        return f'{value:,.0f}'
+    if column.endswith('bytes'):
+        return f'{value / 1024 / 1024:.2f} MB'
+    if column == 'speedup':
+        return f'{value:.2f}x'
+    if isinstance(value, float):
+        return f'{value * 1000:.3f}'
+    return str(value)
+
+
+def get_parser(name):
+    '''
+    Return the command-line argument parser used for this script.
+
+    Args:
+        name: A string representing the name of the script.
+
+    Returns:
+        An argparse.ArgumentParser for this script.
+    '''
+    parser = argparse.ArgumentParser(name)
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    sort_parser = subparsers.add_parser('sort', help='Compare ways of finding the most viewed '
+                                        'pages')
+    sort_parser.add_argument('-s', '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                             help=f'Numbers of pages to benchmark (default: {DEFAULT_SIZES})')
+
+    pipeline_parser = subparsers.add_parser('pipeline', help='Time each stage of processing '
+                                            'the data')
+    pipeline_parser.add_argument('-s', '--sizes', type=int, nargs='+',
+                                 default=DEFAULT_PIPELINE_SIZES,
+                                 help='Numbers of pages to benchmark '
+                                 f'(default: {DEFAULT_PIPELINE_SIZES})')
+    pipeline_parser.add_argument('-l', '--links-per-page', type=int,
+                                 default=DEFAULT_LINKS_PER_PAGE,
+                                 help='Average number of links to each page '
+                                 f'(default: {DEFAULT_LINKS_PER_PAGE})')
+    pipeline_parser.add_argument('-d', '--days', type=int, default=DEFAULT_NUM_DAYS,
+                                 help=f'Number of days of page views (default: {DEFAULT_NUM_DAYS})')
+    pipeline_parser.add_argument('-o', '--output', type=str, default=None,
+                                 help='Path to save the results (.json) to')
+    pipeline_parser.add_argument('-c', '--compare', type=str, default=None,
+                                 help='Path of saved results (.json) to compare with')
+
+    for subparser in (sort_parser, pipeline_parser):
+        subparser.add_argument('-n', '--num-results', type=int, default=DEFAULT_NUM_RESULTS,
+                               help='Number of top results to ask for '
+                               f'(default: {DEFAULT_NUM_RESULTS})')
+        subparser.add_argument('-r', '--repeats', type=int, default=DEFAULT_REPEATS,
+                               help='Number of times to run each function '
+                               f'(default: {DEFAULT_REPEATS})')
+    return parser
+
+
+def main(args):
+    '''
+    Main function for running the benchmarks.
+
+    Parameters:
+        args: A list of command line arguments. Run "python benchmark.py -h" in a terminal for
+            details.
+    '''
+    parsed_args = get_parser(args[0]).parse_args(args[1:])
+    if parsed_args.benchmark == 'sort':
+        print(f'Top {parsed_args.num_results} by total views (times in ms):')
+        print_results(benchmark_sort(parsed_args.sizes, parsed_args.num_results,
+                                     parsed_args.repeats))
+        return
+
+    results = benchmark_pipeline(parsed_args.sizes, parsed_args.links_per_page,
+                                 parsed_args.days, parsed_args.num_results, parsed_args.repeats)
+    print('Pipeline stages (times in ms):')
+    print_results(results)
+    if parsed_args.output is not None:
+        save_results(results, parsed_args.output, {
+            'sizes': parsed_args.sizes,
+            'links_per_page': parsed_args.links_per_page,
+            'days': parsed_args.days,
+            'num_results': parsed_args.num_results,
+            'repeats': parsed_args.repeats,
+        })
+    if parsed_args.compare is not None:
+        print(f'\nCompared with {parsed_args.compare}:')
+        print_results(compare_results(results, parsed_args.compare))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,345 @@
+'''
+A persistent cache of responses from the Wikipedia API.
+
+Responses are stored in a SQLite database keyed on the full set of request parameters (including
+continue parameters like gcmcontinue and lhcontinue), so re-running get_data.py for a category
+that has already been downloaded doesn't need to send any requests. The cache can also be used
+offline, where it stands in for Wikipedia completely.
+
+Authors: Jacob Smilg and Markus Leschly
+'''
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024   # 512 MB
+
+
+class CacheMiss(KeyError):
+    '''
+    Raised when a request isn't in the cache while running offline.
+    '''
+
+
+def request_key(params):
+    '''
+    Gets the key a request is stored under in the cache.
+
+    The parameters MediaWiki.wiki_request() fills in by itself ('format' and 'action') are filled
+    in here as well, so the same request gets the same key whether or not they were given.
+
+    Parameters:
+        params: A dictionary of API request parameters.
+
+    Returns:
+        A string representing the SHA-256 hash of the parameters.
+    '''
+    params = dict(params)
+    params['format'] = 'json'
+    params.setdefault('action', 'query')
+    encoded = json.dumps(params, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class LRUStore:
+    '''
+    A size-bounded, persistent store of encoded values in a SQLite table, shared by the response
+    and stage caches.
+
+    Each value is stored under a key, with an optional tag to group values by (such as the stage
+    that made them). When the store grows past its maximum size, the least recently used values
+    are removed until it fits again. A single store can safely be shared between threads.
+
+    Attributes:
+        path: A string representing the path of the SQLite database.
+        table: A string representing the name of the table the values are stored in.
+        max_bytes: An int representing the most bytes of values to keep, or None for no limit.
+    '''
+
+    def __init__(self, path, table, max_bytes=DEFAULT_MAX_BYTES):
+        '''
+        Opens (and creates, if needed) a store.
+
+        Parameters:
+            path: A string representing the path of the SQLite database.
+            table: A string representing the name of the table to store values in.
+            max_bytes: Optional. The most bytes of values to keep. Defaults to DEFAULT_MAX_BYTES.
+        '''
+        self.path = path
+        self.table = table
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {table} ('
+                'key TEXT PRIMARY KEY, tag TEXT, value BLOB NOT NULL, size INTEGER NOT NULL, '
+                'created REAL NOT NULL, last_used REAL NOT NULL)')
+            self._connection.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_last_used ON {table} (last_used)')
+            self._connection.execute(f'CREATE INDEX IF NOT EXISTS {table}_tag ON {table} (tag)')
+        self._size = self._connection.execute(
+            f'SELECT COALESCE(SUM(size), 0) FROM {table}').fetchone()[0]
+
+    def get(self, key, ttl=None):
+        '''
+        Looks up a value, marking it as used.
+
+        Parameters:
+            key: A string representing the key of the value.
+            ttl: Optional. The number of seconds the value stays valid for. Expired values are
+                removed. Defaults to None, which means values never expire.
+
+        Returns:
+            The bytes of the value, or None if it isn't stored or has expired.
+        '''
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                f'SELECT value, size, created FROM {self.table} WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            value, size, created = row
+            with self._connection:
+                if ttl is not None and now - created > ttl:
+                    self._connection.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                    self._size -= size
+                    return None
+                self._connection.execute(
+                    f'UPDATE {self.table} SET last_used = ? WHERE key = ?', (now, key))
+        return value
+
+    def put(self, key, value, tag=None):
+        '''
+        Stores a value, removing the least recently used values if the store is now too big.
+        Values bigger than the whole store aren't stored.
+
+        Parameters:
+            key: A string representing the key to store the value under.
+            value: The bytes of the value.
+            tag: Optional. A string to group the value by, for delete(). Defaults to None.
+
+        Returns:
+            True if the value was stored.
+        '''
+        size = len(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return False
+        now = time.time()
+        with self._lock, self._connection:
+            old = self._connection.execute(
+                f'SELECT size FROM {self.table} WHERE key = ?', (key,)).fetchone()
+            if old is not None:
+                self._size -= old[0]
+            self._connection.execute(
+                f'INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?, ?)',
+                (key, tag, value, size, now, now))
+            self._size += size
+            self._evict()
+        return True
+
+    def _evict(self):
+        '''
+        Removes the least recently used values until the store fits in max_bytes. Must be called
+        with the lock held, inside a transaction.
+        '''
+        if self.max_bytes is None:
+            return
+        while self._size > self.max_bytes:
+            rows = self._connection.execute(
+                f'SELECT key, size FROM {self.table} ORDER BY last_used LIMIT 100').fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._size <= self.max_bytes:
+                    break
+                self._connection.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                self._size -= size
+
+    def delete(self, tag=None, key=None):
+        '''
+        Removes stored values.
+
+        Parameters:
+            tag: Optional. A string representing a tag to remove every value of. Defaults to None.
+            key: Optional. A string representing the key of a single value to remove. Defaults
+                to None.
+            If neither is given, every value is removed.
+
+        Returns:
+            The number of values removed.
+        '''
+        conditions = []
+        values = []
+        if tag is not None:
+            conditions.append('tag = ?')
+            values.append(tag)
+        if key is not None:
+            conditions.append('key = ?')
+            values.append(key)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        with self._lock, self._connection:
+            removed, size = self._connection.execute(
+                f'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}{where}',
+                values).fetchone()
+            self._connection.execute(f'DELETE FROM {self.table}{where}', values)
+            self._size -= size
+        return removed
+
+    def size(self):
+        '''
+        Returns:
+            The number of bytes of values stored.
+        '''
+        return self._size
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+    def close(self):
+        '''
+        Closes the database connection.
+        '''
+        self._connection.close()
+
+
+class ResponseCache:
+    '''
+    A size-bounded, persistent cache of API responses with an optional time to live.
+
+    When the cache grows past its maximum size, the least recently used responses are removed
+    until it fits again. A single cache can safely be shared between threads.
+
+    Attributes:
+        path: A string representing the path of the SQLite database.
+        ttl: A number representing the number of seconds a response stays valid for, or None if
+            responses never expire.
+        max_bytes: An int representing the most bytes of responses to keep, or None for no limit.
+        hits: The number of requests answered by the cache.
+        misses: The number of requests that weren't in the cache.
+    '''
+
+    def __init__(self, path, ttl=None, max_bytes=DEFAULT_MAX_BYTES):
+        '''
+        Opens (and creates, if needed) a response cache.
+
+        Parameters:
+            path: A string representing the path of the SQLite database to store responses in.
+            ttl: Optional. The number of seconds a response stays valid for. Defaults to None,
+                which means responses never expire.
+            max_bytes: Optional. The most bytes of responses to keep. Defaults to
+                DEFAULT_MAX_BYTES.
+        '''
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._store = LRUStore(path, 'responses', max_bytes)
+
+    def get(self, params):
+        '''
+        Looks up the response to a request.
+
+        Parameters:
+            params: A dictionary of API request parameters.
+
+        Returns:
+            A dictionary of the cached response, or None if the request isn't cached or its
+            response has expired.
+        '''
+        encoded = self._store.get(request_key(params), self.ttl)
+        if encoded is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(encoded)
+
+    def put(self, params, response):
+        '''
+        Stores the response to a request, removing the least recently used responses if the
+        cache is now too big.
+
+        Parameters:
+            params: A dictionary of API request parameters.
+            response: A dictionary of the parsed JSON response.
+        '''
+        encoded = json.dumps(response, separators=(',', ':')).encode('utf-8')
+        self._store.put(request_key(params), encoded)
+
+    def size(self):
+        '''
+        Returns:
+            The number of bytes of responses stored in the cache.
+        '''
+        return self._store.size()
+
+    def __len__(self):
+        return len(self._store)
+
+    def clear(self):
+        '''
+        Removes every response from the cache.
+        '''
+        self._store.delete()
+
+    def close(self):
+        '''
+        Closes the database connection.
+        '''
+        self._store.close()
+
+
+class CachedWiki:
+    '''
+    Wraps a MediaWiki instance so wiki_request() is answered from a ResponseCache when possible.
+
+    In offline mode no requests are sent at all; requests that aren't in the cache raise CacheMiss,
+    and no MediaWiki instance is needed.
+
+    Attributes:
+        wiki: The wrapped MediaWiki instance, or None when offline.
+        cache: The ResponseCache to use.
+        offline: A boolean that is True if only the cache should be used.
+    '''
+
+    def __init__(self, wiki, cache, offline=False):
+        self.wiki = wiki
+        self.cache = cache
+        self.offline = offline
+
+    def wiki_request(self, params):
+        '''
+        Gets the response to a request from the cache, or from the wrapped MediaWiki instance if
+        it isn't cached (in which case the response is added to the cache, if it holds a
+        'query' or 'batchcomplete').
+
+        Parameters:
+            params: A dictionary of API request parameters.
+
+        Returns:
+            A dictionary of the parsed JSON response.
+        '''
+        # copy the parameters, since MediaWiki.wiki_request() adds to them
+        params = dict(params)
+        response = self.cache.get(params)
+        if response is not None:
+            return response
+        if self.offline:
+            raise CacheMiss(f'Request is not in the cache: {params}')
+        response = self.wiki.wiki_request(dict(params))
+        # only cache complete answers: errors (such as being rate limited) and the empty
+        # dictionary MediaWiki returns when it can't parse a response shouldn't be replayed later
+        if 'error' not in response and ('query' in response or 'batchcomplete' in response):
+            self.cache.put(params, response)
+        return response
+
+    def __getattr__(self, name):
+        if self.wiki is None:
+            raise AttributeError(name)
+        return getattr(self.wiki, name)
@@ -4,17 +4,41 @@ Data acquisition code for the Illuminati Map project, our SoftDes Spring 2021 mi
 Authors: Jacob Smilg and Markus Leschly
 '''
 
+import os
 import sys
+import time
 import pickle
 import argparse
-from datetime import timedelta, datetime
+import threading
+from collections import deque
+from datetime import timedelta, datetime, timezone
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 from mediawiki import MediaWiki
 from helpers import common_links
+from rate_limit import AdaptiveLimiter, AdaptiveWiki, RateLimitedWiki, TokenBucket
+from cache import CachedWiki, ResponseCache
+from metrics import PROMETHEUS_SUFFIX, CrawlMetrics, MeteredWiki
+from storage import load_data, save_data
+from profiling import profile, traced
+from snapshots import SnapshotStore
+from wiki_client import WikiClient
 
 
 DEFAULT_CATEGORY = 'American_billionaires'
 DEFAULT_RATE_LIMIT = True
 DEFAULT_RATE_LIMIT_WAIT = 1.0   # seconds
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_CHECKPOINT_INTERVAL = 30    # seconds between checkpoint saves
+# each checkpoint rewrites all of the data so far, so saves are spaced out to at least this many
+# times as long as the last one took, keeping them to a small part of a long crawl
+CHECKPOINT_SAVE_RATIO = 10
+CHECKPOINT_SUFFIX = '.checkpoint'
+# how a crawl was listing its pages, saved in its checkpoints: with the categorymembers generator
+# (crawl_category() with a depth of 0), by title (crawl_category() with subcategories), or by
+# title in separate streams (crawl_streams())
+CRAWL_MODES = ('generator', 'titles', 'streams')
+DEFAULT_CACHE_SIZE = 512    # megabytes
+PAGEVIEW_DATE_FORMAT = '%Y-%m-%d'
 
 GENERAL_SEARCH_PARAMS = {
     'format': 'json',
@@ -29,26 +53,115 @@ GENERAL_SEARCH_PARAMS = {
     'lhlimit': 500,
 }
 
+# the same properties as GENERAL_SEARCH_PARAMS, but for a list of titles instead of a generator
+TITLE_SEARCH_PARAMS = {key: value for key, value in GENERAL_SEARCH_PARAMS.items()
+                       if key != 'generator' and not key.startswith('gcm')}
+TITLES_PER_REQUEST = 50     # the most titles the API accepts in one request
 
-def get_generator(wiki, category):
+ARTICLE_NAMESPACE = 0
+CATEGORY_NAMESPACE = 14
+PAGEVIEW_SEARCH_PARAMS = {
+    'format': 'json',
+    'formatversion': 2,
+    'redirects': 1,
+    'prop': 'pageviews',
+}
+LINKSHERE_SEARCH_PARAMS = {
+    'format': 'json',
+    'formatversion': 2,
+    'redirects': 1,
+    'prop': 'linkshere',
+    'lhnamespace': 0,   # article pages only
+    'lhlimit': 500,
+}
+# the separate request streams used by crawl_streams(), which together get the same properties as
+# TITLE_SEARCH_PARAMS
+STREAM_SEARCH_PARAMS = {
+    'pageviews': dict(PAGEVIEW_SEARCH_PARAMS, pvipdays=GENERAL_SEARCH_PARAMS['pvipdays']),
+    'linkshere': LINKSHERE_SEARCH_PARAMS,
+}
+MEMBER_SEARCH_PARAMS = {
+    'format': 'json',
+    'formatversion': 2,
+    'list': 'categorymembers',
+    'cmnamespace': f'{ARTICLE_NAMESPACE}|{CATEGORY_NAMESPACE}',   # articles and subcategories
+    'cmlimit': 500,
+}
+
+
+class CheckpointTimer:
+    '''
+    Decides when a crawl saves its next checkpoint.
+
+    Every checkpoint rewrites all of the data gathered so far, so saving after a set number of
+    requests would take longer and longer as the crawl goes on. Instead, checkpoints are saved at
+    most every interval seconds, and the time until the next save is stretched to
+    CHECKPOINT_SAVE_RATIO times as long as the last save took, so saving never takes more than a
+    small part of the crawl.
+
+    Attributes:
+        interval: A number representing the shortest time between saves, in seconds.
+    '''
+
+    def __init__(self, interval=DEFAULT_CHECKPOINT_INTERVAL):
+        '''
+        Starts timing a crawl, with the first save due after interval seconds.
+
+        Parameters:
+            interval: Optional. The shortest time between saves, in seconds. Defaults to
+                DEFAULT_CHECKPOINT_INTERVAL.
+        '''
+        self.interval = interval
+        self._next_save = time.monotonic() + interval
+
+    def save_if_due(self, save):
+        '''
+        Saves a checkpoint if one is due, and schedules the next one.
+
+        Parameters:
+            save: A function that saves the checkpoint when called without arguments.
+
+        Returns:
+            A boolean that is True if the checkpoint was saved.
+        '''
+        start = time.monotonic()
+        if start < self._next_save:
+            return False
+        save()
+        now = time.monotonic()
+        self._next_save = now + max(self.interval, CHECKPOINT_SAVE_RATIO * (now - start))
+        return True
+
+
+class CrawlInterrupted(Exception):
+    '''
+    Raised by a crawl running in another thread when it is asked to stop (such as after Ctrl-C),
+    once its checkpoint has been saved.
+    '''
+
+
+def iter_generator(wiki, category, cont=None):
     '''
     Gets the titles, page ids, views from the last 60 days, and links to the Wikipedia pages in a
-    specified category. Stores the acquired data as returned by the API in a list of dictionaries
-    to be processed elsewhere.
+    specified category, yielding each API return as soon as it arrives instead of storing all of
+    them.
 
-    For details on the format returned by the API, see the official documentation, and
-    be sure it specifies format version 2. This function uses a "generator," for which info can be
-    found in the official documentation.
+    Each yielded batch can be folded into a formatted dictionary with add_batch() and thrown
+    away, so the raw API data never has to be held in memory all at once. Any processing done by
+    the caller between batches also overlaps with the rate limiting wait before the next request.
 
     Parameters:
         wiki: A MediaWiki instance configured to access Wikipedia. It would be smart to rate limit
             it as well, since this function can potentially send a large amount of requests.
         category: A string representing the name of the Wikipedia category for data to be gathered
             from.
+        cont: Optional. A dictionary of continue parameters returned by the API to pick up a
+            previous run from. Defaults to None, which starts from the beginning of the category.
 
-    Returns:
-        A list of dictionaries containing the responses from Wikipedia. A large amount of this data
-        is empty, and should be trimmed and formatted elsewhere.
+    Yields:
+        A tuple of (pages, cont), where pages is the list of page dictionaries from one API return,
+        and cont is the dictionary of continue parameters needed to request the next batch. cont
+        is empty for the last batch.
     '''
     # set up a dictionary of request parameters for the generator.
     search_params = {
@@ -59,13 +172,11 @@ def get_generator(wiki, category):
 
     print(f'Getting information for category: {category}...')
 
-    # set up the list to store the API data in
-    pages = []
-
     # used for "continuing" a request; see API documentation for a proper explanation but basically
     # sometimes we get a "continue" key in the API return that lets us get more data starting from
     # where the previous request left off if there was too much to fit in one API return.
-    cont = dict()
+    if cont is None:
+        cont = dict()
 
     # stuff to keep track of progress to be sure nothing got stuck
     start_time = datetime.now()
@@ -79,9 +190,7 @@ def get_generator(wiki, category):
         params = search_params.copy()
         params.update(cont)
 
-        # get data from the API and tack what it gives onto the end of our list
         result = wiki.wiki_request(params)
-        pages.extend(result['query']['pages'])
 
         # figure out how much time has passed since the function started, and remove milliseconds
         # from it so it looks nice for printing
@@ -98,15 +207,236 @@ def get_generator(wiki, category):
                 print(f'[{elapsed_time_str}]   Sending request #{requests_count}...'.ljust(80),
                       end='\r', flush=True)
                 last_update = elapsed_time
-                requests_count += 1
+            requests_count += 1
         else:
             # no continue returned from API means we're done
             print(f'[{elapsed_time_str}]   Done getting data!'.ljust(80))
+            cont = dict()
             finished = True
 
+        yield result['query']['pages'], cont
+
+
+def get_generator(wiki, category):
+    '''
+    Gets the titles, page ids, views from the last 60 days, and links to the Wikipedia pages in a
+    specified category. Stores the acquired data as returned by the API in a list of dictionaries
+    to be processed elsewhere.
+
+    For details on the format returned by the API, see the official documentation, and
+    be sure it specifies format version 2. This function uses a "generator," for which info can be
+    found in the official documentation.
+
+    This keeps every API return in memory until the end; iter_generator() is the streaming
+    version of this function.
+
+    Parameters:
+        wiki: A MediaWiki instance configured to access Wikipedia. It would be smart to rate limit
+            it as well, since this function can potentially send a large amount of requests.
+        category: A string representing the name of the Wikipedia category for data to be gathered
+            from.
+
+    Returns:
+        A list of dictionaries containing the responses from Wikipedia. A large amount of this data
+        is empty, and should be trimmed and formatted elsewhere.
+    '''
+    pages = []
+    for batch, _ in iter_generator(wiki, category):
+        pages.extend(batch)
     return pages
 
 
+def category_title(category):
+    '''
+    Gets the full title of a category the way the API returns it, such as
+    'Category:American billionaires' for 'American_billionaires'.
+
+    Parameters:
+        category: A string representing the name of a category, with or without the 'Category:'
+            prefix, and with either spaces or underscores.
+
+    Returns:
+        A string representing the full title of the category.
+    '''
+    category = category.replace('_', ' ')
+    if not category.startswith('Category:'):
+        category = f'Category:{category}'
+    return category
+
+
+def iter_category_members(wiki, category):
+    '''
+    Lists the articles and subcategories in a category, without getting any data about them.
+
+    Parameters:
+        wiki: A MediaWiki instance configured to access Wikipedia.
+        category: A string representing the name of the Wikipedia category to list.
+
+    Yields:
+        A dictionary for each member of the category, with the keys 'pageid', 'ns' and 'title'.
+        Subcategories have an 'ns' of CATEGORY_NAMESPACE.
+    '''
+    search_params = {'cmtitle': category_title(category)}
+    search_params.update(MEMBER_SEARCH_PARAMS)
+
+    cont = dict()
+    while True:
+        params = search_params.copy()
+        params.update(cont)
+        result = wiki.wiki_request(params)
+        yield from result['query']['categorymembers']
+        if not result.get('continue', False):
+            break
+        cont = result['continue']
+
+
+def walk_category_tree(wiki, category, max_depth):
+    '''
+    Finds every article in a category and in its subcategories, down to a maximum depth.
+
+    Categories are visited breadth-first, and each category and article is only included once,
+    even when it can be reached through several subcategories (or a loop of subcategories).
+
+    Parameters:
+        wiki: A MediaWiki instance configured to access Wikipedia.
+        category: A string representing the name of the category to start from.
+        max_depth: An int representing how many levels of subcategories to go into. 0 only
+            includes the articles directly in the category.
+
+    Returns:
+        A tuple of (categories, titles), where categories is a list of the full titles of every
+        category visited, and titles is a list of the titles of every article found, both in the
+        order they were found.
+    '''
+    root = category_title(category)
+    visited_categories = {root}
+    categories = []
+    titles = {}     # a dict instead of a set so the order the articles were found in is kept
+    frontier = deque([(root, 0)])
+    while frontier:
+        current, depth = frontier.popleft()
+        categories.append(current)
+        print(f'Listing {current} (depth {depth})...'.ljust(80), end='\r', flush=True)
+        for member in iter_category_members(wiki, current):
+            if member['ns'] == CATEGORY_NAMESPACE:
+                if depth < max_depth and member['title'] not in visited_categories:
+                    visited_categories.add(member['title'])
+                    frontier.append((member['title'], depth + 1))
+            else:
+                titles.setdefault(member['title'], None)
+    print(f'Found {len(titles)} pages in {len(categories)} categories.'.ljust(80))
+    return categories, list(titles)
+
+
+def iter_titles(wiki, titles, state=None, search_params=None):
+    '''
+    Gets the page ids, views from the last 60 days, and links to a list of Wikipedia pages,
+    TITLES_PER_REQUEST pages at a time, yielding each API return as soon as it arrives.
+
+    Parameters:
+        wiki: A MediaWiki instance configured to access Wikipedia.
+        titles: A list of strings representing the titles of the pages to get data for.
+        state: Optional. A dictionary yielded by a previous run of this function to pick up from.
+            Defaults to None, which starts from the first title.
+        search_params: Optional. A dictionary of request parameters to use instead of
+            TITLE_SEARCH_PARAMS, for getting different properties of the pages. Defaults to None.
+
+    Yields:
+        A tuple of (pages, state), where pages is the list of page dictionaries from one API return,
+        formatted the same as the ones from iter_generator(), and state is the dictionary needed
+        to pick up from the next request. state is empty for the last batch.
+    '''
+    if not state:
+        state = {'batch': 0, 'continue': {}}
+    if search_params is None:
+        search_params = TITLE_SEARCH_PARAMS
+    batch_index = state['batch']
+    cont = state['continue']
+    num_batches = -(-len(titles) // TITLES_PER_REQUEST)
+
+    while batch_index < num_batches:
+        print(f'Getting data for batch {batch_index + 1}/{num_batches}...'.ljust(80),
+              end='\r', flush=True)
+        start = batch_index * TITLES_PER_REQUEST
+        params = {'titles': '|'.join(titles[start:start + TITLES_PER_REQUEST])}
+        params.update(search_params)
+        params.update(cont)
+        result = wiki.wiki_request(params)
+
+        if result.get('continue', False):
+            cont = result['continue']
+        else:
+            batch_index += 1
+            cont = {}
+
+        if batch_index < num_batches:
+            next_state = {'batch': batch_index, 'continue': cont}
+        else:
+            print('Done getting data!'.ljust(80))
+            next_state = {}
+        yield result['query'].get('pages', []), next_state
+
+
+def add_batch(formatted_data, batch):
+    '''
+    Folds one batch of raw page data from the Wikipedia API into a dictionary being built by
+    format_data() or format_batches().
+
+    Removes any data for "List" pages, which are detected by checking if "List of" is in the page
+    title. This approach probably isn't flawless, but it works for the scope of this project.
+
+    Parameters:
+        formatted_data: A dictionary of partially formatted data to add to. It is modified in
+            place.
+        batch: A list of page dictionaries from a Wikipedia API return.
+
+    Returns:
+        The formatted_data dictionary, for convenience.
+    '''
+    for page in batch:
+        title = page['title']
+        # list pages don't have anything to do with our project, so we ignore them
+        if 'List of' in title:
+            continue
+        # if a page hasn't been put in the new dictionary, make a new entry for it
+        entry = formatted_data.get(title)
+        if entry is None:
+            entry = {'linkshere': [], 'pageviews': {}, 'pageid': page['pageid']}
+            formatted_data[title] = entry
+        # add to the category member's entry - sometimes the generator gives us links, sometimes
+        # it gives us pageviews, so we need to determine what we have and slap it into the new
+        # dictionary
+        if page.get('linkshere', False):
+            entry['linkshere'].extend([linkpage['title'] for linkpage in page['linkshere']])
+        if page.get('pageviews', False):
+            # since pageviews is formatted as a dictionary with unique dates as keys, we don't have
+            # to worry about .update() replacing any data.
+            entry['pageviews'].update(page['pageviews'])
+    return formatted_data
+
+
+@traced()
+def finish_formatting(formatted_data):
+    '''
+    Does the processing that can only happen once every batch has been added with add_batch():
+    totals the page views of each page and finds the common links within the category.
+
+    Parameters:
+        formatted_data: A dictionary built by add_batch().
+
+    Returns:
+        The finished dictionary, formatted as described in format_data().
+    '''
+    for entry in formatted_data.values():
+        entry['total_views'] = sum(views for views in entry['pageviews'].values()
+                                   if views is not None)
+    print('Finding common links...')
+    formatted_data = common_links(formatted_data)
+    print('Done formatting data!')
+    return formatted_data
+
+
+@traced()
 def format_data(data):
     '''
     Formats a list of raw data from multiple Wikipedia API requests into a usable dictionary.
@@ -130,42 +460,555 @@ def format_data(data):
 
     '''
     print('Formatting data...')
+    return finish_formatting(add_batch({}, data))
+
+
+def format_batches(batches):
+    '''
+    Formats raw data from Wikipedia API requests into a usable dictionary one batch at a time, so
+    each batch can be discarded as soon as it has been added.
+
+    Parameters:
+        batches: An iterable of lists of page dictionaries, such as the pages yielded by
+            iter_generator().
+
+    Returns:
+        A dictionary formatted the same as the return of format_data().
+    '''
     formatted_data = {}
-    # loop through the request data and consolidate it into a single dictionary
-    for page in data:
-        title = page['title']
-        # list pages don't have anything to do with our project, so we ignore them
-        if 'List of' in title:
-            continue
-        # if a page hasn't been put in the new dictionary
-        if not formatted_data.get(title, False):
-            # make a new entry for the category member
-            formatted_data[title] = {'linkshere': [], 'pageviews': {}}
-            formatted_data[title]['pageid'] = page['pageid']
-        # add to the category member's entry - sometimes the generator gives us links, sometimes
-        # it gives us pageviews, so we need to determine what we have and slap it into the new
-        # dictionary
-        if page.get('linkshere', False):
-            formatted_data[title]['linkshere'].extend(
-                [linkpage['title'] for linkpage in page['linkshere']])
-        if page.get('pageviews', False):
-            # since pageviews is formatted as a dictionary with unique dates as keys, we don't have
-            # to worry about .update() replacing any data.
-            formatted_data[title]['pageviews'].update(page['pageviews'])
-
-    # after we get all the raw data organized, we do a small amount of processing to get the total
-    # page views and the common links within the category.
-    for page in formatted_data:
-        page_views = {date: views for date, views in
-                      formatted_data[page]['pageviews'].items() if views is not None}
-        formatted_data[page]['total_views'] = sum(list(page_views.values()))
-    print('Finding common links...')
-    formatted_data = common_links(formatted_data)
-    print('Done formatting data!')
+    for batch in batches:
+        add_batch(formatted_data, batch)
+    return finish_formatting(formatted_data)
+
+
+def latest_pageview_date(data):
+    '''
+    Finds the most recent day that a dataset has page views for.
+
+    Parameters:
+        data: A dictionary of Wikipedia category data as formatted by format_data().
+
+    Returns:
+        A date representing the most recent day in any page's 'pageviews', or None if there are
+        no page views in the dataset.
+    '''
+    latest = max((date for entry in data.values() for date in entry['pageviews']), default=None)
+    if latest is None:
+        return None
+    return datetime.strptime(latest, PAGEVIEW_DATE_FORMAT).date()
+
+
+def refresh_pageviews(wiki, data, today=None, window=GENERAL_SEARCH_PARAMS['pvipdays']):
+    '''
+    Updates the page views in an existing dataset, only requesting the days that are missing.
+
+    Links aren't requested again. The most recent day already in the dataset is requested again
+    too, since Wikipedia may not have had complete numbers for it yet. Days older than the window
+    are dropped, so 'total_views' keeps covering the same number of days as a full crawl. Only the
+    pages whose page views changed have their 'total_views' recalculated.
+
+    The request for the last few days of page views stays the same from one day to the next, but
+    its answer doesn't, and the API has no way of asking for the days up to a set date. So if the
+    wiki is a CachedWiki, the requests are sent past its cache, which would otherwise keep
+    answering with the page views from the first time they were requested.
+
+    Parameters:
+        wiki: A MediaWiki instance configured to access Wikipedia. It can't be an offline
+            CachedWiki.
+        data: A dictionary of Wikipedia category data as formatted by format_data(). It is modified
+            in place.
+        today: Optional. A date representing the current day (in UTC, like Wikipedia's page view
+            data). Defaults to None, which uses the current date.
+        window: Optional. An int representing the number of days of page views to keep, or None
+            to keep every day. Defaults to the number of days requested by a full crawl.
+
+    Returns:
+        A set of the titles of the pages whose page views changed.
+    '''
+    if isinstance(wiki, CachedWiki):
+        if wiki.offline:
+            raise ValueError('Page views can\'t be updated offline')
+        wiki = wiki.wiki
+    if today is None:
+        today = datetime.now(timezone.utc).date()
+    max_days = GENERAL_SEARCH_PARAMS['pvipdays']
+    latest = latest_pageview_date(data)
+    if latest is None:
+        num_days = max_days
+    else:
+        num_days = min(max_days, max((today - latest).days + 1, 1))
+
+    search_params = {'pvipdays': num_days}
+    search_params.update(PAGEVIEW_SEARCH_PARAMS)
+    print(f'Getting the last {num_days} days of page views for {len(data)} pages...')
+
+    changed = set()
+    for batch, _ in iter_titles(wiki, list(data), search_params=search_params):
+        for page in batch:
+            entry = data.get(page['title'])
+            if entry is None or not page.get('pageviews', False):
+                continue
+            for date, views in page['pageviews'].items():
+                if entry['pageviews'].get(date, False) != views:
+                    entry['pageviews'][date] = views
+                    changed.add(page['title'])
+
+    if window is not None:
+        cutoff = (today - timedelta(days=window)).strftime(PAGEVIEW_DATE_FORMAT)
+        for title, entry in data.items():
+            old_dates = [date for date in entry['pageviews'] if date <= cutoff]
+            for date in old_dates:
+                del entry['pageviews'][date]
+            if old_dates:
+                changed.add(title)
+
+    for title in changed:
+        entry = data[title]
+        entry['total_views'] = sum(views for views in entry['pageviews'].values()
+                                   if views is not None)
+    print(f'Updated page views for {len(changed)} pages.')
+    return changed
+
+
+def save_checkpoint(path, category, cont, formatted_data, titles=None, mode='generator',
+                    depth=0):
+    '''
+    Saves the progress of a crawl to disk so it can be resumed later with load_checkpoint().
+
+    The checkpoint is written to a temporary file first and then moved into place, so an
+    interruption while saving never leaves a half-written checkpoint behind.
+
+    Parameters:
+        path: A string representing the path to save the checkpoint (.checkpoint) to.
+        category: A string representing the name of the category being crawled.
+        cont: A dictionary of continue parameters for the next request to send.
+        formatted_data: A dictionary of the data collected so far, as built by add_batch().
+        titles: Optional. A list of the titles being crawled, when crawling a list of titles
+            found by walk_category_tree() instead of a single category. Defaults to None.
+        mode: Optional. A string representing how the crawl lists its pages, out of
+            CRAWL_MODES. Defaults to 'generator'.
+        depth: Optional. An int representing how many levels of subcategories the crawl
+            includes. Defaults to 0.
+    '''
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as file:
+        pickle.dump({'category': category, 'continue': cont, 'data': formatted_data,
+                     'titles': titles, 'mode': mode, 'depth': depth}, file)
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path, category=None, mode=None, depth=None):
+    '''
+    Loads a checkpoint saved by save_checkpoint(), checking that it was saved by the same kind
+    of crawl that is resuming it.
+
+    Parameters:
+        path: A string representing the path of the checkpoint file.
+        category: Optional. A string representing the category being resumed. Defaults to None,
+            which doesn't check it.
+        mode: Optional. A string representing how the resuming crawl lists its pages, out of
+            CRAWL_MODES. Defaults to None, which doesn't check it.
+        depth: Optional. An int representing how many levels of subcategories the resuming crawl
+            includes. Defaults to None, which doesn't check it.
+
+    Returns:
+        A dictionary with the keys 'category', 'continue', 'data', 'titles', 'mode' and 'depth',
+        or None if there is no checkpoint at the given path.
+
+    Raises:
+        ValueError: If the checkpoint was saved by a crawl of another category, mode or depth,
+            since its continue parameters can't be used to pick it back up.
+    '''
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as file:
+        checkpoint = pickle.load(file)
+    # checkpoints saved before the mode was recorded can still be told apart by their contents
+    if 'mode' not in checkpoint:
+        if checkpoint['titles'] is None:
+            checkpoint['mode'] = 'generator'
+        elif set(checkpoint['continue'] or ()) == set(STREAM_SEARCH_PARAMS):
+            checkpoint['mode'] = 'streams'
+        else:
+            checkpoint['mode'] = 'titles'
+    checkpoint.setdefault('depth', None)
+
+    if category is not None and checkpoint['category'] != category:
+        raise ValueError(f'Checkpoint {path} is for category {checkpoint["category"]}, '
+                         f'not {category}')
+    saved = (checkpoint['mode'], checkpoint['depth'])
+    if (mode is not None and saved[0] != mode) or (
+            depth is not None and saved[1] is not None and saved[1] != depth):
+        raise ValueError(f'Checkpoint {path} was saved by a {saved[0]} crawl with a depth of '
+                         f'{saved[1]}, so it can\'t be resumed by a {mode} crawl with a depth of '
+                         f'{depth}. Run with the same options, or without --resume to start '
+                         'over.')
+    return checkpoint
+
+
+def titles_done(titles, state):
+    '''
+    Counts the pages iter_titles() has finished getting data for.
+
+    Parameters:
+        titles: The list of titles being crawled.
+        state: The state yielded by iter_titles(), which is empty once every batch is done, or
+            None before the first request.
+
+    Returns:
+        An int representing the number of titles whose batches have been completely returned.
+    '''
+    if state is None:
+        return 0
+    if not state:
+        return len(titles)
+    return min(state['batch'] * TITLES_PER_REQUEST, len(titles))
+
+
+def record_progress(metrics, category, formatted_data, titles, state):
+    '''
+    Records the progress of crawl_category() in a CrawlMetrics.
+
+    Parameters:
+        metrics: The CrawlMetrics to record the progress in.
+        category: A string representing the name of the category being crawled.
+        formatted_data: The dictionary being built by add_batch().
+        titles: The list of titles being crawled, or None if the category's members are being
+            listed with iter_generator(), in which case the size of the category isn't known.
+        state: The continue parameters (or iter_titles() state) of the next request, or None
+            before the first request.
+    '''
+    if titles is None:
+        metrics.progress(category, len(formatted_data))
+    else:
+        metrics.progress(category, titles_done(titles, state), len(titles))
+
+
+def crawl_category(wiki, category, checkpoint_path=None, resume=False,
+                   checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, depth=0, metrics=None,
+                   stop=None):
+    '''
+    Gets the data for every page in a category and folds it into a dictionary as it arrives,
+    optionally checkpointing the progress so an interrupted crawl can be picked back up.
+
+    A checkpoint is saved every checkpoint_interval seconds (or less often, if saving takes a
+    while; see CheckpointTimer), as well as when the crawl is interrupted by an error, by Ctrl-C,
+    or by the stop event being set. It is deleted once the crawl finishes. Ctrl-C only reaches the
+    main thread, so crawls running in other threads are stopped with the event instead.
+
+    If depth is more than 0, the articles in the category's subcategories are included as well.
+    They are found with walk_category_tree() first, and then the data for each article is
+    requested exactly once, however many of the subcategories it is in.
+
+    Parameters:
+        wiki: A MediaWiki instance configured to access Wikipedia.
+        category: A string representing the name of the Wikipedia category for data to be gathered
+            from.
+        checkpoint_path: Optional. A string representing the path to save checkpoints to. Defaults
+            to None, which disables checkpointing.
+        resume: Optional. A boolean that should be set to True to pick up from the checkpoint at
+            checkpoint_path if there is one. Defaults to False.
+        checkpoint_interval: Optional. The shortest time between checkpoint saves, in seconds.
+            Defaults to DEFAULT_CHECKPOINT_INTERVAL.
+        depth: Optional. An int representing how many levels of subcategories to include.
+            Defaults to 0, which only includes the articles directly in the category.
+        metrics: Optional. A CrawlMetrics to record the crawl's progress in. Defaults to None.
+        stop: Optional. A threading.Event that is checked between requests. Once it is set, the
+            crawl saves its checkpoint and raises CrawlInterrupted. Defaults to None.
+
+    Returns:
+        A dictionary of the category's data as built by add_batch(). It still needs to be passed
+        through finish_formatting() before it is usable.
+    '''
+    formatted_data = {}
+    cont = None
+    titles = None
+    mode = 'titles' if depth > 0 else 'generator'
+    if resume and checkpoint_path is not None:
+        checkpoint = load_checkpoint(checkpoint_path, category, mode, depth)
+        if checkpoint is not None:
+            cont = checkpoint['continue']
+            formatted_data = checkpoint['data']
+            titles = checkpoint.get('titles')
+            print(f'Resuming from checkpoint with {len(formatted_data)} pages...')
+
+    if depth > 0:
+        if titles is None:
+            titles = walk_category_tree(wiki, category, depth)[1]
+        batches = iter_titles(wiki, titles, cont)
+    else:
+        batches = iter_generator(wiki, category, cont)
+
+    # the continue parameters that match what has been added to formatted_data so far. Only
+    # updated once a batch has been completely added, so a checkpoint saved after an interruption
+    # never contains half of a batch.
+    saved_cont = cont
+    timer = CheckpointTimer(checkpoint_interval)
+    if metrics is not None:
+        record_progress(metrics, category, formatted_data, titles, cont)
+    try:
+        for batch, next_cont in batches:
+            add_batch(formatted_data, batch)
+            saved_cont = next_cont
+            if metrics is not None:
+                record_progress(metrics, category, formatted_data, titles, next_cont)
+            if checkpoint_path is not None and next_cont:
+                timer.save_if_due(lambda: save_checkpoint(
+                    checkpoint_path, category, next_cont, formatted_data, titles, mode, depth))
+            if next_cont and stop is not None and stop.is_set():
+                raise CrawlInterrupted(f'Stopped crawling {category}')
+    except BaseException:
+        if checkpoint_path is not None and saved_cont:
+            save_checkpoint(checkpoint_path, category, saved_cont, formatted_data, titles, mode,
+                            depth)
+            print(f'\nSaved checkpoint to {checkpoint_path}')
+        raise
+
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
     return formatted_data
 
 
-def get_data(category, rate_limit, rate_limit_wait=1):
+def merge_streams(stream_data):
+    '''
+    Combines the dictionaries built by add_batch() for each stream of crawl_streams() into one.
+
+    Parameters:
+        stream_data: A dictionary mapping the name of each stream to the dictionary built from
+            its batches.
+
+    Returns:
+        A single dictionary built the same as by add_batch(), with every page's 'pageviews' and
+        'linkshere' from all of the streams.
+    '''
+    merged = {}
+    for data in stream_data.values():
+        for title, entry in data.items():
+            merged_entry = merged.setdefault(
+                title, {'linkshere': [], 'pageviews': {}, 'pageid': entry['pageid']})
+            merged_entry['linkshere'].extend(entry['linkshere'])
+            merged_entry['pageviews'].update(entry['pageviews'])
+    return merged
+
+
+def crawl_streams(wikis, category, checkpoint_path=None, resume=False,
+                  checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, depth=0, metrics=None,
+                  stop=None):
+    '''
+    Gets the data for every page in a category like crawl_category(), but requests the page
+    views and the links as separate streams running at the same time.
+
+    The category's members are listed once with walk_category_tree(), then each stream goes
+    through them TITLES_PER_REQUEST at a time with iter_titles(). Since the page views of 50
+    pages always fit in one request, but the links to a few popular pages can take many requests
+    to finish, this keeps the page views from waiting on the links, so the crawl takes about as
+    long as its slowest stream instead of the two of them added together. That only holds while
+    requests are limited by how long Wikipedia takes to answer: if the streams share a fixed rate
+    limit, the crawl takes as long as all of their requests added together.
+
+    Parameters:
+        wikis: A dictionary mapping the name of each stream in STREAM_SEARCH_PARAMS to the
+            MediaWiki instance to send its requests through. They can share one rate limiter.
+        category: A string representing the name of the Wikipedia category for data to be gathered
+            from.
+        checkpoint_path: Optional. See crawl_category().
+        resume: Optional. See crawl_category().
+        checkpoint_interval: Optional. See crawl_category().
+        depth: Optional. See crawl_category().
+        metrics: Optional. A CrawlMetrics to record the crawl's progress in. A page counts as
+            done once every stream has finished it. Defaults to None.
+        stop: Optional. See crawl_category().
+
+    Returns:
+        A dictionary of the category's data as built by add_batch(). It still needs to be passed
+        through finish_formatting() before it is usable.
+    '''
+    # the progress of each stream: the state to pick it up from, or None once it has finished
+    states = {name: {} for name in STREAM_SEARCH_PARAMS}
+    stream_data = {name: {} for name in STREAM_SEARCH_PARAMS}
+    titles = None
+    if resume and checkpoint_path is not None:
+        checkpoint = load_checkpoint(checkpoint_path, category, 'streams', depth)
+        if checkpoint is not None:
+            states = checkpoint['continue']
+            stream_data = checkpoint['data']
+            titles = checkpoint['titles']
+            print(f'Resuming from checkpoint for {len(titles)} pages...')
+
+    if titles is None:
+        titles = walk_category_tree(wikis['pageviews'], category, depth)[1]
+
+    lock = threading.Lock()
+    # set when a stream fails, to stop the other one
+    stopping = threading.Event()
+    timer = CheckpointTimer(checkpoint_interval)
+
+    def save():
+        save_checkpoint(checkpoint_path, category, states, stream_data, titles, 'streams', depth)
+
+    def record_progress():
+        done = min(len(titles) if state is None else titles_done(titles, state or None)
+                   for state in states.values())
+        metrics.progress(category, done, len(titles))
+
+    if metrics is not None:
+        record_progress()
+
+    def run_stream(name):
+        if states[name] is None:
+            return
+        for batch, next_state in iter_titles(wikis[name], titles, states[name],
+                                             STREAM_SEARCH_PARAMS[name]):
+            # the state is only updated once the batch has been added, so a checkpoint never
+            # contains half of a batch
+            with lock:
+                add_batch(stream_data[name], batch)
+                states[name] = next_state or None
+                if metrics is not None:
+                    record_progress()
+                if checkpoint_path is not None:
+                    timer.save_if_due(save)
+            if stopping.is_set() or (stop is not None and stop.is_set()):
+                return
+
+    executor = ThreadPoolExecutor(max_workers=len(STREAM_SEARCH_PARAMS))
+    futures = [executor.submit(run_stream, name) for name in STREAM_SEARCH_PARAMS]
+    try:
+        # raise the first error from either stream as soon as it happens
+        done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in done:
+            future.result()
+        if any(state is not None for state in states.values()):
+            raise CrawlInterrupted(f'Stopped crawling {category}')
+    except BaseException:
+        # stop the other streams after their current request, so the checkpoint is up to date
+        stopping.set()
+        executor.shutdown(wait=True)
+        if checkpoint_path is not None:
+            save()
+            print(f'\nSaved checkpoint to {checkpoint_path}')
+        raise
+    executor.shutdown()
+
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return merge_streams(stream_data)
+
+
+def make_wiki(limiter=None, cache=None, offline=False, metrics=None, category=None):
+    '''
+    Creates a MediaWiki instance for Wikipedia.
+
+    The instance's own rate limiting is turned off; instead, requests can be limited by a shared
+    TokenBucket so that several instances running at once stay within one request budget. If a
+    cache is given, it sits in front of the rate limiter, so cached responses are returned right
+    away without using up the request budget.
+
+    Parameters:
+        limiter: Optional. A TokenBucket to take a token from before every request. Defaults to
+            None, which disables rate limiting.
+        cache: Optional. A ResponseCache to answer requests from when possible. Defaults to None,
+            which disables caching.
+        offline: Optional. A boolean that should be set to True to only answer requests from the
+            cache, without connecting to Wikipedia at all. Defaults to False.
+        metrics: Optional. A CrawlMetrics to record every request sent to Wikipedia in. Defaults
+            to None.
+        category: Optional. A string representing the category the requests are for, which is
+            recorded with them in metrics. Defaults to None.
+
+    Returns:
+        A MediaWiki instance, wrapped in a RateLimitedWiki if a limiter was given and a CachedWiki
+        if a cache was given. If the limiter is an AdaptiveLimiter, a WikiClient wrapped in an
+        AdaptiveWiki is used instead, since MediaWiki doesn't report when Wikipedia asks for
+        requests to slow down.
+    '''
+    if offline:
+        if cache is None:
+            raise ValueError('A cache is needed to run offline')
+        return CachedWiki(None, cache, offline=True)
+
+    # the metrics wrap the client itself, so time spent waiting on the rate limiter isn't counted
+    # as latency and each retry is counted as its own request
+    if isinstance(limiter, AdaptiveLimiter):
+        client = WikiClient()
+        if metrics is not None:
+            client = MeteredWiki(client, metrics, category)
+        wikipedia = AdaptiveWiki(client, limiter)
+    else:
+        wikipedia = MediaWiki(
+            url='https://en.wikipedia.org/w/api.php',
+            user_agent='illuminati-map',
+            rate_limit=False,
+            cat_prefix='Category:')
+        if metrics is not None:
+            wikipedia = MeteredWiki(wikipedia, metrics, category)
+        if limiter is not None:
+            wikipedia = RateLimitedWiki(wikipedia, limiter)
+    if cache is not None:
+        wikipedia = CachedWiki(wikipedia, cache)
+    return wikipedia
+
+
+def make_limiter(rate_limit, rate_limit_wait, adaptive=False):
+    '''
+    Creates the rate limiter shared by every request sent during a run.
+
+    Parameters:
+        rate_limit: A boolean that should be set to True if rate limiting is necessary/desired, and
+            False if not.
+        rate_limit_wait: A number representing the number of seconds to wait between requests.
+        adaptive: Optional. A boolean that should be set to True to start at one request every
+            rate_limit_wait seconds, and then speed up or slow down depending on how Wikipedia
+            responds. Defaults to False.
+
+    Returns:
+        A TokenBucket allowing one request every rate_limit_wait seconds (an AdaptiveLimiter if
+        adaptive is True), or None if rate limiting is disabled.
+    '''
+    if not rate_limit or rate_limit_wait <= 0:
+        return None
+    if adaptive:
+        return AdaptiveLimiter(rate=1 / rate_limit_wait)
+    return TokenBucket(rate=1 / rate_limit_wait)
+
+
+def print_limiter_stats(limiter, name='Requests'):
+    '''
+    Prints the counters of an AdaptiveLimiter. Does nothing for other limiters.
+
+    Parameters:
+        limiter: The rate limiter used for a run, or None.
+        name: Optional. A string to start the line with. Defaults to 'Requests'.
+    '''
+    if not isinstance(limiter, AdaptiveLimiter):
+        return
+    stats = limiter.stats()
+    print(f"{name}: {stats['requests']} sent ({stats['requests_per_second']:.2f}/s), "
+          f"{stats['retries']} retried ({stats['throttled']} throttled), "
+          f"{stats['sleep_time']:.1f}s spent waiting, ending at {stats['rate']:.2f}/s")
+
+
+def merge_data(datasets):
+    '''
+    Merges several dictionaries built by add_batch() into one. Pages that show up in more than
+    one of them (such as pages in several of the crawled categories) are only included once.
+
+    Parameters:
+        datasets: An iterable of dictionaries built by add_batch().
+
+    Returns:
+        A single dictionary containing every page from the input dictionaries.
+    '''
+    merged = {}
+    for dataset in datasets:
+        for title, entry in dataset.items():
+            merged.setdefault(title, entry)
+    return merged
+
+
+def get_data(category, rate_limit, rate_limit_wait=1, checkpoint_path=None, resume=False,
+             depth=0, cache=None, offline=False, split_streams=False, adaptive=False,
+             metrics=None):
     '''
     Creates an MediaWiki instance for Wikipedia and obtains information about a specified category
     of pages.
@@ -177,16 +1020,168 @@ def get_data(category, rate_limit, rate_limit_wait=1):
             necessary/desired, and False if not.
         rate_limit_wait: Optional. A number representing the number of seconds to wait between
             requests if rate limiting is enabled. Defaults to 1.
+        checkpoint_path: Optional. A string representing the path to save crawl checkpoints to.
+            Defaults to None, which disables checkpointing.
+        resume: Optional. A boolean that should be set to True to resume from the checkpoint at
+            checkpoint_path. Defaults to False.
+        depth: Optional. An int representing how many levels of subcategories to include.
+            Defaults to 0, which only includes the articles directly in the category.
+        cache: Optional. A ResponseCache to answer requests from when possible. Defaults to None.
+        offline: Optional. A boolean that should be set to True to only answer requests from the
+            cache. Defaults to False.
+        split_streams: Optional. A boolean that should be set to True to request page views and
+            links as separate streams at the same time (see crawl_streams()), sharing one rate
+            limiter. Defaults to False.
+        adaptive: Optional. A boolean that should be set to True to adapt the rate limit to how
+            Wikipedia responds (see make_limiter()). Defaults to False.
+        metrics: Optional. A CrawlMetrics to record the crawl in. Defaults to None.
+    '''
+    try:
+        limiter = make_limiter(rate_limit, rate_limit_wait, adaptive)
+        if split_streams:
+            # the streams share one limiter, so splitting them doesn't raise the request rate
+            wikis = {name: make_wiki(limiter, cache, offline, metrics, category)
+                     for name in STREAM_SEARCH_PARAMS}
+            formatted_data = crawl_streams(wikis, category, checkpoint_path, resume,
+                                           depth=depth, metrics=metrics)
+        else:
+            wikipedia = make_wiki(limiter, cache, offline, metrics, category)
+            formatted_data = crawl_category(wikipedia, category, checkpoint_path, resume,
+                                            depth=depth, metrics=metrics)
+        print_limiter_stats(limiter)
+    finally:
+        # write the final metrics even if the crawl failed, so the failure shows up in them
+        if metrics is not None:
+            metrics.write()
+    print('Formatting data...')
+    return finish_formatting(formatted_data)
+
+
+def get_multiple_data(categories, rate_limit, rate_limit_wait=1, merge=True,
+                      checkpoint_paths=None, resume=False, max_workers=DEFAULT_MAX_WORKERS,
+                      depth=0, cache=None, offline=False, split_streams=False,
+                      adaptive=False, metrics=None):
+    '''
+    Obtains information about several categories of pages at once, crawling each category in its
+    own thread. A single category is crawled in the calling thread.
+
+    Every thread shares one rate limiter, so the total request rate is the same as crawling a
+    single category, but the time each crawl spends waiting on the network overlaps. If the
+    crawls are interrupted with Ctrl-C, or one of them fails, the others are stopped after their
+    current request and save their checkpoints before the error is raised.
+
+    Parameters:
+        categories: A list of strings representing the titles of Wikipedia categories, with spaces
+            replaced by underscores.
+        rate_limit: A boolean that should be set to True if rate limiting is necessary/desired, and
+            False if not.
+        rate_limit_wait: Optional. A number representing the number of seconds to wait between
+            requests (across all categories) if rate limiting is enabled. Defaults to 1.
+        merge: Optional. A boolean that should be set to True to combine every category into one
+            dataset, and False to keep a separate dataset per category. Defaults to True.
+        checkpoint_paths: Optional. A dictionary mapping each category to the path to save its
+            crawl checkpoints to. Defaults to None, which disables checkpointing.
+        resume: Optional. A boolean that should be set to True to resume each category from its
+            checkpoint. Defaults to False.
+        max_workers: Optional. The largest number of categories to crawl at the same time.
+            Defaults to DEFAULT_MAX_WORKERS.
+        depth: Optional. An int representing how many levels of subcategories to include for each
+            category. Defaults to 0, which only includes the articles directly in each category.
+        cache: Optional. A ResponseCache, shared by every category, to answer requests from when
+            possible. Defaults to None.
+        offline: Optional. A boolean that should be set to True to only answer requests from the
+            cache. Defaults to False.
+        split_streams: Optional. A boolean that should be set to True to request page views and
+            links as separate streams (see crawl_streams()). The streams share the same rate
+            limiter as everything else, so the total request rate doesn't change. Defaults to
+            False.
+        adaptive: Optional. A boolean that should be set to True to adapt the rate limit to how
+            Wikipedia responds (see make_limiter()). Defaults to False.
+        metrics: Optional. A CrawlMetrics, shared by every category, to record the crawls in.
+            Defaults to None.
+
+    Returns:
+        If merge is True, a dictionary formatted the same as the return of format_data() with the
+        pages from every category, where 'linkshere_within_category' counts links from any of the
+        categories. Otherwise, a dictionary mapping each category to its own formatted dictionary.
+    '''
+    if checkpoint_paths is None:
+        checkpoint_paths = {}
+    limiter = make_limiter(rate_limit, rate_limit_wait, adaptive)
+
+    # Ctrl-C only reaches the main thread, so the crawls in other threads are told to stop
+    stop = threading.Event()
+
+    def crawl(category):
+        if split_streams:
+            wikis = {name: make_wiki(limiter, cache, offline, metrics, category)
+                     for name in STREAM_SEARCH_PARAMS}
+            return crawl_streams(wikis, category, checkpoint_paths.get(category), resume,
+                                 depth=depth, metrics=metrics, stop=stop)
+        return crawl_category(make_wiki(limiter, cache, offline, metrics, category), category,
+                              checkpoint_paths.get(category), resume, depth=depth,
+                              metrics=metrics, stop=stop)
+
+    try:
+        if len(categories) == 1:
+            datasets = {categories[0]: crawl(categories[0])}
+        else:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            futures = {category: executor.submit(crawl, category) for category in categories}
+            try:
+                done, _ = wait(futures.values(), return_when=FIRST_EXCEPTION)
+                for future in done:
+                    future.result()
+                datasets = {category: future.result() for category, future in futures.items()}
+            except BaseException:
+                # let every running crawl save its checkpoint, and don't start any new ones
+                stop.set()
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+            executor.shutdown()
+    finally:
+        # write the final metrics even if a crawl failed, so the failure shows up in them
+        if metrics is not None:
+            metrics.write()
+    print_limiter_stats(limiter)
+
+    print('Formatting data...')
+    if merge:
+        return finish_formatting(merge_data(datasets.values()))
+    return {category: finish_formatting(dataset) for category, dataset in datasets.items()}
+
+
+def read_categories(path):
     '''
-    wikipedia = MediaWiki(
-        url='https://en.wikipedia.org/w/api.php',
-        user_agent='illuminati-map',
-        rate_limit=rate_limit,
-        rate_limit_wait=timedelta(seconds=rate_limit_wait),
-        cat_prefix='Category:')
+    Reads a list of categories from a text file with one category per line. Blank lines and lines
+    starting with "#" are ignored.
 
-    raw_data = get_generator(wikipedia, category)
-    return format_data(raw_data)
+    Parameters:
+        path: A string representing the path of the file to read.
+
+    Returns:
+        A list of strings representing the categories in the file.
+    '''
+    with open(path) as file:
+        lines = [line.strip() for line in file]
+    return [line for line in lines if line and not line.startswith('#')]
+
+
+def category_filename(filename, category):
+    '''
+    Gets the path to save a single category's data to when saving one file per category.
+
+    Parameters:
+        filename: A string representing the output path given on the command line, such as
+            'data/billionairesdict.pkl'.
+        category: A string representing the name of the category.
+
+    Returns:
+        A string representing the path for the category, such as
+        'data/billionairesdict_American_billionaires.pkl'.
+    '''
+    root, extension = os.path.splitext(filename)
+    return f'{root}_{category}{extension}'
 
 
 def get_parser(name):
@@ -205,23 +1200,72 @@ def get_parser(name):
 
     parser = argparse.ArgumentParser(name)
     parser.add_argument('filename', type=str,
-                        help='Path to save the obtained data (.pkl) to')
-    parser.add_argument('-c', '--category', type=str, default=DEFAULT_CATEGORY,
-                        help=f'Width of the generated image in pixels '
-                             f'(default: {DEFAULT_CATEGORY})')
-    parser.add_argument('-r', '--rate-limit', type=bool, default=DEFAULT_RATE_LIMIT,
-                        help='Use rate limiting to limit calls to Wikipedia '
-                        f'(default: {DEFAULT_RATE_LIMIT})')
-    parser.add_argument('-w', '--rate-limit-wait', type=bool, default=DEFAULT_RATE_LIMIT_WAIT,
+                        help='Path to save the obtained data to, as a pickle (.pkl) or a '
+                        'compact NumPy bundle (.npz)')
+    parser.add_argument('-c', '--category', type=str, action='append', default=None,
+                        help='A category to get data for, which can be given more than once '
+                        f'to get several (default: {DEFAULT_CATEGORY})')
+    parser.add_argument('-f', '--category-file', type=str, default=None,
+                        help='Path to a text file listing categories to get data for, one per '
+                        'line')
+    parser.add_argument('-s', '--separate', action='store_true',
+                        help='Save one file per category instead of merging every category into '
+                        'one file')
+    parser.add_argument('-j', '--max-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help='Number of categories to crawl at the same time '
+                        f'(default: {DEFAULT_MAX_WORKERS})')
+    parser.add_argument('-d', '--depth', type=int, default=0,
+                        help='Number of levels of subcategories to include pages from '
+                        '(default: 0)')
+    parser.add_argument('-r', '--rate-limit', action=argparse.BooleanOptionalAction,
+                        default=DEFAULT_RATE_LIMIT,
+                        help='Use rate limiting to limit calls to Wikipedia, or turn it off '
+                        f'(along with -a) with --no-rate-limit (default: {DEFAULT_RATE_LIMIT})')
+    parser.add_argument('-w', '--rate-limit-wait', type=float, default=DEFAULT_RATE_LIMIT_WAIT,
                         help='The amount of time to wait between requests in seconds '
                         f'(default: {DEFAULT_RATE_LIMIT_WAIT})')
+    parser.add_argument('--cache', type=str, default=None,
+                        help='Path to a database to cache responses from Wikipedia in, so '
+                        'repeated runs don\'t download the same data again')
+    parser.add_argument('--cache-ttl', type=float, default=None,
+                        help='Number of hours cached responses stay valid for '
+                        '(default: forever)')
+    parser.add_argument('--cache-size', type=float, default=DEFAULT_CACHE_SIZE,
+                        help='Largest size of the cache in megabytes before the least recently '
+                        f'used responses are removed (default: {DEFAULT_CACHE_SIZE})')
+    parser.add_argument('--offline', action='store_true',
+                        help='Only use responses from the cache instead of connecting to '
+                        'Wikipedia')
+    parser.add_argument('-u', '--update', action='store_true',
+                        help='Update the page views in an existing data file instead of getting '
+                        'all of the data again (always from Wikipedia, not the --cache)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume an interrupted run from its checkpoint '
+                        f'(saved next to the output file with a {CHECKPOINT_SUFFIX} suffix)')
+    parser.add_argument('-a', '--adaptive', action='store_true',
+                        help='Start at the rate set by -w, then speed up while Wikipedia responds '
+                        'normally and back off when it asks to slow down')
+    parser.add_argument('--split-streams', action='store_true',
+                        help='Request page views and links as separate streams at the same '
+                        'time, sharing the rate limit set by -w. This sends more requests in '
+                        'total, so it is only faster when requests are limited by how long '
+                        'Wikipedia takes to answer (with -a, a short -w or --no-rate-limit)')
+    parser.add_argument('--metrics', type=str, default=None,
+                        help='Path to write crawl metrics to every few seconds, as JSON lines, or '
+                        f'as a Prometheus text file if it ends in {PROMETHEUS_SUFFIX}')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='Path to append the time and memory used by each call of the data '
+                        'formatting functions to, as JSON lines')
+    parser.add_argument('--snapshots', type=str, default=None,
+                        help='Directory of a snapshot store to add the data to as well, so '
+                        'crawls can be compared over time (one store per category with -s)')
     return parser
 
 
 def main(args):
     '''
-    Main function for getting data. Calls other functions to get Wikipedia data and pickles the
-    results into a specified file.
+    Main function for getting data. Calls other functions to get Wikipedia data and saves the
+    results into a specified file, either pickled or as a compact bundle (see storage.py).
 
     Parameters:
         args: A list of command line arguments. Run "python get_data.py -h" in a terminal for
@@ -229,11 +1273,101 @@ def main(args):
     '''
     parser = get_parser(args[0])
     parsed_args = parser.parse_args(args[1:])
-    data = get_data(parsed_args.category, parsed_args.rate_limit,
-                    parsed_args.rate_limit_wait)
+    if parsed_args.profile is None:
+        run(parser, parsed_args)
+        return
+    with profile() as profiler:
+        try:
+            run(parser, parsed_args)
+        finally:
+            profiler.write(parsed_args.profile)
+            print(profiler.report())
+
+
+def run(parser, parsed_args):
+    '''
+    Gets the data asked for on the command line and saves it.
+
+    Parameters:
+        parser: The argparse.ArgumentParser the arguments were parsed with, for reporting errors.
+        parsed_args: The argparse namespace of the parsed arguments.
+    '''
+    categories = list(parsed_args.category or [])
+    if parsed_args.category_file is not None:
+        categories.extend(read_categories(parsed_args.category_file))
+    if not categories:
+        categories = [DEFAULT_CATEGORY]
+
+    cache = None
+    if parsed_args.cache is not None:
+        cache = ResponseCache(
+            parsed_args.cache,
+            ttl=None if parsed_args.cache_ttl is None else parsed_args.cache_ttl * 3600,
+            max_bytes=int(parsed_args.cache_size * 1024 * 1024))
+    elif parsed_args.offline:
+        parser.error('--offline needs a --cache to read responses from')
+    if parsed_args.update and parsed_args.offline:
+        parser.error('--update needs to get the latest page views, so it can\'t run --offline')
+
+    if (parsed_args.split_streams and parsed_args.rate_limit and not parsed_args.adaptive
+            and parsed_args.rate_limit_wait > 0):
+        # every request waits for the same rate limit, so the crawl takes as long as the total
+        # number of requests, which splitting the streams only adds to
+        print(f'Warning: with a fixed rate limit of one request every '
+              f'{parsed_args.rate_limit_wait} seconds, --split-streams is slower than crawling '
+              'without it. Use -a, a shorter -w or --no-rate-limit for the streams to overlap.')
+
+    metrics = None
+    if parsed_args.metrics is not None:
+        metrics = CrawlMetrics(parsed_args.metrics)
+
+    if parsed_args.update:
+        data = load_data(parsed_args.filename)
+        limiter = make_limiter(parsed_args.rate_limit, parsed_args.rate_limit_wait,
+                               parsed_args.adaptive)
+        try:
+            refresh_pageviews(make_wiki(limiter, cache, parsed_args.offline, metrics), data)
+        finally:
+            if metrics is not None:
+                metrics.write()
+        print_limiter_stats(limiter)
+        save_data(data, parsed_args.filename)
+        if parsed_args.snapshots is not None:
+            SnapshotStore(parsed_args.snapshots).add(data)
+        return
+
+    if len(categories) == 1:
+        checkpoint_paths = {categories[0]: parsed_args.filename + CHECKPOINT_SUFFIX}
+    else:
+        checkpoint_paths = {category: f'{parsed_args.filename}.{category}{CHECKPOINT_SUFFIX}'
+                            for category in categories}
+
+    data = get_multiple_data(categories, parsed_args.rate_limit, parsed_args.rate_limit_wait,
+                             merge=not parsed_args.separate,
+                             checkpoint_paths=checkpoint_paths,
+                             resume=parsed_args.resume,
+                             max_workers=parsed_args.max_workers,
+                             depth=parsed_args.depth,
+                             cache=cache,
+                             offline=parsed_args.offline,
+                             split_streams=parsed_args.split_streams,
+                             adaptive=parsed_args.adaptive,
+                             metrics=metrics)
     # save our data
-    with open(parsed_args.filename, 'wb') as file:
-        pickle.dump(data, file)
+    if parsed_args.separate:
+        outputs = {category_filename(parsed_args.filename, category): dataset
+                   for category, dataset in data.items()}
+    else:
+        outputs = {parsed_args.filename: data}
+    for filename, dataset in outputs.items():
+        save_data(dataset, filename)
+
+    if parsed_args.snapshots is not None:
+        if parsed_args.separate:
+            for category, dataset in data.items():
+                SnapshotStore(os.path.join(parsed_args.snapshots, category)).add(dataset)
+        else:
+            SnapshotStore(parsed_args.snapshots).add(data)
 
 
 if __name__ == '__main__':
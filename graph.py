@@ -0,0 +1,513 @@
+'''
+A compact, integer-indexed representation of the link graph within a Wikipedia category.
+
+Every title is interned once in a title table, and pages are referred to by their index in it.
+Links are stored as compressed sparse row (CSR) arrays of title indices: the links to member i are
+indices[indptr[i]:indptr[i + 1]]. Whether a link is within the category is then a lookup in a
+boolean array of members, which lets the helpers work on whole arrays at once instead of comparing
+title strings. Sorting and trimming share the title table instead of copying it.
+
+Authors: Jacob Smilg and Markus Leschly
+'''
+
+from bisect import bisect_left, insort
+
+import numpy as np
+
+
+# when asking for fewer than this fraction of the items, a partial sort is used instead of a full one
+TOP_K_RATIO = 0.25
+
+
+def top_k(values, k=None):
+    '''
+    Finds the positions of the k largest values in descending order, keeping the original order
+    for ties, the same as a stable sort of the whole array would.
+
+    When k is much smaller than the number of values, np.argpartition() narrows the values down
+    to the candidates first, so only those have to be sorted.
+
+    Parameters:
+        values: A 1D array of numbers.
+        k: Optional. An int representing the number of positions to return. Defaults to None,
+            which returns every position.
+
+    Returns:
+        An int64 array of positions in values.
+    '''
+    num_values = len(values)
+    if k is None or k >= num_values * TOP_K_RATIO:
+        order = np.argsort(-values, kind='stable')
+        return order if k is None else order[:max(k, 0)]
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    # the k-th largest value; everything larger is definitely included, and the ties with it are
+    # included in order until there are k positions
+    threshold = values[np.argpartition(values, num_values - k)[num_values - k]]
+    above = np.flatnonzero(values > threshold)
+    ties = np.flatnonzero(values == threshold)[:k - len(above)]
+    candidates = np.sort(np.concatenate([above, ties]))
+    return candidates[np.argsort(-values[candidates], kind='stable')]
+
+
+def _gather_rows(indptr, indices, rows):
+    '''
+    Selects some rows of a CSR structure, in the order given.
+
+    Parameters:
+        indptr: An array of row offsets into indices.
+        indices: An array of column indices.
+        rows: An array of ints representing the rows to select.
+
+    Returns:
+        A tuple of (indptr, indices) for the selected rows.
+    '''
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    new_indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_indptr[1:])
+    positions = (np.arange(new_indptr[-1], dtype=np.int64)
+                 - np.repeat(new_indptr[:-1], lengths) + np.repeat(starts, lengths))
+    return new_indptr, indices[positions]
+
+
+def _filter_rows(indptr, indices, keep):
+    '''
+    Removes entries from a CSR structure, keeping the order of the rest.
+
+    Parameters:
+        indptr: An array of row offsets into indices.
+        indices: An array of column indices.
+        keep: An array of booleans, the same length as indices, that is True for entries to keep.
+
+    Returns:
+        A tuple of (indptr, indices) without the removed entries.
+    '''
+    kept_before = np.zeros(len(keep) + 1, dtype=np.int64)
+    np.cumsum(keep, out=kept_before[1:])
+    return kept_before[indptr], indices[keep]
+
+
+def _to_csr(lists, index):
+    '''
+    Converts a list of lists of titles to CSR arrays of indices into the title table, adding any
+    new titles to the end of the table.
+
+    Parameters:
+        lists: A list of lists of strings.
+        index: A dictionary mapping titles to their index in the title table. It is modified in
+            place.
+
+    Returns:
+        A tuple of (indptr, indices).
+    '''
+    indptr = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(titles) for titles in lists], out=indptr[1:])
+    indices = np.fromiter((index.setdefault(title, len(index)) for titles in lists
+                           for title in titles), dtype=np.int32, count=int(indptr[-1]))
+    return indptr, indices
+
+
+class CategoryGraph:
+    '''
+    The pages in a Wikipedia category and the links between them, stored as arrays.
+
+    Keys that weren't in the dictionary the graph was made from are stored as None, so converting
+    back with to_dict() gives the same keys.
+
+    Attributes:
+        titles: A list of every title in the graph: the category members, and every other page
+            that links to them. Shared between a graph and the graphs sorted or trimmed from it.
+        members: An int64 array of the title index of each member, in order.
+        total_views: An int64 array of the total views of each member.
+        pageids: A list of the page id of each member, or None.
+        pageviews: A list of the 'pageviews' dictionary of each member, or None.
+        linkshere_indptr: An int64 array of offsets into linkshere_indices for each member, or
+            None.
+        linkshere_indices: An int32 array of the title indices of the pages linking to each
+            member, or None.
+        within_indptr: An int64 array of offsets into within_indices for each member, or None.
+        within_indices: An int32 array of the title indices of the pages within the category
+            linking to each member, or None if common links haven't been found yet.
+    '''
+    __slots__ = ('titles', 'members', 'total_views', 'pageids', 'pageviews',
+                 'linkshere_indptr', 'linkshere_indices', 'within_indptr', 'within_indices')
+
+    def __init__(self, titles, members, total_views, pageids=None, pageviews=None,
+                 linkshere=None, within=None):
+        '''
+        Creates a graph from its arrays. Most of the time, from_dict() is easier to use.
+
+        Parameters:
+            titles: A list of every title in the graph.
+            members: An array of the title index of each category member.
+            total_views: An array of the total views of each member.
+            pageids: Optional. A list of the page id of each member. Defaults to None.
+            pageviews: Optional. A list of the 'pageviews' dictionary of each member. Defaults
+                to None.
+            linkshere: Optional. A tuple of (indptr, indices) CSR arrays of the pages linking to
+                each member. Defaults to None.
+            within: Optional. A tuple of (indptr, indices) CSR arrays of the pages within the
+                category linking to each member. Defaults to None.
+        '''
+        self.titles = titles
+        self.members = np.asarray(members, dtype=np.int64)
+        self.total_views = np.asarray(total_views, dtype=np.int64)
+        self.pageids = pageids
+        self.pageviews = pageviews
+        self.linkshere_indptr, self.linkshere_indices = linkshere or (None, None)
+        self.within_indptr, self.within_indices = within or (None, None)
+
+    @classmethod
+    def from_dict(cls, data):
+        '''
+        Converts a dictionary of Wikipedia category data as formatted by get_data.py to a graph.
+
+        Parameters:
+            data: A dictionary of Wikipedia category data as formatted by get_data.py. Each page
+                needs at least a 'total_views' key.
+
+        Returns:
+            A CategoryGraph with the same data.
+        '''
+        titles = list(data)
+        entries = list(data.values())
+        index = {title: i for i, title in enumerate(titles)}
+
+        def optional_column(key):
+            if entries and all(key in entry for entry in entries):
+                return [entry[key] for entry in entries]
+            return None
+
+        linkshere = optional_column('linkshere')
+        within = optional_column('linkshere_within_category')
+        if linkshere is not None:
+            linkshere = _to_csr(linkshere, index)
+        if within is not None:
+            within = _to_csr(within, index)
+        return cls(list(index), np.arange(len(titles)),
+                   [entry['total_views'] for entry in entries],
+                   pageids=optional_column('pageid'), pageviews=optional_column('pageviews'),
+                   linkshere=linkshere, within=within)
+
+    def to_dict(self):
+        '''
+        Converts the graph back to a dictionary formatted like the ones from get_data.py.
+
+        Returns:
+            A dictionary of Wikipedia category data as formatted by get_data.py.
+        '''
+        titles = self.titles
+        total_views = self.total_views.tolist()
+        data = {}
+        for i, member in enumerate(self.members.tolist()):
+            entry = {}
+            if self.linkshere_indptr is not None:
+                entry['linkshere'] = [titles[j] for j in self.linkshere(i).tolist()]
+            if self.pageviews is not None:
+                entry['pageviews'] = self.pageviews[i]
+            if self.pageids is not None:
+                entry['pageid'] = self.pageids[i]
+            entry['total_views'] = total_views[i]
+            if self.within_indptr is not None:
+                entry['linkshere_within_category'] = [titles[j] for j in self.within(i).tolist()]
+            data[titles[member]] = entry
+        return data
+
+    def __len__(self):
+        return len(self.members)
+
+    def member_titles(self):
+        '''
+        Returns:
+            A list of the titles of the members, in order.
+        '''
+        return [self.titles[member] for member in self.members.tolist()]
+
+    def member_mask(self):
+        '''
+        Returns:
+            A boolean array, as long as the title table, that is True for the members.
+        '''
+        mask = np.zeros(len(self.titles), dtype=bool)
+        mask[self.members] = True
+        return mask
+
+    def positions(self):
+        '''
+        Returns:
+            An int64 array, as long as the title table, of the position of each title among the
+            members, or -1 for titles that aren't members.
+        '''
+        positions = np.full(len(self.titles), -1, dtype=np.int64)
+        positions[self.members] = np.arange(len(self.members), dtype=np.int64)
+        return positions
+
+    def linkshere(self, page):
+        '''
+        Returns:
+            An array of the title indices of the pages linking to the member at position page.
+        '''
+        return self.linkshere_indices[self.linkshere_indptr[page]:self.linkshere_indptr[page + 1]]
+
+    def within(self, page):
+        '''
+        Returns:
+            An array of the title indices of the pages within the category linking to the member
+            at position page.
+        '''
+        return self.within_indices[self.within_indptr[page]:self.within_indptr[page + 1]]
+
+    def ranking(self, num_results=None):
+        '''
+        Ranks the members by total views, keeping the current order for ties.
+
+        Parameters:
+            num_results: Optional. An int representing the number of members to rank. Defaults
+                to None, which ranks every member.
+
+        Returns:
+            An int64 array of member positions, with the most viewed first.
+        '''
+        return top_k(self.total_views, num_results)
+
+    def subgraph(self, pages):
+        '''
+        Makes a graph of some of the members, in the order given. The title table is shared with
+        this graph, and the links to the included members stay the same.
+
+        Parameters:
+            pages: An array of ints representing the positions of the members to include.
+
+        Returns:
+            A new CategoryGraph.
+        '''
+        pages = np.asarray(pages, dtype=np.int64)
+
+        def select(indptr, indices):
+            if indptr is None:
+                return None
+            return _gather_rows(indptr, indices, pages)
+
+        page_list = pages.tolist()
+        return CategoryGraph(
+            self.titles, self.members[pages], self.total_views[pages],
+            pageids=None if self.pageids is None else [self.pageids[i] for i in page_list],
+            pageviews=None if self.pageviews is None else [self.pageviews[i] for i in page_list],
+            linkshere=select(self.linkshere_indptr, self.linkshere_indices),
+            within=select(self.within_indptr, self.within_indices))
+
+    def sort(self, num_results=None):
+        '''
+        The graph version of helpers.sort_dict(), sorting by total views.
+
+        Returns:
+            A new CategoryGraph with the num_results most viewed members, most viewed first.
+        '''
+        return self.subgraph(self.ranking(num_results))
+
+    def common_links(self):
+        '''
+        The graph version of helpers.common_links(). Finds the links to each member from within
+        the category in one pass over every link.
+
+        Returns:
+            The graph, with within_indptr and within_indices set.
+        '''
+        self.within_indptr, self.within_indices = _filter_rows(
+            self.linkshere_indptr, self.linkshere_indices,
+            self.member_mask()[self.linkshere_indices])
+        return self
+
+    def trim(self, length):
+        '''
+        The graph version of helpers.trim_dict(). Keeps the length most viewed members and removes
+        any links within the category from members that were removed.
+
+        Returns:
+            A new CategoryGraph.
+        '''
+        trimmed = self.sort(length)
+        trimmed.within_indptr, trimmed.within_indices = _filter_rows(
+            trimmed.within_indptr, trimmed.within_indices,
+            trimmed.member_mask()[trimmed.within_indices])
+        return trimmed
+
+    def edges(self):
+        '''
+        Lists the links within the category as (source, target) pairs of member positions, where
+        the source is the page being linked to and the target is the page linking to it, matching
+        helpers.dict_to_nodes().
+
+        Returns:
+            A tuple of (sources, targets) int64 arrays.
+        '''
+        sources = np.repeat(np.arange(len(self.members), dtype=np.int64),
+                            np.diff(self.within_indptr))
+        return sources, self.positions()[self.within_indices]
+
+    def to_nodes(self):
+        '''
+        The graph version of helpers.dict_to_nodes().
+
+        Returns:
+            A dictionary of "nodes" and "links" formatted the same as helpers.dict_to_nodes().
+        '''
+        total_views = self.total_views.tolist()
+        sources, targets = self.edges()
+        return {
+            'nodes': [{'name': title, 'group': total_views[i]}
+                      for i, title in enumerate(self.member_titles())],
+            'links': [{'source': source, 'target': target, 'value': total_views[source]}
+                      for source, target in zip(sources.tolist(), targets.tolist())],
+        }
+
+
+class RankedGraph:
+    '''
+    A category graph prepared for taking the induced subgraph of its top N most viewed pages, for
+    any N, without reprocessing every page each time.
+
+    Every link within the category is sorted once by the point at which it joins the subgraph:
+    the lower of its two pages' ranks. The links in the top N pages are then always a prefix of
+    that order, so moving between sizes only has to touch the links that are added or removed.
+
+    Attributes:
+        titles: A list of the titles of the members, most viewed first.
+        sources: An int64 array of the rank of the page being linked to by each link, sorted by
+            when the link joins the subgraph.
+        targets: An int64 array of the rank of the page the link comes from, in the same order.
+    '''
+    __slots__ = ('titles', 'sources', 'targets', '_slots', '_offsets', '_entries',
+                 '_total_views', '_size', '_links')
+
+    def __init__(self, data):
+        '''
+        Prepares a ranked graph.
+
+        Parameters:
+            data: A dictionary of Wikipedia category data as formatted by get_data.py (with
+                'linkshere_within_category' already found), or a CategoryGraph with common links
+                found.
+        '''
+        graph = data if isinstance(data, CategoryGraph) else CategoryGraph.from_dict(data)
+        num_pages = len(graph)
+        order = graph.ranking()
+        rank = np.empty(num_pages, dtype=np.int64)
+        rank[order] = np.arange(num_pages, dtype=np.int64)
+
+        self.titles = [graph.titles[member] for member in graph.members[order].tolist()]
+        self._total_views = graph.total_views[order].tolist()
+        if isinstance(data, CategoryGraph):
+            self._entries = list(graph.subgraph(order).to_dict().values())
+        else:
+            self._entries = [data[title] for title in self.titles]
+
+        # one entry per link within the category: the page linked to, the page linking to it, and
+        # where the link is in the page's 'linkshere_within_category' list
+        counts = np.diff(graph.within_indptr)
+        linked = np.repeat(np.arange(num_pages, dtype=np.int64), counts)
+        linking = graph.positions()[graph.within_indices]
+        slots = (np.arange(len(linking), dtype=np.int64)
+                 - np.repeat(graph.within_indptr[:-1], counts))
+        valid = linking >= 0
+        sources = rank[linked[valid]]
+        targets = rank[linking[valid]]
+        joins = np.maximum(sources, targets)
+        link_order = np.argsort(joins, kind='stable')
+        self.sources = sources[link_order]
+        self.targets = targets[link_order]
+        self._slots = slots[valid][link_order]
+        # the number of links in the top n pages, for every n
+        self._offsets = np.searchsorted(joins[link_order], np.arange(num_pages + 1), side='left')
+
+        self._size = 0
+        self._links = [[] for _ in range(num_pages)]
+
+    def __len__(self):
+        return len(self.titles)
+
+    def num_links(self, size):
+        '''
+        Returns:
+            The number of links within the top size pages.
+        '''
+        return int(self._offsets[min(max(size, 0), len(self.titles))])
+
+    def edges(self, size):
+        '''
+        Gets the links within the top size pages as arrays of ranks. The arrays are views, so
+        this takes the same time for any size.
+
+        Parameters:
+            size: An int representing the number of most viewed pages to include.
+
+        Returns:
+            A tuple of (sources, targets) arrays, where each source is the rank of a page being
+            linked to and each target is the rank of the page linking to it.
+        '''
+        num_links = self.num_links(size)
+        return self.sources[:num_links], self.targets[:num_links]
+
+    def resize(self, size):
+        '''
+        Updates the lists of links kept for each page to the top size pages, only adding or
+        removing the links between the previous size and this one.
+
+        Parameters:
+            size: An int representing the number of most viewed pages to include.
+
+        Returns:
+            The ranked graph.
+        '''
+        size = min(max(size, 0), len(self.titles))
+        old_links = self.num_links(self._size)
+        new_links = self.num_links(size)
+        if new_links > old_links:
+            for source, target, slot in zip(self.sources[old_links:new_links].tolist(),
+                                            self.targets[old_links:new_links].tolist(),
+                                            self._slots[old_links:new_links].tolist()):
+                insort(self._links[source], (slot, target))
+        else:
+            for source, target, slot in zip(self.sources[new_links:old_links].tolist(),
+                                            self.targets[new_links:old_links].tolist(),
+                                            self._slots[new_links:old_links].tolist()):
+                links = self._links[source]
+                del links[bisect_left(links, (slot, target))]
+        self._size = size
+        return self
+
+    def trim(self, size):
+        '''
+        The ranked version of helpers.trim_dict(). Unlike trim_dict(), the input data isn't
+        changed; each page in the result gets a new dictionary.
+
+        Parameters:
+            size: An int representing the number of most viewed pages to include.
+
+        Returns:
+            A dictionary formatted the same as the return of helpers.trim_dict().
+        '''
+        self.resize(size)
+        titles = self.titles
+        return {titles[rank]: dict(self._entries[rank], linkshere_within_category=[
+            titles[target] for _, target in self._links[rank]]) for rank in range(self._size)}
+
+    def to_nodes(self, size):
+        '''
+        The ranked version of helpers.dict_to_nodes(helpers.trim_dict(data, size)).
+
+        Parameters:
+            size: An int representing the number of most viewed pages to include.
+
+        Returns:
+            A dictionary of "nodes" and "links" formatted the same as helpers.dict_to_nodes().
+        '''
+        self.resize(size)
+        total_views = self._total_views
+        return {
+            'nodes': [{'name': self.titles[rank], 'group': total_views[rank]}
+                      for rank in range(self._size)],
+            'links': [{'source': rank, 'target': target, 'value': total_views[rank]}
+                      for rank in range(self._size) for _, target in self._links[rank]],
+        }
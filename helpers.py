@@ -4,15 +4,25 @@ Helper functions for the Illuminati Map project.
 Authors: Jacob Smilg and Markus Leschly
 '''
 
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 from tqdm import tqdm
 
+from graph import CategoryGraph, TOP_K_RATIO
+from profiling import traced
+
 
+@traced()
 def sort_dict(_dict, nested_sort_key=None, num_results=None):
     '''
     Sort a dictionary by its values. Meant to be used for numeric values only.
 
     Parameters:
-        _dict (dict): The dictionary to be sorted. Each key's value should be an integer.
+        _dict (dict): The dictionary to be sorted. Each key's value should be an integer. A
+            CategoryGraph can be passed instead, in which case it is sorted by total views and
+            nested_sort_key is ignored.
         nested_sort_key: Optional, defaults to None. If the dictionary is formatted as a nested
                         dictionary, specify this as the key for which nested value the dictionary
                         should be sorted by.
@@ -21,8 +31,11 @@ def sort_dict(_dict, nested_sort_key=None, num_results=None):
             returns the entire sorted dictionary.
 
     Returns:
-        A new dictionary, sorted by its values.
+        A new dictionary, sorted by its values (or a new CategoryGraph, if one was passed in).
     '''
+    if isinstance(_dict, CategoryGraph):
+        return _dict.sort(num_results)
+
     # default to sorting the whole dictionary if a length isn't specified
     if num_results is None:
         num_results = len(_dict.keys())
@@ -30,11 +43,19 @@ def sort_dict(_dict, nested_sort_key=None, num_results=None):
     sorted_dict = dict()
     # if no nested key was specified, assume the dict is only one level deep, and sort accordingly
     if nested_sort_key is None:
-        sorted_keys = sorted(_dict, key=_dict.get, reverse=True)
+        sort_key = _dict.get
     else:
         # if a nested key was specified, sort by that using a lambda function
-        sorted_keys = sorted(_dict, key=lambda x: (
-            _dict[x][nested_sort_key]), reverse=True)
+        def sort_key(x):
+            return _dict[x][nested_sort_key]
+
+    if 0 <= num_results < len(_dict) * TOP_K_RATIO:
+        # when only a few of the keys are wanted, a heap finds them without sorting everything.
+        # heapq.nlargest() is guaranteed to give the same result as sorted(...)[:num_results],
+        # including the order of ties.
+        sorted_keys = heapq.nlargest(num_results, _dict, key=sort_key)
+    else:
+        sorted_keys = sorted(_dict, key=sort_key, reverse=True)
 
     # make a new, sorted dictionary by inserting the data in order.
     for key in sorted_keys[0:num_results]:
@@ -43,7 +64,47 @@ def sort_dict(_dict, nested_sort_key=None, num_results=None):
     return sorted_dict
 
 
-def common_links(data_dict, show_progress=False):
+DEFAULT_CHUNK_SIZE = 1000     # pages per task when finding common links in several processes
+
+# the set of category members, given to each worker process once when it starts instead of with
+# every chunk of pages
+_worker_members = None
+
+
+def _find_within(link_lists, members):
+    '''
+    Finds the links from within the category for several pages.
+
+    Parameters:
+        link_lists: A list of lists of the titles of the pages linking to each page.
+        members: A frozenset of the titles of every page in the category.
+
+    Returns:
+        A list of lists of the titles from each list in link_lists that are in members, in their
+        original order.
+    '''
+    # filter() with the set's own membership test does the whole loop in C
+    is_member = members.__contains__
+    return [list(filter(is_member, links)) for links in link_lists]
+
+
+def _set_worker_members(members):
+    '''
+    Stores the set of category members in a worker process.
+    '''
+    global _worker_members
+    _worker_members = members
+
+
+def _find_within_in_worker(link_lists):
+    '''
+    _find_within() for a worker process, using the members stored by _set_worker_members().
+    '''
+    return _find_within(link_lists, _worker_members)
+
+
+@traced()
+def common_links(data_dict, show_progress=False, processes=None, chunk_size=DEFAULT_CHUNK_SIZE):
     '''
     Adds common links within a category to a dictionary containing data on Wikipedia pages in the
     same category.
@@ -51,26 +112,50 @@ def common_links(data_dict, show_progress=False):
     A key called 'linkshere_within_category' is added to each page's subdictionary.
 
     Parameters:
-        data_dict: A dictionary of Wikipedia data as formatted by get_data.py.
+        data_dict: A dictionary of Wikipedia data as formatted by get_data.py. A CategoryGraph can
+            be passed instead, in which case the common links are found for every page at once.
         show_progress: An optional boolean value to set whether or not to display a progress bar
             for this function.
+        processes: Optional. An int representing the number of processes to split the work
+            between. Only worth it for very large categories, since every page's links have to be
+            sent to another process. Defaults to None, which does everything in this process.
+        chunk_size: Optional. An int representing the number of pages to send to a process at a
+            time. Defaults to DEFAULT_CHUNK_SIZE.
 
     Returns:
         A dictionary formatted the same as the input, but with the key 'linkshere_within_category'
-        added to each page's subdictionary.
+        added to each page's subdictionary (or the CategoryGraph, if one was passed in).
     '''
-    for name in tqdm(data_dict, disable=(not show_progress)):
-        # add the dictionary key for each page
-        data_dict[name]['linkshere_within_category'] = []
-        # iterate through all of the pages that link to the current page
-        for linker in data_dict[name]['linkshere']:
-            # if the linker is in the category, put it in the list
-            if linker in data_dict:
-                data_dict[name]['linkshere_within_category'].append(linker)
+    if isinstance(data_dict, CategoryGraph):
+        return data_dict.common_links()
+
+    # every title in the category, hashed once up front
+    members = frozenset(data_dict)
+    names = list(data_dict)
+    chunks = [names[start:start + chunk_size] for start in range(0, len(names), chunk_size)]
+    link_lists = ([data_dict[name]['linkshere'] for name in chunk] for chunk in chunks)
+
+    executor = None
+    if processes is None or processes <= 1:
+        results = (_find_within(links, members) for links in link_lists)
+    else:
+        executor = ProcessPoolExecutor(max_workers=processes, initializer=_set_worker_members,
+                                       initargs=(members,))
+        results = executor.map(_find_within_in_worker, link_lists)
+
+    try:
+        for chunk, within in tqdm(zip(chunks, results), total=len(chunks),
+                                  disable=(not show_progress)):
+            for name, links in zip(chunk, within):
+                data_dict[name]['linkshere_within_category'] = links
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
     return data_dict
 
 
+@traced()
 def trim_dict(_dict, length):
     '''
     Sorts a dictionary of Wikipedia category data as formatted by get_data.py by total page views
@@ -78,9 +163,14 @@ def trim_dict(_dict, length):
     no longer exist in the dictionary.
 
     Parameters:
-        _dict: A dictionary of Wikipedia category data as formatted by get_data.py.
+        _dict: A dictionary of Wikipedia category data as formatted by get_data.py. A
+            CategoryGraph can be passed instead, in which case a new, trimmed CategoryGraph is
+            returned.
         length: An int representing the desired length of the dictionary.
     '''
+    if isinstance(_dict, CategoryGraph):
+        return _dict.trim(length)
+
     # sort the dictionary and trim it
     _dict = sort_dict(_dict, nested_sort_key='total_views', num_results=length)
 
@@ -93,6 +183,7 @@ def trim_dict(_dict, length):
     return _dict
 
 
+@traced(output_size=lambda nodes: len(nodes['links']))
 def dict_to_nodes(_dict):
     '''
     Convert a dictionary of sources and targets to a dictionary of nodes and edges for Kamada-Kawai
@@ -112,11 +203,15 @@ def dict_to_nodes(_dict):
                                         {'source': 3, 'target': 2, 'value': 5}]}
 
     Parameters:
-        _dict (dict): A dictionary of sources and targets. See above for example.
+        _dict (dict): A dictionary of sources and targets. See above for example. A CategoryGraph
+            can be passed instead.
 
     Returns:
         A dictionary of "nodes" and "links" as specified above.
     '''
+    if isinstance(_dict, CategoryGraph):
+        return _dict.to_nodes()
+
     sources = _dict.keys()
     # unfold dict into list of tuples representing connections: (source, target, value)
     datalist = []
@@ -133,3 +228,72 @@ def dict_to_nodes(_dict):
                       'target': names_with_indexes[target],
                       'value': value} for source, target, value in datalist]
     return data
+
+
+def dict_to_edge_arrays(_dict):
+    '''
+    Convert a dictionary of sources and targets to NumPy arrays of nodes and edges. This holds the
+    same graph as dict_to_nodes(), but without making a dictionary for every link, so it is much
+    smaller and faster for large graphs.
+
+    Parameters:
+        _dict (dict): A dictionary of sources and targets, as used by dict_to_nodes(). A
+            CategoryGraph can be passed instead.
+
+    Returns:
+        A dictionary of:
+            "names": A list of the name of each node.
+            "views": An int64 array of the total page views of each node (the "group" in
+                dict_to_nodes()).
+            "edges": An int32 array with a row of (source, target) node indices for each link.
+            "weights": An int64 array of the value of each link, which is the total page views
+                of its source.
+        The nodes and links are in the same order as in dict_to_nodes().
+    '''
+    if isinstance(_dict, CategoryGraph):
+        names = _dict.member_titles()
+        views = _dict.total_views.astype(np.int64)
+        sources, targets = _dict.edges()
+    else:
+        names = list(_dict)
+        views = np.fromiter((entry['total_views'] for entry in _dict.values()), dtype=np.int64,
+                            count=len(names))
+        index = {name: i for i, name in enumerate(names)}
+        counts = np.fromiter((len(entry['linkshere_within_category']) for entry in _dict.values()),
+                             dtype=np.int64, count=len(names))
+        sources = np.repeat(np.arange(len(names), dtype=np.int64), counts)
+        targets = np.fromiter((index[target] for entry in _dict.values()
+                               for target in entry['linkshere_within_category']),
+                              dtype=np.int64, count=int(counts.sum()))
+
+    edges = np.empty((len(sources), 2), dtype=np.int32)
+    edges[:, 0] = sources
+    edges[:, 1] = targets
+    return {'names': names, 'views': views, 'edges': edges, 'weights': views[sources]}
+
+
+def to_igraph(_dict, directed=False):
+    '''
+    Builds an igraph Graph from a dictionary of sources and targets, without going through
+    dict_to_nodes(). Requires python-igraph.
+
+    Parameters:
+        _dict (dict): A dictionary of sources and targets, as used by dict_to_nodes(). A
+            CategoryGraph can be passed instead.
+        directed: Optional. A boolean that is True if the graph should be directed. Defaults to
+            False, which matches the graph built in the notebook.
+
+    Returns:
+        An igraph Graph with a vertex for each node and an edge for each link, in the same order as
+        dict_to_nodes(). Vertices have "name" and "views" attributes, and edges have a "weight"
+        attribute.
+    '''
+    # imported here so the rest of the helpers can be used without igraph installed
+    import igraph
+
+    arrays = dict_to_edge_arrays(_dict)
+    graph = igraph.Graph(n=len(arrays['names']), edges=arrays['edges'], directed=directed)
+    graph.vs['name'] = arrays['names']
+    graph.vs['views'] = arrays['views'].tolist()
+    graph.es['weight'] = arrays['weights'].tolist()
+    return graph
@@ -0,0 +1,315 @@
+'''
+3D layouts for category graphs, with caching and warm starts.
+
+Laying out a graph with Kamada-Kawai is the slowest part of making the network plots, so layouts
+are cached on disk under a hash of the graph, and running the same graph again just loads its
+layout. When a graph has only changed a little (for example, after its data was refreshed with
+get_data.py -u), the new layout starts from the coordinates of the old one instead of from
+scratch, which needs far fewer iterations. Graphs above a configurable size use the faster
+Fruchterman-Reingold algorithm instead, and graphs above a second size use DrL, since each
+Fruchterman-Reingold iteration compares every pair of nodes in 3D. A layout is cached under the
+algorithm and parameters it was made with as well as the graph, so changing them (or starting
+from a different previous layout) doesn't load a layout made another way.
+
+igraph is needed to compute layouts, but not to load cached ones.
+
+Authors: Jacob Smilg and Markus Leschly
+'''
+
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from helpers import dict_to_edge_arrays
+
+
+DEFAULT_MAX_KK_NODES = 1000
+DEFAULT_MAX_FR_NODES = 5000
+DEFAULT_DIM = 3
+
+FR_ITERATIONS = 500
+# iterations used when starting from a previous layout, as opposed to igraph's defaults of
+# 50 * the number of nodes for Kamada-Kawai and FR_ITERATIONS for Fruchterman-Reingold
+WARM_KK_ITERATIONS_PER_NODE = 10
+WARM_FR_ITERATIONS = 100
+# the DrL settings used from scratch and when starting from a previous layout
+DRL_OPTIONS = 'default'
+WARM_DRL_OPTIONS = 'refine'
+
+
+class GraphLayout:
+    '''
+    The coordinates of every node in a graph.
+
+    Attributes:
+        names: A list of the name of each node.
+        coords: A float64 array with a row of coordinates for each node.
+        key: A string representing the hash of the graph the layout is for.
+        algorithm: A string representing the igraph layout algorithm used ('kk', 'fr' or
+            'drl').
+    '''
+    __slots__ = ('names', 'coords', 'key', 'algorithm')
+
+    def __init__(self, names, coords, key, algorithm):
+        self.names = names
+        self.coords = coords
+        self.key = key
+        self.algorithm = algorithm
+
+    def __len__(self):
+        return len(self.names)
+
+    def positions(self):
+        '''
+        Returns:
+            A dictionary mapping each node's name to its row of coordinates.
+        '''
+        return dict(zip(self.names, self.coords))
+
+
+class LayoutCache:
+    '''
+    A directory of layouts saved as .npz files named after the hash of their graph.
+
+    Attributes:
+        path: A string representing the path of the directory.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, f'{key}.npz')
+
+    def get(self, key):
+        '''
+        Loads the layout of a graph.
+
+        Parameters:
+            key: A string representing the hash of the layout, as returned by layout_key().
+
+        Returns:
+            A GraphLayout, or None if the graph hasn't been laid out this way before.
+        '''
+        try:
+            with np.load(self._file(key)) as bundle:
+                return GraphLayout(bundle['names'].tolist(), bundle['coords'],
+                                   str(bundle['key']), str(bundle['algorithm']))
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, layout):
+        '''
+        Saves a layout, replacing any older layout saved under the same key.
+
+        Parameters:
+            key: A string representing the hash of the layout, as returned by layout_key().
+            layout: The GraphLayout to save.
+        '''
+        path = self._file(key)
+        temp_path = f'{path}.tmp.npz'
+        np.savez(temp_path, names=np.array(layout.names, dtype=str), coords=layout.coords,
+                 key=np.array(layout.key), algorithm=np.array(layout.algorithm))
+        os.replace(temp_path, path)
+
+
+def _edge_arrays(nodes):
+    '''
+    Gets the names and edges of a graph given in any of the formats layout_graph() accepts.
+
+    Returns:
+        A tuple of (names, edges), where edges is an int32 array of (source, target) rows.
+    '''
+    if isinstance(nodes, dict) and 'links' in nodes:
+        names = [node['name'] for node in nodes['nodes']]
+        edges = np.array([(link['source'], link['target']) for link in nodes['links']],
+                         dtype=np.int32).reshape(-1, 2)
+        return names, edges
+    if not (isinstance(nodes, dict) and 'edges' in nodes):
+        nodes = dict_to_edge_arrays(nodes)
+    return nodes['names'], nodes['edges']
+
+
+def graph_key(names, edges, dim=DEFAULT_DIM):
+    '''
+    Hashes a graph, so any change to its nodes (or their order) or edges gives a new key.
+
+    Parameters:
+        names: A list of the name of each node.
+        edges: An array with a row of (source, target) node indices for each edge.
+        dim: Optional. The number of dimensions the graph will be laid out in. Defaults to
+            DEFAULT_DIM.
+
+    Returns:
+        A string representing the SHA-256 hash of the graph.
+    '''
+    digest = hashlib.sha256(f'{dim}\n{len(names)}\n'.encode('utf-8'))
+    digest.update('\n'.join(names).encode('utf-8'))
+    digest.update(np.ascontiguousarray(edges, dtype=np.int32).tobytes())
+    return digest.hexdigest()
+
+
+def layout_key(key, algorithm, params):
+    '''
+    Hashes everything a layout is made from: the graph, the algorithm and its parameters.
+
+    Parameters:
+        key: A string representing the hash of the graph, as returned by graph_key().
+        algorithm: A string representing the igraph layout algorithm ('kk', 'fr' or 'drl').
+        params: A dictionary of the parameters the layout is made with, including where it
+            starts from.
+
+    Returns:
+        A string representing the SHA-256 hash of the layout's inputs.
+    '''
+    encoded = json.dumps({'graph': key, 'algorithm': algorithm, 'params': params},
+                         sort_keys=True)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def choose_algorithm(num_nodes, max_kk_nodes=DEFAULT_MAX_KK_NODES,
+                     max_fr_nodes=DEFAULT_MAX_FR_NODES):
+    '''
+    Picks the layout algorithm for a graph by its size.
+
+    Parameters:
+        num_nodes: An int representing the number of nodes in the graph.
+        max_kk_nodes: Optional. See layout_graph().
+        max_fr_nodes: Optional. See layout_graph().
+
+    Returns:
+        A string representing the igraph layout algorithm to use: 'kk' (Kamada-Kawai), 'fr'
+        (Fruchterman-Reingold) or 'drl' (DrL).
+    '''
+    if num_nodes <= max_kk_nodes:
+        return 'kk'
+    if num_nodes <= max_fr_nodes:
+        return 'fr'
+    return 'drl'
+
+
+def _coords_hash(layout):
+    '''
+    Returns:
+        A string representing the SHA-256 hash of a layout's names and coordinates.
+    '''
+    digest = hashlib.sha256('\n'.join(layout.names).encode('utf-8'))
+    digest.update(np.ascontiguousarray(layout.coords, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def seed_coords(names, edges, previous, seed=None):
+    '''
+    Makes starting coordinates for a layout from the layout of an older version of the graph.
+
+    Nodes that were in the old layout keep their coordinates. New nodes are placed at the average
+    of their already-placed neighbours, or at a random point within the old layout if they have
+    none.
+
+    Parameters:
+        names: A list of the name of each node.
+        edges: An array with a row of (source, target) node indices for each edge.
+        previous: The GraphLayout of the older graph.
+        seed: Optional. An int to seed the random placement of new nodes with. Defaults to None.
+
+    Returns:
+        A float64 array with a row of coordinates for each node.
+    '''
+    dim = previous.coords.shape[1]
+    old_positions = previous.positions()
+    coords = np.zeros((len(names), dim))
+    placed = np.zeros(len(names), dtype=bool)
+    for i, name in enumerate(names):
+        if name in old_positions:
+            coords[i] = old_positions[name]
+            placed[i] = True
+
+    # place new nodes next to their neighbours, spreading out from the old layout
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    both_ways = np.concatenate([edges, edges[:, ::-1]])
+    while not placed.all():
+        known = both_ways[placed[both_ways[:, 1]] & ~placed[both_ways[:, 0]]]
+        if len(known) == 0:
+            break
+        sums = np.zeros_like(coords)
+        np.add.at(sums, known[:, 0], coords[known[:, 1]])
+        counts = np.bincount(known[:, 0], minlength=len(names))
+        newly_placed = counts > 0
+        coords[newly_placed] = sums[newly_placed] / counts[newly_placed, None]
+        placed |= newly_placed
+
+    if not placed.all():
+        rng = np.random.default_rng(seed)
+        if len(previous):
+            low, high = previous.coords.min(axis=0), previous.coords.max(axis=0)
+        else:
+            low, high = -np.ones(dim), np.ones(dim)
+        coords[~placed] = rng.uniform(low, high, size=(int((~placed).sum()), dim))
+    return coords
+
+
+def layout_graph(nodes, cache=None, previous=None, max_kk_nodes=DEFAULT_MAX_KK_NODES,
+                 dim=DEFAULT_DIM, seed=None, max_fr_nodes=DEFAULT_MAX_FR_NODES):
+    '''
+    Lays out a graph in 3D, using a cached layout if there is one.
+
+    Parameters:
+        nodes: The graph to lay out, as returned by helpers.dict_to_nodes() or
+            helpers.dict_to_edge_arrays(). A dictionary of category data or a CategoryGraph can
+            also be passed, which is converted with dict_to_edge_arrays().
+        cache: Optional. A LayoutCache to load the layout from and save it to. Defaults to None.
+        previous: Optional. The GraphLayout of an older version of the graph to start from, such
+            as before its data was refreshed. Defaults to None, which starts from scratch.
+        max_kk_nodes: Optional. An int representing the most nodes to use Kamada-Kawai for.
+            Larger graphs use Fruchterman-Reingold. Defaults to DEFAULT_MAX_KK_NODES.
+        dim: Optional. The number of dimensions to lay the graph out in. Defaults to DEFAULT_DIM.
+        seed: Optional. An int to seed the random placement of new nodes with when starting from
+            a previous layout. Defaults to None.
+        max_fr_nodes: Optional. An int representing the most nodes to use Fruchterman-Reingold
+            for. Larger graphs use DrL, which scales to many more nodes. Defaults to
+            DEFAULT_MAX_FR_NODES.
+
+    Returns:
+        A GraphLayout of the graph.
+    '''
+    names, edges = _edge_arrays(nodes)
+    key = graph_key(names, edges, dim)
+    if previous is not None and previous.key == key:
+        return previous
+    warm = previous is not None and previous.coords.shape[1] == dim
+
+    algorithm = choose_algorithm(len(names), max_kk_nodes, max_fr_nodes)
+    if algorithm == 'kk':
+        params = {'maxiter': WARM_KK_ITERATIONS_PER_NODE * max(len(names), 1) if warm else None}
+    elif algorithm == 'fr':
+        params = {'niter': WARM_FR_ITERATIONS if warm else FR_ITERATIONS}
+    else:
+        params = {'options': WARM_DRL_OPTIONS if warm else DRL_OPTIONS}
+    params.update(max_kk_nodes=max_kk_nodes, max_fr_nodes=max_fr_nodes,
+                  start=[_coords_hash(previous), seed] if warm else None)
+    cache_key = layout_key(key, algorithm, params)
+    if cache is not None:
+        layout = cache.get(cache_key)
+        if layout is not None:
+            return layout
+
+    # imported here so cached layouts can be loaded without igraph installed
+    import igraph
+
+    graph = igraph.Graph(n=len(names), edges=edges, directed=False)
+    start = seed_coords(names, edges, previous, seed).tolist() if warm else None
+    if algorithm == 'kk':
+        result = graph.layout_kamada_kawai(seed=start, maxiter=params['maxiter'], dim=dim)
+    elif algorithm == 'fr':
+        result = graph.layout_fruchterman_reingold(seed=start, niter=params['niter'], dim=dim)
+    else:
+        result = graph.layout_drl(seed=start, options=params['options'], dim=dim)
+
+    coords = np.array(result.coords, dtype=np.float64).reshape(len(names), dim)
+    layout = GraphLayout(names, coords, key, algorithm)
+    if cache is not None:
+        cache.put(cache_key, layout)
+    return layout
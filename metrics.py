@@ -0,0 +1,424 @@
+'''
+Metrics for monitoring crawls of Wikipedia categories.
+
+A CrawlMetrics object counts the requests sent to Wikipedia, the bytes received, how long each
+request took (as a histogram) and how many continue requests each query needed, along with how
+many pages of each category have been crawled. It can write all of this every few seconds as a
+line of JSON or as a Prometheus text file (for node_exporter's textfile collector), so scheduled
+crawls can be monitored and slow categories spotted without watching a terminal.
+
+Authors: Jacob Smilg and Markus Leschly
+'''
+
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)    # seconds
+CONTINUATION_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)    # continue requests per query
+DEFAULT_INTERVAL = 10.0     # seconds between writes
+PROMETHEUS_SUFFIX = '.prom'
+METRIC_PREFIX = 'wiki_crawl'
+# parameters that don't change between the requests for one query
+IGNORED_PARAMS = ('format', 'action', 'maxlag')
+
+
+class Histogram:
+    '''
+    Counts values into buckets, the same way as a Prometheus histogram.
+
+    Attributes:
+        buckets: A tuple of the upper bound of each bucket, in increasing order. Values above the
+            last bound are counted in an extra bucket.
+        counts: A list of the number of values in each bucket (not cumulative), with one more
+            entry than buckets.
+        sum: The total of every value counted.
+        count: The number of values counted.
+    '''
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        '''
+        Counts a value into the first bucket whose upper bound is at least the value.
+        '''
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        '''
+        Estimates a quantile of the values counted.
+
+        Parameters:
+            q: A float between 0 and 1, such as 0.95 for the 95th percentile.
+
+        Returns:
+            The upper bound of the bucket the quantile falls in (infinity for the extra bucket),
+            or None if nothing has been counted.
+        '''
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank and seen > 0:
+                return bound
+        return float('inf')
+
+    def to_dict(self):
+        '''
+        Returns:
+            A dictionary of the histogram's buckets, counts, sum, count, mean and estimated
+            median and 95th percentile.
+        '''
+        return {
+            'buckets': list(self.buckets),
+            'counts': list(self.counts),
+            'sum': self.sum,
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+        }
+
+
+def query_key(params):
+    '''
+    Gets a key that is the same for every request of one query, whatever its continue
+    parameters are.
+
+    Parameters:
+        params: A dictionary of API request parameters.
+
+    Returns:
+        A tuple of the request's parameters, without the continue parameters and the ones in
+        IGNORED_PARAMS.
+    '''
+    return tuple(sorted((key, str(value)) for key, value in params.items()
+                        if not key.endswith('continue') and key not in IGNORED_PARAMS))
+
+
+def response_size(result):
+    '''
+    Returns:
+        The number of bytes in a response when encoded as JSON. MediaWiki doesn't keep the raw
+        response around, so this is close to (but not exactly) the size that was downloaded.
+    '''
+    return len(json.dumps(result, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+class CrawlMetrics:
+    '''
+    Thread-safe metrics for one run of get_data.py, shared by every category being crawled.
+
+    Attributes:
+        path: A string representing the path to write the metrics to, or None to not write
+            them. Paths ending in PROMETHEUS_SUFFIX are written as a Prometheus text file, and
+            anything else has a line of JSON appended to it each time.
+        interval: A float representing the least number of seconds between writes.
+        requests: The number of requests that got a response.
+        errors: The number of requests that raised an error.
+        bytes: The number of bytes received (see response_size()).
+        latency: A Histogram of the number of seconds each request took.
+        continuations: A Histogram of the number of continue requests each finished query needed.
+    '''
+
+    def __init__(self, path=None, interval=DEFAULT_INTERVAL):
+        '''
+        Creates a set of metrics, starting the clock for pages per second.
+
+        Parameters:
+            path: Optional. The path to write the metrics to. Defaults to None.
+            interval: Optional. The least number of seconds between writes. Defaults to
+                DEFAULT_INTERVAL.
+        '''
+        self.path = path
+        self.interval = interval
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.continuations = Histogram(CONTINUATION_BUCKETS)
+        self._depths = {}
+        self._categories = {}
+        self._start_time = time.monotonic()
+        self._last_write = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def _category(self, category):
+        '''
+        Gets the counters for a category, adding them if needed. Must be called with the lock
+        held.
+        '''
+        if category not in self._categories:
+            self._categories[category] = {'requests': 0, 'errors': 0, 'seconds': 0.0,
+                                          'pages_done': 0, 'pages_total': None,
+                                          'start_pages': None}
+        return self._categories[category]
+
+    def record_request(self, params, seconds, result=None, category=None):
+        '''
+        Records a request sent to Wikipedia.
+
+        Parameters:
+            params: A dictionary of the request's parameters.
+            seconds: A float representing the number of seconds the request took.
+            result: Optional. The dictionary the request returned. Defaults to None, which means
+                the request failed.
+            category: Optional. A string representing the category the request was sent for.
+                Defaults to None.
+        '''
+        key = query_key(params)
+        continued = any(name.endswith('continue') for name in params)
+        size = 0 if result is None else response_size(result)
+        with self._lock:
+            counters = self._category(category)
+            counters['seconds'] += seconds
+            if result is None:
+                self.errors += 1
+                counters['errors'] += 1
+            else:
+                self.requests += 1
+                counters['requests'] += 1
+                self.bytes += size
+                self.latency.observe(seconds)
+                depth = self._depths.pop(key, 0) + 1 if continued else 0
+                if result.get('continue'):
+                    self._depths[key] = depth
+                else:
+                    self.continuations.observe(depth)
+        self.maybe_write()
+
+    def progress(self, category, pages_done, pages_total=None):
+        '''
+        Records how far along the crawl of a category is.
+
+        Parameters:
+            category: A string representing the name of the category.
+            pages_done: An int representing the number of the category's pages that have been
+                crawled, including any from a checkpoint.
+            pages_total: Optional. An int representing the number of pages in the category, or
+                None if it isn't known yet. Defaults to None.
+        '''
+        with self._lock:
+            counters = self._category(category)
+            if counters['start_pages'] is None:
+                counters['start_pages'] = pages_done
+            counters['pages_done'] = pages_done
+            counters['pages_total'] = pages_total
+        self.maybe_write()
+
+    def snapshot(self):
+        '''
+        Gets the current value of every metric.
+
+        Returns:
+            A dictionary of the metrics, with the time, the seconds since the metrics were
+            created, the request counters, the latency and continuation histograms, the pages
+            crawled, the pages per second (not counting pages from checkpoints), the estimated
+            number of seconds left (None until the size of every category is known) and the
+            counters of each category.
+        '''
+        with self._lock:
+            elapsed = time.monotonic() - self._start_time
+            categories = {category: dict(counters) for category, counters
+                          in self._categories.items() if category is not None}
+            snapshot = {
+                'time': time.time(),
+                'elapsed_seconds': elapsed,
+                'requests': self.requests,
+                'errors': self.errors,
+                'bytes': self.bytes,
+                'latency_seconds': self.latency.to_dict(),
+                'continuation_depth': self.continuations.to_dict(),
+            }
+        pages_done = sum(counters['pages_done'] for counters in categories.values())
+        new_pages = sum(counters['pages_done'] - (counters['start_pages'] or 0)
+                        for counters in categories.values())
+        totals = [counters['pages_total'] for counters in categories.values()]
+        pages_total = None if None in totals else sum(totals)
+        pages_per_second = new_pages / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if pages_total is not None and pages_per_second > 0:
+            eta = max(0, pages_total - pages_done) / pages_per_second
+        elif pages_total is not None and pages_done >= pages_total:
+            eta = 0.0
+        for counters in categories.values():
+            del counters['start_pages']
+        snapshot.update(pages_done=pages_done, pages_total=pages_total,
+                        pages_per_second=pages_per_second, eta_seconds=eta,
+                        categories=categories)
+        return snapshot
+
+    def maybe_write(self):
+        '''
+        Writes the metrics if there is a path to write them to and at least interval seconds
+        have passed since the last write.
+        '''
+        if self.path is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._last_write is not None and now - self._last_write < self.interval:
+                return
+            self._last_write = now
+        self.write()
+
+    def write(self):
+        '''
+        Writes the metrics to path right away.
+        '''
+        if self.path is None:
+            return
+        snapshot = self.snapshot()
+        with self._write_lock:
+            if self.path.endswith(PROMETHEUS_SUFFIX):
+                # the textfile collector could read a half-written file, so replace it in one go
+                temp_path = self.path + '.tmp'
+                with open(temp_path, 'w') as file:
+                    file.write(to_prometheus(snapshot))
+                os.replace(temp_path, self.path)
+            else:
+                with open(self.path, 'a') as file:
+                    file.write(json.dumps(snapshot, sort_keys=True) + '\n')
+
+
+def _format_value(value):
+    '''
+    Formats a number the way Prometheus expects it.
+    '''
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape_label(value):
+    '''
+    Escapes a label value for the Prometheus text format.
+    '''
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(name, histogram, help_text):
+    '''
+    Gets the lines of a histogram from a snapshot in the Prometheus text format.
+    '''
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    cumulative = 0
+    for bound, count in zip(histogram['buckets'] + [float('inf')], histogram['counts']):
+        cumulative += count
+        lines.append(f'{name}_bucket{{le="{_format_value(bound)}"}} {cumulative}')
+    lines.append(f"{name}_sum {_format_value(histogram['sum'])}")
+    lines.append(f"{name}_count {histogram['count']}")
+    return lines
+
+
+def to_prometheus(snapshot):
+    '''
+    Formats a snapshot of the metrics as a Prometheus text file.
+
+    Parameters:
+        snapshot: A dictionary returned by CrawlMetrics.snapshot().
+
+    Returns:
+        A string of the metrics in the Prometheus text exposition format.
+    '''
+    lines = []
+
+    def add(name, metric_type, help_text, value, labels=None):
+        if value is None:
+            return
+        name = f'{METRIC_PREFIX}_{name}'
+        if not any(line.startswith(f'# TYPE {name} ') for line in lines):
+            lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}'])
+        label_text = ''
+        if labels:
+            label_text = '{' + ','.join(f'{key}="{_escape_label(label)}"'
+                                        for key, label in labels.items()) + '}'
+        lines.append(f'{name}{label_text} {_format_value(value)}')
+
+    add('requests_total', 'counter', 'Requests sent to Wikipedia that got a response.',
+        snapshot['requests'])
+    add('errors_total', 'counter', 'Requests sent to Wikipedia that failed.', snapshot['errors'])
+    add('response_bytes_total', 'counter', 'Bytes of JSON received from Wikipedia.',
+        snapshot['bytes'])
+    lines.extend(_histogram_lines(f'{METRIC_PREFIX}_request_duration_seconds',
+                                  snapshot['latency_seconds'], 'Time taken by each request.'))
+    lines.extend(_histogram_lines(f'{METRIC_PREFIX}_continuation_depth',
+                                  snapshot['continuation_depth'],
+                                  'Continue requests needed by each query.'))
+    add('elapsed_seconds', 'gauge', 'Seconds since the crawl started.',
+        snapshot['elapsed_seconds'])
+    add('pages_done', 'gauge', 'Pages crawled so far.', snapshot['pages_done'])
+    add('pages_total', 'gauge', 'Pages in every category being crawled.',
+        snapshot['pages_total'])
+    add('pages_per_second', 'gauge', 'Pages crawled per second.', snapshot['pages_per_second'])
+    add('eta_seconds', 'gauge', 'Estimated seconds until the crawl finishes.',
+        snapshot['eta_seconds'])
+    for category, counters in sorted(snapshot['categories'].items()):
+        labels = {'category': category}
+        add('category_requests_total', 'counter', 'Requests sent for each category.',
+            counters['requests'], labels)
+        add('category_request_seconds_total', 'counter',
+            'Seconds spent on the requests for each category.', counters['seconds'], labels)
+        add('category_pages_done', 'gauge', 'Pages crawled in each category.',
+            counters['pages_done'], labels)
+        add('category_pages_total', 'gauge', 'Pages in each category.',
+            counters['pages_total'], labels)
+    return '\n'.join(lines) + '\n'
+
+
+class MeteredWiki:
+    '''
+    Wraps a MediaWiki instance so every call to wiki_request() is recorded in a CrawlMetrics.
+
+    It should wrap the instance that actually sends requests (inside any rate limiter or cache),
+    so the time spent waiting for the rate limiter isn't counted as latency, and cached responses
+    aren't counted as requests. Anything other than wiki_request() is passed straight through to
+    the wrapped instance.
+
+    Attributes:
+        wiki: The wrapped MediaWiki instance.
+        metrics: The CrawlMetrics to record requests in.
+        category: A string representing the category the requests are sent for, or None.
+    '''
+
+    def __init__(self, wiki, metrics, category=None):
+        self.wiki = wiki
+        self.metrics = metrics
+        self.category = category
+
+    def wiki_request(self, params):
+        '''
+        Sends a request through the wrapped MediaWiki instance and records how it went.
+
+        Parameters:
+            params: A dictionary of API request parameters.
+
+        Returns:
+            A dictionary of the parsed JSON response.
+        '''
+        # MediaWiki.wiki_request() adds to the parameters it's given, so keep the original ones
+        original = dict(params)
+        start = time.monotonic()
+        try:
+            result = self.wiki.wiki_request(params)
+        except Exception:
+            self.metrics.record_request(original, time.monotonic() - start,
+                                        category=self.category)
+            raise
+        self.metrics.record_request(original, time.monotonic() - start, result, self.category)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.wiki, name)
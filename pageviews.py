@@ -0,0 +1,212 @@
+'''
+A compact store of the daily page views of a category's pages.
+
+Instead of a dictionary of date strings for every page, the page views are kept in one array of
+days by pages, with a shared array of dates and a mask of which days each page has views for.
+Totals over any range of dates come from a running sum over the days, so ranking pages by (for
+example) their views in the last 7 days doesn't need any dates to be parsed.
+
+Authors: Jacob Smilg and Markus Leschly
+'''
+
+import numpy as np
+
+from graph import top_k
+from storage import PRESENT, load_pageviews
+
+
+class PageviewStore:
+    '''
+    The daily page views of a set of pages.
+
+    Attributes:
+        titles: A list of the title of each page.
+        dates: A datetime64[D] array of the days that any page has views for, in order.
+        views: An int64 array of days by pages, with 0 for days a page has no views for.
+        mask: A boolean array of days by pages that is True for the days each page has views for.
+    '''
+    __slots__ = ('titles', 'dates', 'views', 'mask', '_cumulative')
+
+    def __init__(self, titles, dates, views, mask):
+        self.titles = titles
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.views = np.asarray(views, dtype=np.int64)
+        self.mask = np.asarray(mask, dtype=bool)
+        self._cumulative = None
+
+    @classmethod
+    def from_dict(cls, data):
+        '''
+        Builds a store from a dataset.
+
+        Parameters:
+            data: A dictionary of Wikipedia category data as formatted by get_data.py. Only the
+                'pageviews' of each page are used. Days with a value of None count as missing.
+
+        Returns:
+            A new PageviewStore.
+        '''
+        titles = list(data)
+        date_strings = sorted({date for entry in data.values() for date in entry['pageviews']})
+        date_index = {date: i for i, date in enumerate(date_strings)}
+        rows, columns, values = [], [], []
+        for column, entry in enumerate(data.values()):
+            for date, value in entry['pageviews'].items():
+                if value is not None:
+                    rows.append(date_index[date])
+                    columns.append(column)
+                    values.append(value)
+        views = np.zeros((len(date_strings), len(titles)), dtype=np.int64)
+        mask = np.zeros(views.shape, dtype=bool)
+        views[rows, columns] = values
+        mask[rows, columns] = True
+        return cls(titles, np.array(date_strings, dtype='datetime64[D]'), views, mask)
+
+    @classmethod
+    def load(cls, path, top=None):
+        '''
+        Loads a store straight from a bundle saved by storage.save_dataset(), without building a
+        dictionary for each page.
+
+        Parameters:
+            path: A string representing the path of the bundle (.npz) to load.
+            top: Optional. An int representing the number of most viewed pages to load. Defaults
+                to None, which loads every page.
+
+        Returns:
+            A new PageviewStore, with the pages in descending order of total views.
+        '''
+        titles, dates, views, views_state = load_pageviews(path, top)
+        return cls(titles, dates.astype('datetime64[D]'), views, views_state == PRESENT)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def _cumulative_views(self):
+        '''
+        Returns:
+            An array of (days + 1) by pages, where row i is the total views before day i.
+        '''
+        if self._cumulative is None:
+            cumulative = np.zeros((len(self.dates) + 1, len(self.titles)), dtype=np.int64)
+            np.cumsum(self.views, axis=0, out=cumulative[1:])
+            self._cumulative = cumulative
+        return self._cumulative
+
+    def date_range(self, start=None, end=None):
+        '''
+        Finds the days that fall within a range of dates.
+
+        Parameters:
+            start: Optional. The first date to include, as a 'YYYY-MM-DD' string, a date or a
+                datetime64. Defaults to None, which starts at the first day.
+            end: Optional. The last date to include, in the same formats. Defaults to None, which
+                ends at the last day.
+
+        Returns:
+            A slice of the days (rows of views) within the range.
+        '''
+        first = 0 if start is None else int(np.searchsorted(
+            self.dates, np.datetime64(start, 'D'), side='left'))
+        last = len(self.dates) if end is None else int(np.searchsorted(
+            self.dates, np.datetime64(end, 'D'), side='right'))
+        return slice(first, max(first, last))
+
+    def total(self, start=None, end=None):
+        '''
+        Totals each page's views over a range of dates, including both ends.
+
+        Parameters:
+            start: Optional. See date_range().
+            end: Optional. See date_range().
+
+        Returns:
+            An int64 array of the total views of each page.
+        '''
+        days = self.date_range(start, end)
+        cumulative = self._cumulative_views()
+        return cumulative[days.stop] - cumulative[days.start]
+
+    def last(self, num_days):
+        '''
+        Totals each page's views over the most recent days.
+
+        Parameters:
+            num_days: An int representing the number of days to total, counting back from the
+                last day in the store (whether or not every one of those days has views).
+
+        Returns:
+            An int64 array of the total views of each page.
+        '''
+        if len(self.dates) == 0:
+            return np.zeros(len(self.titles), dtype=np.int64)
+        return self.total(start=self.dates[-1] - (num_days - 1))
+
+    def rolling(self, window):
+        '''
+        Totals each page's views over a rolling window of calendar days.
+
+        Parameters:
+            window: An int representing the number of days in the window. Days missing from the
+                store (where no page has views) still count towards it.
+
+        Returns:
+            An int64 array of days by pages, where row i is the total views over the window
+            ending on day i, the same as total(dates[i] - (window - 1), dates[i]). The first rows
+            total however many days there are before them.
+        '''
+        cumulative = self._cumulative_views()
+        ends = np.arange(1, len(self.dates) + 1)
+        starts = np.searchsorted(self.dates, self.dates - (window - 1), side='left')
+        return cumulative[ends] - cumulative[starts]
+
+    def growth(self, num_days):
+        '''
+        Compares each page's views over the most recent days to the same number of days before
+        them.
+
+        Parameters:
+            num_days: An int representing the number of days in each period.
+
+        Returns:
+            A float64 array of the growth rate of each page's views ((recent - before) / before),
+            which is NaN for pages without any views in the earlier period.
+        '''
+        recent = self.last(num_days)
+        before = self.last(2 * num_days) - recent
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = (recent - before) / before.astype(np.float64)
+        growth[before == 0] = np.nan
+        return growth
+
+    def rank(self, num_days=None, num_results=None):
+        '''
+        Ranks pages by their views.
+
+        Parameters:
+            num_days: Optional. An int representing the number of most recent days to rank by.
+                Defaults to None, which ranks by every day's views.
+            num_results: Optional. An int representing the number of most viewed pages to
+                return. Defaults to None, which returns every page.
+
+        Returns:
+            A list of (title, views) tuples in descending order of views, keeping the stored
+            order for ties.
+        '''
+        totals = self.total() if num_days is None else self.last(num_days)
+        return [(self.titles[i], int(totals[i])) for i in top_k(totals, num_results).tolist()]
+
+    def to_dict(self):
+        '''
+        Converts the store back to the 'pageviews' dictionaries used by get_data.py.
+
+        Returns:
+            A dictionary mapping each title to a dictionary of its views on each day it has
+            views for.
+        '''
+        date_strings = np.datetime_as_string(self.dates, unit='D').tolist()
+        views = self.views.T.tolist()
+        mask = self.mask.T
+        return {title: {date_strings[day]: views[column][day]
+                        for day in np.flatnonzero(mask[column]).tolist()}
+                for column, title in enumerate(self.titles)}
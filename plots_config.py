@@ -90,3 +90,27 @@ kk_axis_config = dict(
     showticklabels=False,
     title=''
 )
+
+# limits for plotting large categories, so the plots stay small and responsive in the browser
+large_plot_config = dict(
+    # scatter plots with more points than this are drawn with WebGL (Scattergl)
+    webgl_threshold=2000,
+    # network plots with more edges than this only draw the links between the most viewed pages
+    # (or an even sample of the links, when page views aren't given)
+    max_edges=20000,
+    # only this many of the most viewed points get hover text
+    max_hover_points=2000,
+    # hover text longer than this many characters is cut off
+    max_hover_length=60,
+)
+
+# the treemap of page views, saved as an image by render.py
+treemap_config = dict(
+    # past this many tiles, the least viewed pages are merged into one "others" tile
+    max_tiles=2000,
+    # only this many of the most viewed pages are labelled
+    num_labels=29,
+    colormap='twilight_shifted',
+    figsize=(16, 9),
+    dpi=150,
+)
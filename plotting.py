@@ -0,0 +1,210 @@
+'''
+Builds the plotly traces for the 3D network plot from NumPy arrays.
+
+Edges are drawn as a single line trace where each edge is a segment between its two nodes,
+followed by a gap. Instead of growing lists of coordinates one edge at a time, every segment is
+written into one array at once, with NaN marking the gaps.
+
+Large categories are plotted with the limits in plots_config.large_plot_config: scatter plots
+switch to WebGL, network plots only draw the links between the most viewed pages (or an even
+sample of the links, when page views aren't given), and hover text is cut down, so the generated
+HTML stays small enough for a browser to handle.
+
+Authors: Jacob Smilg and Markus Leschly
+'''
+
+import copy
+
+import numpy as np
+import plotly.graph_objs as go
+
+import plots_config
+from graph import top_k
+
+
+def edge_segments(coords, edges):
+    '''
+    Gets the coordinates of the lines that draw each edge, separated by NaN.
+
+    Parameters:
+        coords: An array with a row of coordinates for each node.
+        edges: An array with a row of (source, target) node indices for each edge.
+
+    Returns:
+        A float64 array with one column per dimension, where each edge takes three rows: the
+        coordinates of its source, the coordinates of its target, and NaN.
+    '''
+    coords = np.asarray(coords, dtype=np.float64)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    segments = np.full((len(edges), 3, coords.shape[1]), np.nan)
+    segments[:, 0] = coords[edges[:, 0]]
+    segments[:, 1] = coords[edges[:, 1]]
+    return segments.reshape(-1, coords.shape[1])
+
+
+def decimate_edges(edges, max_edges, weights=None):
+    '''
+    Picks which edges to draw when there are too many.
+
+    Parameters:
+        edges: An array with a row of (source, target) node indices for each edge.
+        max_edges: An int representing the most edges to keep, or None for no limit.
+        weights: Optional. An array of the weight of each edge, such as the "weights" returned by
+            helpers.dict_to_edge_arrays(). The heaviest edges are kept, keeping the original order
+            for ties. Defaults to None, which keeps an evenly spaced sample of the edges.
+
+    Returns:
+        An int64 array of the indices of the edges to keep, in their original order.
+    '''
+    num_edges = len(edges)
+    if max_edges is None or num_edges <= max_edges:
+        return np.arange(num_edges, dtype=np.int64)
+    if weights is None:
+        return np.unique(np.linspace(0, num_edges - 1, max_edges).astype(np.int64))
+    return np.sort(top_k(np.asarray(weights), max_edges))
+
+
+def cap_labels(labels, views=None, max_points=None, max_length=None):
+    '''
+    Cuts down hover text for large plots.
+
+    Parameters:
+        labels: A list of the hover text of each point.
+        views: Optional. An array of the page views of each point. Only the most viewed
+            max_points points keep their text. Defaults to None, which keeps the first ones.
+        max_points: Optional. An int representing the most points to keep text for. Defaults to
+            None, which keeps it for every point.
+        max_length: Optional. An int representing the most characters of text to keep for each
+            point. Defaults to None, which doesn't cut any text off.
+
+    Returns:
+        A new list of labels, where the points without text have an empty string.
+    '''
+    labels = list(labels)
+    if max_length is not None:
+        labels = [label if len(label) <= max_length else label[:max_length - 1] + '…'
+                  for label in labels]
+    if max_points is not None and len(labels) > max_points:
+        if views is None:
+            keep = range(max_points)
+        else:
+            keep = top_k(np.asarray(views), max_points).tolist()
+        capped = [''] * len(labels)
+        for i in keep:
+            capped[i] = labels[i]
+        labels = capped
+    return labels
+
+
+def scatter_trace(x, y, labels=None, config=None, large_config=None):
+    '''
+    Makes the trace of a scatter plot of pages, using WebGL if there are a lot of them.
+
+    Parameters:
+        x: A list or array of the x value of each page.
+        y: A list or array of the y value of each page. When there are too many pages for all of
+            them to get hover text, the pages with the largest y values keep theirs.
+        labels: Optional. A list of the hover text of each page. Defaults to None.
+        config: Optional. A dictionary of plot options. Defaults to
+            plots_config.scatter_plot_config.
+        large_config: Optional. A dictionary of limits for large plots. Defaults to
+            plots_config.large_plot_config.
+
+    Returns:
+        A Scatter trace, or a Scattergl trace if there are more points than the WebGL threshold.
+    '''
+    config = copy.deepcopy(plots_config.scatter_plot_config if config is None else config)
+    large_config = plots_config.large_plot_config if large_config is None else large_config
+    if labels is not None:
+        config['text'] = cap_labels(labels, y, large_config['max_hover_points'],
+                                    large_config['max_hover_length'])
+    if len(x) > large_config['webgl_threshold']:
+        return go.Scattergl(x=x, y=y, **config)
+    return go.Scatter(x=x, y=y, **config)
+
+
+def network_traces(coords, edges, views=None, labels=None, config=None, weights=None,
+                   large_config=None):
+    '''
+    Makes the traces of the 3D network plot: one for the edges and one for the nodes.
+
+    Parameters:
+        coords: An array with a row of (x, y, z) coordinates for each node, or a
+            layout.GraphLayout.
+        edges: An array with a row of (source, target) node indices for each edge, such as the
+            "edges" returned by helpers.dict_to_edge_arrays().
+        views: Optional. An array of the total page views of each node, which colors the nodes on
+            a log scale. Defaults to None, which leaves the colors to the config.
+        labels: Optional. A list of the hover text of each node. Defaults to None.
+        config: Optional. A dictionary with 'trace1' (edges) and 'trace2' (nodes) plot options.
+            Defaults to plots_config.network_plot_config. It is copied, so it isn't changed.
+        weights: Optional. An array of the weight of each edge, used to pick which edges to draw
+            when there are too many. Defaults to None, which ranks the edges by the total views
+            of their two nodes, or draws an even sample of them if views isn't given either.
+        large_config: Optional. A dictionary of limits for large plots. Defaults to
+            plots_config.large_plot_config.
+
+    Returns:
+        A list of the edge and node Scatter3d traces (which plotly always draws with WebGL).
+    '''
+    config = copy.deepcopy(plots_config.network_plot_config if config is None else config)
+    large_config = plots_config.large_plot_config if large_config is None else large_config
+    coords = np.asarray(getattr(coords, 'coords', coords), dtype=np.float64)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    max_edges = large_config['max_edges']
+    if weights is None and views is not None and max_edges is not None and len(edges) > max_edges:
+        node_views = np.asarray(views, dtype=np.int64)
+        weights = node_views[edges[:, 0]] + node_views[edges[:, 1]]
+    edges = edges[decimate_edges(edges, max_edges, weights)]
+    segments = edge_segments(coords, edges)
+    edge_trace = go.Scatter3d(x=segments[:, 0], y=segments[:, 1], z=segments[:, 2],
+                              **config['trace1'])
+
+    node_config = config['trace2']
+    if views is not None:
+        node_config.setdefault('marker', {})['color'] = np.log10(
+            np.maximum(np.asarray(views, dtype=np.float64), 1))
+    if labels is not None:
+        node_config['text'] = cap_labels(labels, views, large_config['max_hover_points'],
+                                         large_config['max_hover_length'])
+    node_trace = go.Scatter3d(x=coords[:, 0], y=coords[:, 1], z=coords[:, 2], **node_config)
+    return [edge_trace, node_trace]
+
+
+def network_layout(title=None):
+    '''
+    Makes the layout of the 3D network plot from plots_config, with the axes hidden.
+
+    Parameters:
+        title: Optional. A string to use as the title of the plot. Defaults to None, which uses
+            the title in plots_config.network_layout_config.
+
+    Returns:
+        A plotly Layout.
+    '''
+    layout_config = copy.deepcopy(plots_config.network_layout_config)
+    axis = plots_config.kk_axis_config
+    layout_config['scene'] = dict(xaxis=dict(axis), yaxis=dict(axis), zaxis=dict(axis),
+                                  bgcolor='rgb(22,16,25)')
+    if title is not None:
+        layout_config['title'] = title
+    return go.Layout(**layout_config)
+
+
+def network_figure(coords, edges, views=None, labels=None, title=None, weights=None):
+    '''
+    Makes the 3D network plot.
+
+    Parameters:
+        coords: See network_traces().
+        edges: See network_traces().
+        views: Optional. See network_traces().
+        labels: Optional. See network_traces().
+        title: Optional. See network_layout().
+        weights: Optional. See network_traces().
+
+    Returns:
+        A plotly Figure.
+    '''
+    return go.Figure(data=network_traces(coords, edges, views, labels, weights=weights),
+                     layout=network_layout(title))
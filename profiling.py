@@ -0,0 +1,262 @@
+'''
+Opt-in profiling of the data processing functions.
+
+Functions decorated with traced() run exactly as before, unless a profile() block is active. Inside
+one, every call records how long it took, how much memory it allocated (with tracemalloc) and the
+sizes of its input and output. The records can be summarized for each function, or appended to a
+JSON lines file so the numbers from many runs can be put together later.
+
+    with profile() as profiler:
+        data = trim_dict(common_links(data), 150)
+    print(profiler.report())
+
+Memory is measured for the whole process, so calls running at the same time in other threads
+are counted in each other's memory use. Tracing memory also slows Python down a fair bit, so
+profile(memory=False) only measures time and sizes.
+
+Authors: Jacob Smilg and Markus Leschly
+'''
+
+import json
+import time
+import functools
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+
+# the profilers of every active profile() block
+_profilers = []
+_profilers_lock = threading.Lock()
+# the memory peaks of the traced calls each thread is inside of
+_local = threading.local()
+
+
+def size_of(value):
+    '''
+    Gets the size of a function's input or output.
+
+    Returns:
+        The len() of the value, or None if it doesn't have one.
+    '''
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+class Profiler:
+    '''
+    Collects the records of traced calls made inside a profile() block.
+
+    Attributes:
+        memory: A boolean that is True if memory use is being measured.
+        records: A list of a dictionary for each call, in the order they finished, with the keys
+            'function', 'seconds', 'allocated_bytes' (the memory still allocated when the call
+            returned), 'peak_bytes' (the most memory allocated during the call), 'input_size',
+            'output_size' and 'error' (the name of the exception raised, or None). The memory
+            values are None if memory isn't being measured.
+    '''
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.records = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        '''
+        Adds the record of a call.
+        '''
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self):
+        '''
+        Returns:
+            A dictionary mapping the name of each function to its totals (see summarize()).
+        '''
+        with self._lock:
+            return summarize(self.records)
+
+    def report(self):
+        '''
+        Returns:
+            A string of a table of each function's totals, with the slowest functions first.
+        '''
+        return format_summary(self.summary())
+
+    def write(self, path):
+        '''
+        Appends every record to a JSON lines file, with the time they were written.
+
+        Parameters:
+            path: A string representing the path of the file.
+        '''
+        written = time.time()
+        with self._lock, open(path, 'a') as file:
+            for record in self.records:
+                file.write(json.dumps(dict(record, time=written), sort_keys=True) + '\n')
+
+
+def summarize(records):
+    '''
+    Totals the records of traced calls for each function.
+
+    Parameters:
+        records: An iterable of records, as in Profiler.records or load_records().
+
+    Returns:
+        A dictionary mapping the name of each function to a dictionary of its number of 'calls'
+        and 'errors', its 'total_seconds', 'mean_seconds' and 'max_seconds', its
+        'total_allocated_bytes' and 'max_peak_bytes' (None if memory wasn't measured), and its
+        'total_input_size' and 'total_output_size'.
+    '''
+    summary = {}
+    for record in records:
+        totals = summary.setdefault(record['function'], {
+            'calls': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0,
+            'total_allocated_bytes': None, 'max_peak_bytes': None,
+            'total_input_size': 0, 'total_output_size': 0})
+        totals['calls'] += 1
+        totals['errors'] += record['error'] is not None
+        totals['total_seconds'] += record['seconds']
+        totals['max_seconds'] = max(totals['max_seconds'], record['seconds'])
+        if record['allocated_bytes'] is not None:
+            totals['total_allocated_bytes'] = ((totals['total_allocated_bytes'] or 0)
+                                               + record['allocated_bytes'])
+            totals['max_peak_bytes'] = max(totals['max_peak_bytes'] or 0, record['peak_bytes'])
+        totals['total_input_size'] += record['input_size'] or 0
+        totals['total_output_size'] += record['output_size'] or 0
+    for totals in summary.values():
+        totals['mean_seconds'] = totals['total_seconds'] / totals['calls']
+    return summary
+
+
+def format_summary(summary):
+    '''
+    Formats a summary from summarize() as a table.
+
+    Returns:
+        A string of the table, with the slowest functions (by total time) first.
+    '''
+    def megabytes(value):
+        return '-' if value is None else f'{value / (1024 * 1024):.1f}'
+
+    lines = [f"{'function':<20} {'calls':>6} {'total s':>9} {'mean s':>9} {'max s':>9} "
+             f"{'alloc MB':>9} {'peak MB':>9} {'in':>9} {'out':>9}"]
+    for name, totals in sorted(summary.items(), key=lambda item: -item[1]['total_seconds']):
+        lines.append(f"{name:<20} {totals['calls']:>6} {totals['total_seconds']:>9.4f} "
+                     f"{totals['mean_seconds']:>9.4f} {totals['max_seconds']:>9.4f} "
+                     f"{megabytes(totals['total_allocated_bytes']):>9} "
+                     f"{megabytes(totals['max_peak_bytes']):>9} "
+                     f"{totals['total_input_size']:>9} {totals['total_output_size']:>9}")
+    return '\n'.join(lines)
+
+
+def load_records(path):
+    '''
+    Loads the records written by Profiler.write(), such as from several runs.
+
+    Returns:
+        A list of the records in the file.
+    '''
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+@contextmanager
+def profile(memory=True):
+    '''
+    Records every traced call made inside the block. Blocks can be nested, in which case the
+    calls are recorded by every one of them.
+
+    Parameters:
+        memory: Optional. A boolean that should be set to True to measure memory use as well
+            as time. tracemalloc is started for the block if it isn't already running. Defaults
+            to True.
+
+    Yields:
+        The Profiler the calls are recorded in.
+    '''
+    profiler = Profiler(memory)
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    with _profilers_lock:
+        _profilers.append(profiler)
+    try:
+        yield profiler
+    finally:
+        with _profilers_lock:
+            _profilers.remove(profiler)
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def _run_traced(function, name, input_size, output_size, args, kwargs):
+    '''
+    Runs a traced function inside a profile() block and records the call.
+    '''
+    profilers = list(_profilers)
+    memory = any(profiler.memory for profiler in profilers) and tracemalloc.is_tracing()
+    stack = _local.__dict__.setdefault('peaks', [])
+    first_arg = args[0] if args else next(iter(kwargs.values()), None)
+    record = {'function': name, 'seconds': 0.0, 'allocated_bytes': None, 'peak_bytes': None,
+              'input_size': input_size(first_arg), 'output_size': None, 'error': None}
+
+    if memory:
+        start_bytes, peak_before = tracemalloc.get_traced_memory()
+        # resetting the peak would hide the peak so far from the call this one is inside of
+        if stack:
+            stack[-1] = max(stack[-1], peak_before)
+        tracemalloc.reset_peak()
+    stack.append(0)
+    start = time.perf_counter()
+    try:
+        result = function(*args, **kwargs)
+    except BaseException as error:
+        record['error'] = type(error).__name__
+        raise
+    else:
+        record['output_size'] = output_size(result)
+        return result
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        inner_peak = stack.pop()
+        if memory:
+            current_bytes, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, inner_peak)
+            if stack:
+                stack[-1] = max(stack[-1], peak)
+            record['allocated_bytes'] = current_bytes - start_bytes
+            record['peak_bytes'] = peak - start_bytes
+        for profiler in profilers:
+            profiler.add(dict(record))
+
+
+def traced(name=None, input_size=size_of, output_size=size_of):
+    '''
+    Decorates a function so its calls are recorded inside profile() blocks. Outside of them, the
+    only cost is checking whether any block is active.
+
+    Parameters:
+        name: Optional. A string representing the name to record the calls under. Defaults to
+            None, which uses the function's name.
+        input_size: Optional. A function that gets the size of the function's first argument.
+            Defaults to size_of().
+        output_size: Optional. A function that gets the size of the function's return value.
+            Defaults to size_of().
+
+    Returns:
+        The decorator.
+    '''
+    def decorator(function):
+        function_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _profilers:
+                return function(*args, **kwargs)
+            return _run_traced(function, function_name, input_size, output_size, args, kwargs)
+        return wrapper
+    return decorator
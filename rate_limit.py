@@ -0,0 +1,347 @@
+'''
+Rate limiting for requests sent to the Wikipedia API.
+
+A single limiter can be shared by several MediaWiki instances (for example, one per category being
+crawled in its own thread), so the total request rate stays polite no matter how many crawls are
+running at once.
+
+Authors: Jacob Smilg and Markus Leschly
+'''
+
+import time
+import random
+import threading
+
+
+class TokenBucket:
+    '''
+    A thread-safe token bucket rate limiter.
+
+    Tokens are added to the bucket at a fixed rate, up to a maximum capacity. Each request takes a
+    token, and has to wait for one to be added if the bucket is empty. A capacity of 1 means
+    requests are spaced out evenly; a larger capacity allows short bursts.
+
+    Attributes:
+        rate: A float representing the number of tokens added per second.
+        capacity: A float representing the maximum number of tokens the bucket can hold.
+    '''
+
+    def __init__(self, rate, capacity=1):
+        '''
+        Creates a token bucket that starts out full.
+
+        Parameters:
+            rate: A positive number representing the number of requests allowed per second.
+            capacity: Optional. A number representing the largest burst of requests allowed.
+                Defaults to 1.
+        '''
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        '''
+        Add the tokens earned since the last refill. Must be called with the lock held.
+        '''
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self, tokens=1):
+        '''
+        Takes tokens from the bucket, waiting until enough are available.
+
+        Parameters:
+            tokens: Optional. The number of tokens to take. Defaults to 1.
+
+        Returns:
+            A float representing the number of seconds spent waiting.
+        '''
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                wait_time = (tokens - self._tokens) / self.rate
+            # sleep outside of the lock so other threads can check the bucket in the meantime
+            time.sleep(wait_time)
+            waited += wait_time
+
+
+class RateLimitedWiki:
+    '''
+    Wraps a MediaWiki instance so every call to wiki_request() takes a token from a shared limiter
+    first.
+
+    Anything other than wiki_request() is passed straight through to the wrapped instance.
+
+    Attributes:
+        wiki: The wrapped MediaWiki instance.
+        limiter: The TokenBucket shared with any other wrapped instances.
+    '''
+
+    def __init__(self, wiki, limiter):
+        self.wiki = wiki
+        self.limiter = limiter
+
+    def wiki_request(self, params):
+        '''
+        Waits for the limiter, then sends a request through the wrapped MediaWiki instance.
+
+        Parameters:
+            params: A dictionary of API request parameters.
+
+        Returns:
+            A dictionary of the parsed JSON response.
+        '''
+        self.limiter.acquire()
+        return self.wiki.wiki_request(params)
+
+    def __getattr__(self, name):
+        return getattr(self.wiki, name)
+
+
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_MAXLAG = 5  # seconds of database replication lag at which Wikipedia asks bots to wait
+DEFAULT_BACKOFF = 1.0   # seconds to pause after the first failure without a Retry-After
+DEFAULT_MAX_BACKOFF = 60.0
+# the API error codes that mean the request should be sent again later
+THROTTLE_ERROR_CODES = ('maxlag', 'ratelimited')
+
+
+class Throttled(Exception):
+    '''
+    Raised by a wiki client when the server asks for requests to slow down, such as with an
+    HTTP 429 response.
+
+    Attributes:
+        retry_after: A float representing the number of seconds the server asked to wait, or None
+            if it didn't say.
+    '''
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TransientError(Exception):
+    '''
+    Raised by a wiki client when a request failed for a reason that may go away if it is sent
+    again, such as a server error or a dropped connection.
+    '''
+
+
+class AdaptiveLimiter(TokenBucket):
+    '''
+    A token bucket whose rate adapts to how the server is responding: the rate goes up by a fixed
+    step after every successful request and is cut by a factor whenever the server pushes back
+    (additive increase, multiplicative decrease). After being pushed back, every request waits
+    until the pause asked for by the server (plus a random jitter, so threads sharing the limiter
+    don't all retry at once) has passed.
+
+    Attributes:
+        rate: A float representing the current number of requests allowed per second.
+        min_rate: A float representing the lowest the rate can go.
+        max_rate: A float representing the highest the rate can go.
+        increase: A float representing how much the rate goes up after a successful request.
+        decrease: A float representing the factor the rate is multiplied by when pushed back.
+        jitter: A float representing the largest random fraction added to each pause.
+        requests: The number of tokens handed out.
+        successes: The number of successful requests reported.
+        throttled: The number of times the server pushed back.
+        errors: The number of temporary failures reported.
+        sleep_time: The total number of seconds spent waiting, across every thread.
+    '''
+
+    def __init__(self, rate, min_rate=None, max_rate=None, increase=None, decrease=0.5,
+                 jitter=0.25, backoff=DEFAULT_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF,
+                 seed=None):
+        '''
+        Creates an adaptive limiter that starts out at the given rate.
+
+        Parameters:
+            rate: A positive number representing the number of requests per second to start at.
+            min_rate: Optional. The lowest rate to slow down to. Defaults to a tenth of rate.
+            max_rate: Optional. The highest rate to speed up to. Defaults to 4 times rate.
+            increase: Optional. How much to raise the rate by after each successful request.
+                Defaults to a twentieth of rate.
+            decrease: Optional. The factor to cut the rate by when pushed back. Defaults to 0.5.
+            jitter: Optional. The largest random fraction to add to each pause. Defaults to 0.25.
+            backoff: Optional. The number of seconds to pause after a failure when the server
+                doesn't say how long to wait. Doubles with each failure in a row. Defaults to
+                DEFAULT_BACKOFF.
+            max_backoff: Optional. The longest pause in seconds. Defaults to DEFAULT_MAX_BACKOFF.
+            seed: Optional. An int to seed the jitter with. Defaults to None.
+        '''
+        super().__init__(rate)
+        self.min_rate = self.rate / 10 if min_rate is None else float(min_rate)
+        self.max_rate = self.rate * 4 if max_rate is None else float(max_rate)
+        self.increase = self.rate / 20 if increase is None else float(increase)
+        self.decrease = decrease
+        self.jitter = jitter
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.requests = 0
+        self.successes = 0
+        self.throttled = 0
+        self.errors = 0
+        self.sleep_time = 0.0
+        self._failures_in_a_row = 0
+        self._paused_until = 0.0
+        self._started = time.monotonic()
+        self._random = random.Random(seed)
+
+    def acquire(self, tokens=1):
+        '''
+        Waits for any pause to pass, then takes tokens from the bucket.
+
+        Parameters:
+            tokens: Optional. The number of tokens to take. Defaults to 1.
+
+        Returns:
+            A float representing the number of seconds spent waiting.
+        '''
+        with self._lock:
+            pause = self._paused_until - time.monotonic()
+        waited = 0.0
+        if pause > 0:
+            time.sleep(pause)
+            waited += pause
+        waited += super().acquire(tokens)
+        with self._lock:
+            self.requests += 1
+            self.sleep_time += waited
+        return waited
+
+    def success(self):
+        '''
+        Reports a successful request, raising the rate by one step.
+        '''
+        with self._lock:
+            self._refill()
+            self.successes += 1
+            self._failures_in_a_row = 0
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def push_back(self, retry_after=None, throttled=True):
+        '''
+        Reports that the server pushed back or a request failed, cutting the rate and pausing
+        every request for a while.
+
+        Parameters:
+            retry_after: Optional. The number of seconds the server asked to wait. Defaults to
+                None, which waits an exponentially growing amount of time.
+            throttled: Optional. A boolean that is True if the server asked to slow down, and
+                False if the request failed for another temporary reason. Defaults to True.
+
+        Returns:
+            A float representing the number of seconds every request is paused for.
+        '''
+        with self._lock:
+            self._refill()
+            if throttled:
+                self.throttled += 1
+            else:
+                self.errors += 1
+            self._failures_in_a_row += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            if retry_after is None:
+                retry_after = self.backoff * 2 ** (self._failures_in_a_row - 1)
+            pause = min(self.max_backoff, retry_after) * (1 + self._random.uniform(0, self.jitter))
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            return pause
+
+    def stats(self):
+        '''
+        Returns:
+            A dictionary of the limiter's current rate and counters, along with the average
+            number of requests per second since it was created.
+        '''
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            return {
+                'rate': self.rate,
+                'requests': self.requests,
+                'requests_per_second': self.requests / elapsed if elapsed > 0 else 0.0,
+                'successes': self.successes,
+                'retries': self.throttled + self.errors,
+                'throttled': self.throttled,
+                'errors': self.errors,
+                'sleep_time': self.sleep_time,
+            }
+
+
+class AdaptiveWiki:
+    '''
+    Wraps a wiki client so every call to wiki_request() goes through an AdaptiveLimiter, asks the
+    server to refuse requests while it is lagging (the maxlag parameter), and is retried when the
+    server pushes back or the request fails temporarily.
+
+    Anything other than wiki_request() is passed straight through to the wrapped instance.
+
+    Attributes:
+        wiki: The wrapped client. Its wiki_request() should raise Throttled and TransientError
+            (like wiki_client.WikiClient) for the limiter to see HTTP 429 responses and server
+            errors; maxlag errors in the response are recognized either way.
+        limiter: The AdaptiveLimiter shared with any other wrapped instances.
+        max_retries: An int representing how many times to retry a request before giving up.
+        maxlag: An int representing the maxlag parameter to send, or None to not send one.
+    '''
+
+    def __init__(self, wiki, limiter, max_retries=DEFAULT_MAX_RETRIES, maxlag=DEFAULT_MAXLAG):
+        self.wiki = wiki
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.maxlag = maxlag
+
+    def wiki_request(self, params):
+        '''
+        Sends a request through the wrapped client once the limiter allows it, retrying it if the
+        server pushes back or it fails temporarily.
+
+        Parameters:
+            params: A dictionary of API request parameters.
+
+        Returns:
+            A dictionary of the parsed JSON response.
+
+        Raises:
+            Throttled or TransientError if the request still fails after max_retries retries.
+        '''
+        for attempt in range(self.max_retries + 1):
+            request_params = dict(params)
+            if self.maxlag is not None:
+                request_params.setdefault('maxlag', self.maxlag)
+            self.limiter.acquire()
+            try:
+                response = self.wiki.wiki_request(request_params)
+            except Throttled as error:
+                failure = error
+                self.limiter.push_back(error.retry_after)
+                continue
+            except (TransientError, ConnectionError, TimeoutError) as error:
+                failure = error
+                self.limiter.push_back(throttled=False)
+                continue
+
+            code = response.get('error', {}).get('code')
+            if code in THROTTLE_ERROR_CODES:
+                failure = Throttled(f"Wikipedia returned a {code} error: "
+                                    f"{response['error'].get('info', '')}")
+                # maxlag errors say how far behind the database is, which is a fair guess at
+                # how long to wait
+                lag = response['error'].get('lag')
+                self.limiter.push_back(None if lag is None else float(lag))
+                continue
+            self.limiter.success()
+            return response
+        raise failure
+
+    def __getattr__(self, name):
+        return getattr(self.wiki, name)
@@ -0,0 +1,275 @@
+'''
+Renders the project's visualizations from a dataset file, without running the notebook.
+
+The 3D network plot and the scatter plot are saved as HTML, and the treemap as a PNG. Each figure
+is rendered in its own process, and a manifest in the output directory records a hash of each
+figure's inputs (the dataset, the options and the plot config), so figures whose inputs haven't
+changed since the last run are skipped.
+
+Authors: Jacob Smilg and Markus Leschly
+'''
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import plots_config
+from stage_cache import file_hash
+from storage import load_data
+
+
+FIGURES = ('network', 'scatter', 'treemap')
+OUTPUT_SUFFIXES = {'network': '_network.html', 'scatter': '_scatter.html',
+                   'treemap': '_treemap.png'}
+MANIFEST_NAME = 'render_manifest.json'
+DEFAULT_OUTPUT_DIR = 'figures'
+DEFAULT_NUM_NODES = 150
+DEFAULT_MAX_WORKERS = 3
+
+# the parts of plots_config each figure is drawn with
+FIGURE_CONFIGS = {
+    'network': ('network_plot_config', 'network_layout_config', 'kk_axis_config',
+                'large_plot_config'),
+    'scatter': ('scatter_plot_config', 'scatter_axis_config', 'scatter_update_layout',
+                'large_plot_config'),
+    'treemap': ('treemap_config',),
+}
+
+
+def figure_key(figure, data_hash, options):
+    '''
+    Hashes everything a figure is made from, so it only has to be rendered again when one of them
+    changes.
+
+    Parameters:
+        figure: A string representing the name of the figure, out of FIGURES.
+        data_hash: A string representing the hash of the dataset file.
+        options: A dictionary of the options the figure is rendered with.
+
+    Returns:
+        A string representing the SHA-256 hash of the figure's inputs.
+    '''
+    config = {name: getattr(plots_config, name) for name in FIGURE_CONFIGS[figure]}
+    encoded = json.dumps({'figure': figure, 'data': data_hash, 'options': options,
+                          'config': config}, sort_keys=True, default=repr)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def render_network(data, path, num_nodes=DEFAULT_NUM_NODES, layout_dir=None):
+    '''
+    Saves the 3D network plot of the links between the most viewed pages as HTML.
+
+    Parameters:
+        data: A dictionary of Wikipedia category data as formatted by get_data.py.
+        path: A string representing the path to save the plot to.
+        num_nodes: Optional. An int representing the number of most viewed pages to include.
+            Defaults to DEFAULT_NUM_NODES.
+        layout_dir: Optional. A string representing a directory to cache layouts in. Defaults to
+            None, which doesn't cache them.
+    '''
+    from helpers import dict_to_edge_arrays, trim_dict
+    from layout import LayoutCache, layout_graph
+    from plotting import network_figure
+
+    trimmed = trim_dict({title: dict(entry) for title, entry in data.items()}, num_nodes)
+    arrays = dict_to_edge_arrays(trimmed)
+    cache = None if layout_dir is None else LayoutCache(layout_dir)
+    layout = layout_graph(arrays, cache=cache)
+    labels = [f"{title} | Links to this page: {len(entry['linkshere_within_category'])}"
+              for title, entry in trimmed.items()]
+    # the notebook scales the layout up, which keeps the camera at a comfortable distance
+    figure = network_figure(layout.coords * 100, arrays['edges'], arrays['views'], labels,
+                            weights=arrays['weights'])
+    figure.write_html(path, include_plotlyjs='cdn')
+
+
+def render_scatter(data, path):
+    '''
+    Saves the scatter plot of the number of links to each page against its page views as HTML.
+
+    Parameters:
+        data: A dictionary of Wikipedia category data as formatted by get_data.py.
+        path: A string representing the path to save the plot to.
+    '''
+    import plotly.graph_objs as go
+    from plotting import scatter_trace
+
+    links = [len(entry['linkshere']) for entry in data.values()]
+    views = [entry['total_views'] for entry in data.values()]
+    figure = go.Figure(data=[scatter_trace(links, views, list(data))])
+    y_axis = dict(title='Page views', type='log')
+    y_axis.update(plots_config.scatter_axis_config)
+    x_axis = dict(title='Number of links to page', type='log')
+    x_axis.update(plots_config.scatter_axis_config)
+    figure.update_layout(plots_config.scatter_update_layout, yaxis=y_axis, xaxis=x_axis)
+    figure.write_html(path, include_plotlyjs='cdn')
+
+
+def render_treemap(data, path):
+    '''
+    Saves the treemap of page views as a PNG, drawn with plots_config.treemap_config. Pages
+    without any views are left out by treemap.treemap_data().
+
+    Parameters:
+        data: A dictionary of Wikipedia category data as formatted by get_data.py.
+        path: A string representing the path to save the plot to.
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from treemap import plot_treemap
+
+    config = plots_config.treemap_config
+    figure, ax = plt.subplots(figsize=config['figsize'])
+    plot_treemap(data, ax=ax, max_tiles=config['max_tiles'], num_labels=config['num_labels'],
+                 colormap=config['colormap'])
+    figure.savefig(path, dpi=config['dpi'], bbox_inches='tight')
+    plt.close(figure)
+
+
+def render_figure(figure, data_path, path, options):
+    '''
+    Loads a dataset and renders one figure from it. Runs in a worker process.
+
+    Parameters:
+        figure: A string representing the name of the figure, out of FIGURES.
+        data_path: A string representing the path of the dataset file.
+        path: A string representing the path to save the figure to.
+        options: A dictionary of the options the figure is rendered with.
+
+    Returns:
+        The path the figure was saved to.
+    '''
+    data = load_data(data_path)
+    if figure == 'network':
+        render_network(data, path, options['num_nodes'], options.get('layout_dir'))
+    elif figure == 'scatter':
+        render_scatter(data, path)
+    else:
+        render_treemap(data, path)
+    return path
+
+
+def load_manifest(path):
+    '''
+    Returns:
+        The dictionary saved in a render manifest, or an empty dictionary if there isn't one.
+    '''
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def render(data_path, output_dir=DEFAULT_OUTPUT_DIR, figures=FIGURES,
+           num_nodes=DEFAULT_NUM_NODES, max_workers=DEFAULT_MAX_WORKERS, force=False):
+    '''
+    Renders figures from a dataset, skipping the ones that haven't changed since the last run.
+
+    Parameters:
+        data_path: A string representing the path of a dataset saved by get_data.py.
+        output_dir: Optional. A string representing the directory to save the figures in.
+            Defaults to DEFAULT_OUTPUT_DIR.
+        figures: Optional. An iterable of the names of the figures to render, out of FIGURES.
+            Defaults to all of them.
+        num_nodes: Optional. An int representing the number of most viewed pages to include in
+            the network plot. Defaults to DEFAULT_NUM_NODES.
+        max_workers: Optional. An int representing the most figures to render at the same time,
+            each in its own process. Defaults to DEFAULT_MAX_WORKERS.
+        force: Optional. A boolean that is True if every figure should be rendered, even if it
+            hasn't changed. Defaults to False.
+
+    Returns:
+        A dictionary mapping the name of each figure to the path it was saved to and whether it
+        was rendered (True) or skipped (False), as a tuple.
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    data_hash = file_hash(data_path)
+    stem = os.path.splitext(os.path.basename(data_path))[0]
+
+    results = {}
+    to_render = {}
+    for figure in figures:
+        if figure not in FIGURES:
+            raise ValueError(f'Unknown figure: {figure}')
+        options = {'num_nodes': num_nodes} if figure == 'network' else {}
+        key = figure_key(figure, data_hash, options)
+        path = os.path.join(output_dir, stem + OUTPUT_SUFFIXES[figure])
+        if not force and manifest.get(path) == key and os.path.exists(path):
+            results[figure] = (path, False)
+            continue
+        if figure == 'network':
+            options = dict(options, layout_dir=os.path.join(output_dir, 'layouts'))
+        to_render[figure] = (path, key, options)
+
+    if max_workers > 1 and len(to_render) > 1:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(to_render))) as executor:
+            futures = {figure: executor.submit(render_figure, figure, data_path, path, options)
+                       for figure, (path, _, options) in to_render.items()}
+            for future in futures.values():
+                future.result()
+    else:
+        for figure, (path, _, options) in to_render.items():
+            render_figure(figure, data_path, path, options)
+
+    for figure, (path, key, _) in to_render.items():
+        manifest[path] = key
+        results[figure] = (path, True)
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+    return results
+
+
+def get_parser(name):
+    '''
+    Return the command-line argument parser used for this script.
+
+    Args:
+        name: A string representing the name of the script.
+
+    Returns:
+        An argparse.ArgumentParser for the script's arguments.
+    '''
+    parser = argparse.ArgumentParser(name)
+    parser.add_argument('filename', type=str,
+                        help='Path of a dataset saved by get_data.py (.pkl or .npz)')
+    parser.add_argument('-o', '--output-dir', type=str, default=DEFAULT_OUTPUT_DIR,
+                        help=f'Directory to save the figures in (default: {DEFAULT_OUTPUT_DIR})')
+    parser.add_argument('-f', '--figures', type=str, nargs='+', default=list(FIGURES),
+                        choices=FIGURES, help='Figures to render (default: all of them)')
+    parser.add_argument('-n', '--num-nodes', type=int, default=DEFAULT_NUM_NODES,
+                        help='Number of most viewed pages to include in the network plot '
+                        f'(default: {DEFAULT_NUM_NODES})')
+    parser.add_argument('-j', '--max-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help='Number of figures to render at the same time '
+                        f'(default: {DEFAULT_MAX_WORKERS})')
+    parser.add_argument('--force', action='store_true',
+                        help="Render every figure, even if its inputs haven't changed")
+    return parser
+
+
+def main(args):
+    '''
+    Main function for rendering figures.
+
+    Parameters:
+        args: A list of command line arguments. Run "python render.py -h" in a terminal for
+            details.
+    '''
+    parsed_args = get_parser(args[0]).parse_args(args[1:])
+    results = render(parsed_args.filename, parsed_args.output_dir, parsed_args.figures,
+                     parsed_args.num_nodes, parsed_args.max_workers, parsed_args.force)
+    for figure, (path, rendered) in results.items():
+        print(f"{figure}: {'rendered' if rendered else 'unchanged'} ({path})")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
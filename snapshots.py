@@ -0,0 +1,433 @@
+'''
+A store of successive crawls of a category, for tracking how it changes over time.
+
+Instead of a full copy of every crawl, each snapshot is saved as a delta against the one before
+it: the pages that were added and removed, the links that were gained and lost, the days of page
+views that are new or changed, and any other values that changed. Every few snapshots, a full
+keyframe is saved as well (as a compact bundle, see storage.py), so rebuilding any snapshot only
+takes loading one keyframe and applying a handful of deltas. Questions like "which links were
+gained since last month" are answered from the deltas alone, without rebuilding any snapshot.
+
+    store = SnapshotStore('data/snapshots')
+    store.add(data)     # after each crawl
+    gained = store.diff('2021-02-01')['edges_gained']
+
+Authors: Jacob Smilg and Markus Leschly
+'''
+
+import os
+import sys
+import json
+import pickle
+import argparse
+from bisect import bisect_right
+from datetime import datetime, timezone
+
+from storage import load_dataset, save_dataset
+
+
+DEFAULT_KEYFRAME_INTERVAL = 8   # snapshots between full copies
+INDEX_NAME = 'snapshots.json'
+LINK_COLUMNS = ('linkshere', 'linkshere_within_category')
+DIFF_COLUMN = 'linkshere_within_category'
+
+
+def _copy_data(data):
+    '''
+    Copies a dataset all the way down, so changes to it don't change the original.
+    '''
+    return pickle.loads(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def snapshot_date(data):
+    '''
+    Gets the date a crawl was made, from the most recent day it has page views for.
+
+    Parameters:
+        data: A dictionary of Wikipedia category data as formatted by get_data.py.
+
+    Returns:
+        A 'YYYY-MM-DD' string of the most recent day in any page's 'pageviews', or of today (in
+        UTC) if there are no page views.
+    '''
+    latest = max((date for entry in data.values() for date in entry['pageviews']), default=None)
+    if latest is None:
+        return datetime.now(timezone.utc).date().isoformat()
+    return latest
+
+
+def make_delta(old, new):
+    '''
+    Finds the changes between two crawls of a category.
+
+    Parameters:
+        old: A dictionary of Wikipedia category data as formatted by get_data.py.
+        new: A later crawl of the same category, in the same format.
+
+    Returns:
+        A dictionary of the changes, which turns old into new when passed to apply_delta():
+        'added' (a dictionary of the pages only in new), 'removed' (a list of the titles only in
+        old), 'links' (for each column in LINK_COLUMNS, a dictionary with the 'added' and
+        'removed' links of each page, including the links of added and removed pages, and the
+        full 'lists' of any pages whose links changed order), 'pageviews' (for each page in
+        both, a tuple of a dictionary of its new or changed days and a list of the days it no
+        longer has), 'values' (any other values that changed) and 'titles' (the order of the
+        pages, or None if it's the order of old with added pages at the end).
+    '''
+    removed = [title for title in old if title not in new]
+    added = {title: entry for title, entry in new.items() if title not in old}
+    delta = {
+        'added': _copy_data(added),
+        'removed': removed,
+        'links': {column: {'added': {}, 'removed': {}, 'lists': {}} for column in LINK_COLUMNS},
+        'pageviews': {},
+        'values': {},
+        'titles': None,
+    }
+
+    for column in LINK_COLUMNS:
+        changes = delta['links'][column]
+        for title in removed:
+            if old[title][column]:
+                changes['removed'][title] = list(old[title][column])
+        for title, entry in added.items():
+            if entry[column]:
+                changes['added'][title] = list(entry[column])
+
+    dates = {}
+    for title, new_entry in new.items():
+        old_entry = old.get(title)
+        if old_entry is None:
+            continue
+        for column in LINK_COLUMNS:
+            old_links, new_links = old_entry[column], new_entry[column]
+            if old_links == new_links:
+                continue
+            old_set, new_set = set(old_links), set(new_links)
+            gained = [link for link in new_links if link not in old_set]
+            lost = [link for link in old_links if link not in new_set]
+            changes = delta['links'][column]
+            if gained:
+                changes['added'][title] = gained
+            if lost:
+                changes['removed'][title] = lost
+            # applying the changes keeps the remaining links in order and adds the new ones to
+            # the end, so only save the whole list if that isn't what the new crawl has
+            if [link for link in old_links if link in new_set] + gained != new_links:
+                changes['lists'][title] = list(new_links)
+
+        old_views, new_views = old_entry['pageviews'], new_entry['pageviews']
+        if old_views != new_views:
+            # every page has the same dates, so share one string for each date, which pickle
+            # then only saves once
+            changed = {dates.setdefault(date, date): value for date, value in new_views.items()
+                       if date not in old_views or old_views[date] != value}
+            dropped = [dates.setdefault(date, date) for date in old_views
+                       if date not in new_views]
+            delta['pageviews'][title] = (changed, dropped)
+
+        values = {key: value for key, value in new_entry.items()
+                  if key not in LINK_COLUMNS and key != 'pageviews'
+                  and (key not in old_entry or old_entry[key] != value)}
+        if values:
+            delta['values'][title] = values
+
+    removed_set = set(removed)
+    order = [title for title in old if title not in removed_set] + list(added)
+    if order != list(new):
+        delta['titles'] = list(new)
+    return delta
+
+
+def apply_delta(data, delta):
+    '''
+    Applies the changes found by make_delta() to a dataset.
+
+    Parameters:
+        data: A dictionary of Wikipedia category data as formatted by get_data.py. It is changed
+            in place.
+        delta: A dictionary returned by make_delta().
+
+    Returns:
+        The updated dataset. Its pages are in the new order, so use this instead of data.
+    '''
+    for title in delta['removed']:
+        del data[title]
+    for column, changes in delta['links'].items():
+        for title, lost in changes['removed'].items():
+            if title in data:
+                lost = set(lost)
+                data[title][column] = [link for link in data[title][column] if link not in lost]
+        for title, gained in changes['added'].items():
+            if title in data:
+                data[title][column].extend(gained)
+        for title, links in changes['lists'].items():
+            data[title][column] = list(links)
+    for title, (changed, dropped) in delta['pageviews'].items():
+        pageviews = data[title]['pageviews']
+        pageviews.update(changed)
+        for date in dropped:
+            del pageviews[date]
+    for title, values in delta['values'].items():
+        data[title].update(values)
+    data.update(_copy_data(delta['added']))
+    if delta['titles'] is not None:
+        data = {title: data[title] for title in delta['titles']}
+    return data
+
+
+class SnapshotStore:
+    '''
+    A directory of successive crawls of a category, saved as keyframes and deltas.
+
+    Attributes:
+        path: A string representing the path of the directory.
+        keyframe_interval: An int representing how often a full copy is saved along with the
+            delta. Snapshot i is a keyframe if i is a multiple of keyframe_interval.
+    '''
+
+    def __init__(self, path, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        '''
+        Opens (and creates, if needed) a snapshot store.
+
+        Parameters:
+            path: A string representing the path of the directory to keep the snapshots in.
+            keyframe_interval: Optional. An int representing how often to save a full copy.
+                Defaults to DEFAULT_KEYFRAME_INTERVAL.
+        '''
+        if keyframe_interval < 1:
+            raise ValueError('keyframe_interval must be at least 1')
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        os.makedirs(path, exist_ok=True)
+        try:
+            with open(os.path.join(path, INDEX_NAME)) as file:
+                self._index = json.load(file)
+        except FileNotFoundError:
+            self._index = []
+        # the latest snapshot, kept after it is added so the next delta doesn't have to rebuild it
+        self._latest = None
+
+    def __len__(self):
+        return len(self._index)
+
+    def snapshots(self):
+        '''
+        Returns:
+            A list of a dictionary for each snapshot in order, with its 'date', whether it is a
+            'keyframe', and its number of 'pages'.
+        '''
+        return [dict(info) for info in self._index]
+
+    def _keyframe_path(self, index):
+        return os.path.join(self.path, f'{index:05d}.npz')
+
+    def _delta_path(self, index):
+        return os.path.join(self.path, f'{index:05d}.delta.pkl')
+
+    def _save_index(self):
+        '''
+        Saves the list of snapshots, replacing the old one in one go so it's never half written.
+        '''
+        index_path = os.path.join(self.path, INDEX_NAME)
+        with open(index_path + '.tmp', 'w') as file:
+            json.dump(self._index, file, indent=2)
+        os.replace(index_path + '.tmp', index_path)
+
+    def add(self, data, date=None):
+        '''
+        Adds a crawl to the end of the store.
+
+        Parameters:
+            data: A dictionary of Wikipedia category data as formatted by get_data.py.
+            date: Optional. A 'YYYY-MM-DD' string of the date of the crawl. It can't be before
+                the date of the last snapshot. Defaults to None, which uses snapshot_date().
+
+        Returns:
+            An int representing the index of the new snapshot.
+        '''
+        if date is None:
+            date = snapshot_date(data)
+        if self._index and date < self._index[-1]['date']:
+            raise ValueError(f"Snapshot date {date} is before the last snapshot's date "
+                             f"({self._index[-1]['date']})")
+        index = len(self._index)
+        keyframe = index % self.keyframe_interval == 0
+        # keyframes get a delta too, so diff() never has to rebuild a snapshot
+        if index > 0:
+            latest = self._latest if self._latest is not None else self.load(-1)
+            with open(self._delta_path(index), 'wb') as file:
+                pickle.dump(make_delta(latest, data), file, protocol=pickle.HIGHEST_PROTOCOL)
+        if keyframe:
+            save_dataset(data, self._keyframe_path(index))
+        self._index.append({'date': date, 'keyframe': keyframe, 'pages': len(data)})
+        self._save_index()
+        self._latest = _copy_data(data)
+        return index
+
+    def index_of(self, snapshot):
+        '''
+        Finds a snapshot in the store.
+
+        Parameters:
+            snapshot: An int representing the index of the snapshot (negative numbers count back
+                from the latest), or a 'YYYY-MM-DD' string, which finds the latest snapshot made
+                on or before that date.
+
+        Returns:
+            An int representing the index of the snapshot.
+
+        Raises:
+            IndexError: If there is no such snapshot.
+        '''
+        if isinstance(snapshot, str):
+            index = bisect_right([info['date'] for info in self._index], snapshot) - 1
+            if index < 0:
+                raise IndexError(f'No snapshot on or before {snapshot}')
+            return index
+        index = snapshot + len(self._index) if snapshot < 0 else snapshot
+        if not 0 <= index < len(self._index):
+            raise IndexError(f'No snapshot {snapshot} in a store of {len(self._index)}')
+        return index
+
+    def _load_delta(self, index):
+        with open(self._delta_path(index), 'rb') as file:
+            return pickle.load(file)
+
+    def load(self, snapshot=-1):
+        '''
+        Rebuilds a snapshot from the keyframe before it and the deltas in between.
+
+        Parameters:
+            snapshot: Optional. The snapshot to load (see index_of()). Defaults to -1, the
+                latest one.
+
+        Returns:
+            A dictionary of Wikipedia category data, the same as the one that was added.
+        '''
+        index = self.index_of(snapshot)
+        if index == len(self._index) - 1 and self._latest is not None:
+            return _copy_data(self._latest)
+        # search for the keyframe, in case the store was made with a different keyframe_interval
+        keyframe = index
+        while not self._index[keyframe]['keyframe']:
+            keyframe -= 1
+        data = load_dataset(self._keyframe_path(keyframe))
+        for delta_index in range(keyframe + 1, index + 1):
+            data = apply_delta(data, self._load_delta(delta_index))
+        return data
+
+    def diff(self, start, end=-1, column=DIFF_COLUMN):
+        '''
+        Finds what changed between two snapshots, using only the deltas between them.
+
+        Parameters:
+            start: The earlier snapshot (see index_of()), such as '2021-02-01' for the changes
+                since the last crawl of January.
+            end: Optional. The later snapshot. Defaults to -1, the latest one.
+            column: Optional. The column of links to compare, out of LINK_COLUMNS. Defaults to
+                DIFF_COLUMN, the links within the category.
+
+        Returns:
+            A dictionary of the 'pages_added' and 'pages_removed' (sets of titles), and the
+            'edges_gained' and 'edges_lost' (sets of (title, linking title) tuples) between
+            the two snapshots. Pages or links that were removed and then added back (or the
+            other way around) aren't included.
+        '''
+        if column not in LINK_COLUMNS:
+            raise ValueError(f'Unknown column: {column}')
+        start, end = self.index_of(start), self.index_of(end)
+        if start > end:
+            raise ValueError('start must not be after end')
+        pages_added, pages_removed = set(), set()
+        edges_gained, edges_lost = set(), set()
+        for index in range(start + 1, end + 1):
+            delta = self._load_delta(index)
+            _toggle(pages_added, pages_removed, delta['added'])
+            _toggle(pages_removed, pages_added, delta['removed'])
+            changes = delta['links'][column]
+            _toggle(edges_gained, edges_lost, ((title, link) for title, links
+                                               in changes['added'].items() for link in links))
+            _toggle(edges_lost, edges_gained, ((title, link) for title, links
+                                               in changes['removed'].items() for link in links))
+        return {'pages_added': pages_added, 'pages_removed': pages_removed,
+                'edges_gained': edges_gained, 'edges_lost': edges_lost}
+
+
+def _toggle(changes, opposite, items):
+    '''
+    Adds items to a set of changes, unless they undo a change in the opposite set, in which case
+    that change is removed instead.
+    '''
+    for item in items:
+        if item in opposite:
+            opposite.remove(item)
+        else:
+            changes.add(item)
+
+
+def get_parser(name):
+    '''
+    Return the command-line argument parser used for this script.
+
+    Args:
+        name: A string representing the name of the script.
+
+    Returns:
+        An argparse.ArgumentParser for the script's arguments.
+    '''
+    parser = argparse.ArgumentParser(name)
+    parser.add_argument('path', type=str, help='Directory of the snapshot store')
+    parser.add_argument('-a', '--add', type=str, default=None,
+                        help='Path of a dataset saved by get_data.py to add as a new snapshot')
+    parser.add_argument('-s', '--since', type=str, default=None,
+                        help='Show what changed since this snapshot (an index, or a YYYY-MM-DD '
+                        'date for the last snapshot on or before it)')
+    parser.add_argument('-e', '--end', type=str, default='-1',
+                        help='Snapshot to compare against with --since (default: the latest)')
+    return parser
+
+
+def _parse_snapshot(value):
+    '''
+    Reads a snapshot given on the command line as an int index or a date string.
+    '''
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def main(args):
+    '''
+    Main function for the snapshot store. Lists the snapshots, adds one, or shows what changed.
+
+    Parameters:
+        args: A list of command line arguments. Run "python snapshots.py -h" in a terminal for
+            details.
+    '''
+    from storage import load_data
+
+    parsed_args = get_parser(args[0]).parse_args(args[1:])
+    store = SnapshotStore(parsed_args.path)
+    if parsed_args.add is not None:
+        index = store.add(load_data(parsed_args.add))
+        print(f'Added snapshot {index} ({store.snapshots()[index]["date"]})')
+    if parsed_args.since is not None:
+        changes = store.diff(_parse_snapshot(parsed_args.since), _parse_snapshot(parsed_args.end))
+        print(f"Pages added: {len(changes['pages_added'])}, "
+              f"removed: {len(changes['pages_removed'])}")
+        print(f"Links gained: {len(changes['edges_gained'])}, "
+              f"lost: {len(changes['edges_lost'])}")
+        for title, link in sorted(changes['edges_gained']):
+            print(f'  + {link} -> {title}')
+        for title, link in sorted(changes['edges_lost']):
+            print(f'  - {link} -> {title}')
+    elif parsed_args.add is None:
+        for index, info in enumerate(store.snapshots()):
+            kind = 'keyframe' if info['keyframe'] else 'delta'
+            print(f"{index}: {info['date']} ({info['pages']} pages, {kind})")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,282 @@
+'''
+A persistent cache of the results of the data processing stages.
+
+Each result is stored in a SQLite database under a key made from the name of the stage, a hash of
+its input and its parameters (such as the number of pages to trim to). A stage's key also works as
+the hash of its result, since the same input and parameters always give the same result, so the
+stages of a pipeline can be chained without hashing each intermediate result. When the cache grows
+past its maximum size, the least recently used results are removed.
+
+Authors: Jacob Smilg and Markus Leschly
+'''
+
+import json
+import pickle
+import hashlib
+from collections.abc import Mapping
+
+from cache import LRUStore
+
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024   # 1 GB
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(value):
+    '''
+    Hashes a value by its pickled contents.
+
+    Returns:
+        A string representing the SHA-256 hash of the value.
+    '''
+    return hashlib.sha256(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+
+def file_hash(path):
+    '''
+    Returns:
+        A string representing the SHA-256 hash of a file's contents.
+    '''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stage_key(stage, input_key, params=None):
+    '''
+    Gets the key a stage's result is stored under.
+
+    Parameters:
+        stage: A string representing the name of the stage.
+        input_key: A string representing the hash of the stage's input.
+        params: Optional. A dictionary of the stage's parameters. Defaults to None.
+
+    Returns:
+        A string representing the SHA-256 hash of the stage, input and parameters.
+    '''
+    encoded = json.dumps({'stage': stage, 'input': input_key, 'params': params or {}},
+                         sort_keys=True, default=repr, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class StageCache:
+    '''
+    A size-bounded, persistent cache of the results of processing stages.
+
+    Attributes:
+        path: A string representing the path of the SQLite database.
+        max_bytes: An int representing the most bytes of results to keep, or None for no limit.
+        hits: The number of stages answered by the cache.
+        misses: The number of stages that had to be run.
+    '''
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        '''
+        Opens (and creates, if needed) a stage cache.
+
+        Parameters:
+            path: A string representing the path of the SQLite database to store results in.
+            max_bytes: Optional. The most bytes of results to keep. Defaults to
+                DEFAULT_MAX_BYTES.
+        '''
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._store = LRUStore(path, 'results', max_bytes)
+
+    def get(self, key):
+        '''
+        Looks up a stage's result.
+
+        Parameters:
+            key: A string representing the key of the result, as returned by stage_key().
+
+        Returns:
+            A tuple of (found, result), where found is False if the result isn't cached.
+        '''
+        encoded = self._store.get(key)
+        if encoded is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, pickle.loads(encoded)
+
+    def put(self, stage, key, result):
+        '''
+        Stores a stage's result, removing the least recently used results if the cache is now
+        too big. Results bigger than the whole cache aren't stored.
+
+        Parameters:
+            stage: A string representing the name of the stage.
+            key: A string representing the key of the result, as returned by stage_key().
+            result: The result to store. It must be picklable.
+        '''
+        self._store.put(key, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), stage)
+
+    def run(self, stage, function, args=(), params=None, input_key=None):
+        '''
+        Gets the result of a stage from the cache, or runs it and stores the result.
+
+        Parameters:
+            stage: A string representing the name of the stage.
+            function: The function that runs the stage. It is called as function(*args, **params).
+            args: Optional. A tuple of the stage's inputs. Defaults to ().
+            params: Optional. A dictionary of the stage's parameters, passed to the function as
+                keyword arguments. Defaults to None.
+            input_key: Optional. A string representing the hash of the inputs, such as the key
+                of the stage that made them. Defaults to None, which hashes the inputs with
+                content_hash().
+
+        Returns:
+            A tuple of (result, key), where key can be passed as the input_key of the next stage.
+        '''
+        params = params or {}
+        if input_key is None:
+            input_key = content_hash(args)
+        key = stage_key(stage, input_key, params)
+        found, result = self.get(key)
+        if not found:
+            result = function(*args, **params)
+            self.put(stage, key, result)
+        return result, key
+
+    def invalidate(self, stage=None, key=None):
+        '''
+        Removes cached results, so they are computed again the next time they're needed.
+
+        Parameters:
+            stage: Optional. A string representing the name of a stage to remove every result of.
+                Defaults to None.
+            key: Optional. A string representing the key of a single result to remove. Defaults
+                to None.
+            If neither is given, every result is removed.
+
+        Returns:
+            The number of results removed.
+        '''
+        return self._store.delete(stage, key)
+
+    def size(self):
+        '''
+        Returns:
+            The number of bytes of results stored in the cache.
+        '''
+        return self._store.size()
+
+    def __len__(self):
+        return len(self._store)
+
+    def clear(self):
+        '''
+        Removes every result from the cache.
+        '''
+        self.invalidate()
+
+    def close(self):
+        '''
+        Closes the database connection.
+        '''
+        self._store.close()
+
+
+def _copy_entries(data):
+    '''
+    Copies a dataset one level deep, since trim_dict() changes the pages it's given.
+    '''
+    return {title: dict(entry) for title, entry in data.items()}
+
+
+class PipelineResults(Mapping):
+    '''
+    The results of run_pipeline(), mapping the name of each stage's result to the result.
+
+    The keys of every stage are known before anything is loaded, so each result is only read
+    from the cache (or computed, if it isn't cached) the first time it is looked up. A stage's
+    input is only needed when its own result isn't cached, so looking up the last stage of a
+    pipeline whose results are all cached never reads the earlier ones, such as the whole
+    dataset returned by common_links.
+    '''
+
+    def __init__(self, cache, stages):
+        '''
+        Sets up the results of a pipeline without loading any of them.
+
+        Parameters:
+            cache: The StageCache the results are stored in.
+            stages: A list of a tuple of (name, stage, function, params, key) for each stage, in
+                order. Each function is called with the result of the stage before it (except the
+                first, which is called without one) and its params as keyword arguments.
+        '''
+        self._cache = cache
+        self._stages = {stage[0]: stage for stage in stages}
+        self._previous = dict(zip(self._stages, [None] + list(self._stages)))
+        self._results = {}
+
+    def __getitem__(self, name):
+        if name not in self._results:
+            _, stage, function, params, key = self._stages[name]
+            found, result = self._cache.get(key)
+            if not found:
+                previous = self._previous[name]
+                args = () if previous is None else (self[previous],)
+                result = function(*args, **(params or {}))
+                self._cache.put(stage, key, result)
+            self._results[name] = result
+        return self._results[name]
+
+    def __contains__(self, name):
+        return name in self._stages
+
+    def __iter__(self):
+        return iter(self._stages)
+
+    def __len__(self):
+        return len(self._stages)
+
+
+def run_pipeline(data_path, cache, length=150, layout=True):
+    '''
+    Runs the notebook's processing pipeline on a dataset, using cached results for every stage
+    whose input and parameters haven't changed.
+
+    Parameters:
+        data_path: A string representing the path of a dataset saved by get_data.py.
+        cache: The StageCache to use.
+        length: Optional. An int representing the number of most viewed pages to keep for the
+            network plot. Defaults to 150.
+        layout: Optional. A boolean that is True if the network should be laid out as well.
+            Defaults to True.
+
+    Returns:
+        A PipelineResults of the result of each stage: 'data' (the dataset with common links
+        found), 'trimmed' (the output of trim_dict()), 'nodes' (the output of dict_to_nodes())
+        and, if layout is True, 'layout' (a layout.GraphLayout). The last stage has already been
+        run, and the earlier results are only loaded when they are looked up.
+    '''
+    from helpers import common_links, dict_to_nodes, trim_dict
+    from storage import load_data
+
+    stages = [
+        ('data', 'common_links', lambda: common_links(load_data(data_path)), None),
+        ('trimmed', 'trim_dict', lambda data, length: trim_dict(_copy_entries(data), length),
+         {'length': length}),
+        ('nodes', 'dict_to_nodes', dict_to_nodes, None),
+    ]
+    if layout:
+        from layout import layout_graph
+        stages.append(('layout', 'layout', layout_graph, None))
+
+    # each key is made from the key before it, starting from the hash of the dataset's file, so
+    # every key is known without loading the dataset
+    key = file_hash(data_path)
+    keyed_stages = []
+    for name, stage, function, params in stages:
+        key = stage_key(stage, key, params)
+        keyed_stages.append((name, stage, function, params, key))
+
+    results = PipelineResults(cache, keyed_stages)
+    results[keyed_stages[-1][0]]
+    return results
@@ -0,0 +1,330 @@
+'''
+Compact on-disk storage for Wikipedia category data.
+
+Datasets as formatted by get_data.py can be saved as a NumPy .npz bundle instead of a pickle. The
+bundle stores every title once in a string table, links as integer indices into that table, and
+page views as one array of days by pages. Pages are stored in descending order of total views, so
+the most viewed pages can be loaded on their own, and each column is only read from the file if it
+is asked for. np.load() can't memory-map the arrays inside an .npz file, so they're mapped straight
+from the file instead, and only the parts that are used (such as the first columns of the page
+views, or the titles that are needed) are read from disk.
+
+Authors: Jacob Smilg and Markus Leschly
+'''
+
+import os
+import struct
+import pickle
+import zipfile
+
+import numpy as np
+
+
+COLUMNS = ('linkshere', 'pageviews', 'pageid', 'total_views', 'linkshere_within_category')
+
+# values of the 'views_state' array, which tells apart days that have page views, days that are
+# in a page's 'pageviews' with a value of None, and days that aren't in a page's 'pageviews' at all
+MISSING = 0
+PRESENT = 1
+NULL = 2
+
+
+def _encode_strings(strings):
+    '''
+    Encodes a list of strings as one array of UTF-8 bytes and an array of offsets into it.
+
+    Parameters:
+        strings: A list of strings.
+
+    Returns:
+        A tuple of (blob, offsets), where string i is blob[offsets[i]:offsets[i + 1]].
+    '''
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def _decode_strings(blob, offsets, indices):
+    '''
+    Decodes some of the strings encoded by _encode_strings().
+
+    Parameters:
+        blob: An array of UTF-8 bytes, as returned by _encode_strings().
+        offsets: An array of offsets into blob, as returned by _encode_strings().
+        indices: An iterable of ints representing which strings to decode.
+
+    Returns:
+        A dictionary mapping each index to its string.
+    '''
+    # only the bytes of the strings asked for are read, so blob can be a memory map
+    return {index: blob[offsets[index]:offsets[index + 1]].tobytes().decode('utf-8')
+            for index in indices}
+
+
+def _to_csr(lists, index):
+    '''
+    Converts a list of lists of titles to compressed sparse row arrays of title indices.
+
+    Parameters:
+        lists: A list of lists of strings.
+        index: A dictionary mapping each string to its index in the string table.
+
+    Returns:
+        A tuple of (indptr, indices), where the titles in lists[i] are the entries
+        indices[indptr[i]:indptr[i + 1]].
+    '''
+    indptr = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(titles) for titles in lists], out=indptr[1:])
+    indices = np.fromiter((index[title] for titles in lists for title in titles),
+                          dtype=np.int32, count=int(indptr[-1]))
+    return indptr, indices
+
+
+def save_dataset(data, path):
+    '''
+    Saves a dataset formatted by get_data.py as a compact .npz bundle.
+
+    Parameters:
+        data: A dictionary of Wikipedia category data as formatted by get_data.py.
+        path: A string representing the path to save the bundle (.npz) to.
+    '''
+    titles = list(data)
+    entries = list(data.values())
+    total_views = np.array([entry['total_views'] for entry in entries], dtype=np.int64)
+    # store the most viewed pages first, keeping the original order for ties
+    order = np.argsort(-total_views, kind='stable')
+    ranked_titles = [titles[i] for i in order]
+    ranked_entries = [entries[i] for i in order]
+
+    # the string table has every category member first, followed by every other linking page
+    index = {title: i for i, title in enumerate(ranked_titles)}
+    for entry in ranked_entries:
+        for title in entry['linkshere']:
+            index.setdefault(title, len(index))
+        for title in entry['linkshere_within_category']:
+            index.setdefault(title, len(index))
+    titles_blob, titles_offsets = _encode_strings(list(index))
+
+    dates = sorted({date for entry in ranked_entries for date in entry['pageviews']})
+    date_index = {date: i for i, date in enumerate(dates)}
+    views = np.zeros((len(dates), len(ranked_entries)), dtype=np.int64)
+    views_state = np.full(views.shape, MISSING, dtype=np.int8)
+    for column, entry in enumerate(ranked_entries):
+        for date, value in entry['pageviews'].items():
+            row = date_index[date]
+            if value is None:
+                views_state[row, column] = NULL
+            else:
+                views[row, column] = value
+                views_state[row, column] = PRESENT
+
+    linkshere_indptr, linkshere_indices = _to_csr(
+        [entry['linkshere'] for entry in ranked_entries], index)
+    within_indptr, within_indices = _to_csr(
+        [entry['linkshere_within_category'] for entry in ranked_entries], index)
+
+    np.savez(
+        path,
+        num_pages=np.int64(len(ranked_titles)),
+        titles_blob=titles_blob,
+        titles_offsets=titles_offsets,
+        position=order.astype(np.int64),
+        pageid=np.array([entry['pageid'] for entry in ranked_entries], dtype=np.int64),
+        total_views=total_views[order],
+        dates=np.array(dates, dtype='U10'),
+        views=views,
+        views_state=views_state,
+        linkshere_indptr=linkshere_indptr,
+        linkshere_indices=linkshere_indices,
+        within_indptr=within_indptr,
+        within_indices=within_indices,
+    )
+
+
+class _Bundle:
+    '''
+    Opens the arrays in a .npz bundle as read-only memory maps, so slicing one only reads that
+    part of it from disk. Arrays that were saved compressed are read in full with np.load().
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._npz = np.load(path)
+        with zipfile.ZipFile(path) as archive:
+            self._members = {os.path.splitext(info.filename)[0]: info
+                             for info in archive.infolist()}
+
+    def __getitem__(self, name):
+        info = self._members[name]
+        if info.compress_type != zipfile.ZIP_STORED:
+            return self._npz[name]
+        with open(self.path, 'rb') as file:
+            # the array's data follows the member's local header, which holds the lengths of
+            # its file name and extra field
+            file.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', file.read(4))
+            file.seek(name_length + extra_length, os.SEEK_CUR)
+            version = np.lib.format.read_magic(file)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+            offset = file.tell()
+        if dtype.hasobject:
+            return self._npz[name]
+        if 0 in shape:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=shape,
+                         order='F' if fortran_order else 'C')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._npz.close()
+
+
+def _csr_rows(bundle, name, num_rows):
+    '''
+    Reads the first num_rows rows of a compressed sparse row column from a bundle.
+
+    Returns:
+        A tuple of (indptr, indices) for just those rows.
+    '''
+    indptr = np.array(bundle[f'{name}_indptr'][:num_rows + 1])
+    indices = np.array(bundle[f'{name}_indices'][:indptr[-1]])
+    return indptr, indices
+
+
+def load_dataset(path, top=None, columns=None):
+    '''
+    Loads a dataset saved by save_dataset().
+
+    Parameters:
+        path: A string representing the path of the bundle (.npz) to load.
+        top: Optional. An int representing the number of most viewed pages to load. Only their
+            part of each array is read from the file (unless it was saved compressed), along with
+            the titles of the pages they link to. Defaults to None, which loads every page.
+        columns: Optional. An iterable of the keys to load for each page, out of COLUMNS. Defaults
+            to None, which loads every key.
+
+    Returns:
+        A dictionary formatted the same as the one that was saved, but only containing the
+        requested keys for each page. If top is given, it only contains the top most viewed pages
+        in descending order of total views (note that 'linkshere_within_category' is not trimmed
+        to those pages; use helpers.trim_dict() for that). Otherwise, the pages are in their
+        original order.
+    '''
+    columns = COLUMNS if columns is None else tuple(columns)
+    for column in columns:
+        if column not in COLUMNS:
+            raise ValueError(f'Unknown column: {column}')
+
+    with _Bundle(path) as bundle:
+        num_pages = int(bundle['num_pages'])
+        num_rows = num_pages if top is None else max(0, min(top, num_pages))
+
+        values = {}
+        needed_titles = set(range(num_rows))
+        for column, name in (('linkshere', 'linkshere'),
+                             ('linkshere_within_category', 'within')):
+            if column in columns:
+                indptr, indices = _csr_rows(bundle, name, num_rows)
+                values[column] = (indptr, indices)
+                needed_titles.update(np.unique(indices).tolist())
+        if 'pageid' in columns:
+            values['pageid'] = bundle['pageid'][:num_rows].tolist()
+        if 'total_views' in columns:
+            values['total_views'] = bundle['total_views'][:num_rows].tolist()
+        if 'pageviews' in columns:
+            values['pageviews'] = (bundle['dates'].tolist(),
+                                   np.array(bundle['views'][:, :num_rows]),
+                                   np.array(bundle['views_state'][:, :num_rows]))
+        offsets = np.array(bundle['titles_offsets'][:max(needed_titles, default=0) + 2])
+        strings = _decode_strings(bundle['titles_blob'], offsets, needed_titles)
+        rows = range(num_rows)
+        if top is None:
+            rows = np.argsort(bundle['position'], kind='stable').tolist()
+
+    data = {}
+    for row in rows:
+        entry = {}
+        for column in columns:
+            if column in ('linkshere', 'linkshere_within_category'):
+                indptr, indices = values[column]
+                entry[column] = [strings[i] for i in indices[indptr[row]:indptr[row + 1]].tolist()]
+            elif column == 'pageviews':
+                dates, views, views_state = values[column]
+                entry[column] = {
+                    dates[day]: (None if views_state[day, row] == NULL else int(views[day, row]))
+                    for day in np.flatnonzero(views_state[:, row]).tolist()}
+            else:
+                entry[column] = values[column][row]
+        data[strings[row]] = entry
+    return data
+
+
+def load_pageviews(path, top=None):
+    '''
+    Loads just the page view arrays of a bundle saved by save_dataset(), without building a
+    dictionary for each page.
+
+    Parameters:
+        path: A string representing the path of the bundle (.npz) to load.
+        top: Optional. An int representing the number of most viewed pages to load. Defaults to
+            None, which loads every page.
+
+    Returns:
+        A tuple of (titles, dates, views, views_state), where titles is a list of the pages in
+        descending order of total views, dates is an array of 'YYYY-MM-DD' strings, and views and
+        views_state are arrays of days by pages (see MISSING, PRESENT and NULL).
+    '''
+    with _Bundle(path) as bundle:
+        num_pages = int(bundle['num_pages'])
+        num_rows = num_pages if top is None else max(0, min(top, num_pages))
+        offsets = np.array(bundle['titles_offsets'][:num_rows + 1])
+        strings = _decode_strings(bundle['titles_blob'], offsets, range(num_rows))
+        return ([strings[row] for row in range(num_rows)], np.array(bundle['dates']),
+                np.array(bundle['views'][:, :num_rows]),
+                np.array(bundle['views_state'][:, :num_rows]))
+
+
+def save_data(data, path):
+    '''
+    Saves a dataset formatted by get_data.py, as a compact bundle if the path ends in .npz and
+    as a pickle otherwise.
+
+    Parameters:
+        data: A dictionary of Wikipedia category data as formatted by get_data.py.
+        path: A string representing the path to save the data to.
+    '''
+    if os.path.splitext(path)[1] == '.npz':
+        save_dataset(data, path)
+    else:
+        with open(path, 'wb') as file:
+            pickle.dump(data, file)
+
+
+def load_data(path, top=None, columns=None):
+    '''
+    Loads a dataset saved by save_data().
+
+    Parameters:
+        path: A string representing the path of a .npz bundle or a pickle.
+        top: Optional. See load_dataset(). For pickles, the whole file is still read, but only
+            the top most viewed pages are returned.
+        columns: Optional. See load_dataset(). Only used for .npz bundles.
+
+    Returns:
+        A dictionary of Wikipedia category data as formatted by get_data.py.
+    '''
+    if os.path.splitext(path)[1] == '.npz':
+        return load_dataset(path, top, columns)
+    with open(path, 'rb') as file:
+        data = pickle.load(file)
+    if top is not None:
+        titles = sorted(data, key=lambda title: data[title]['total_views'], reverse=True)
+        data = {title: data[title] for title in titles[:top]}
+    return data
@@ -0,0 +1,33 @@
+'''
+Test that the synthetic data used for benchmarks is shaped like real data.
+'''
+import io
+import contextlib
+
+from benchmark import benchmark_pipeline, make_category
+from get_data import format_data
+
+
+def test_make_category():
+    '''
+    Check that a synthetic category has the requested number of pages, links and days once it is
+    formatted, and that no page's links are split into fragments bigger than the API allows.
+    '''
+    raw = make_category(50, 2000, num_days=7, within_fraction=0.5)
+    assert max(len(page.get('linkshere', [])) for page in raw) <= 500
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = format_data(raw)
+    assert len(data) == 50
+    assert sum(len(entry['linkshere']) for entry in data.values()) == 2000
+    assert all(len(entry['pageviews']) == 7 for entry in data.values())
+    assert 0 < sum(len(entry['linkshere_within_category']) for entry in data.values()) < 2000
+
+
+def test_benchmark_pipeline():
+    '''
+    Check that every stage of the pipeline benchmark reports its results.
+    '''
+    results = benchmark_pipeline([20], links_per_page=5, num_days=3, num_results=5, repeats=1)
+    assert [result['stage'] for result in results][:5] == [
+        'format_data', 'common_links', 'sort_dict', 'trim_dict', 'dict_to_nodes']
+    assert all(result['seconds'] >= 0 and result['peak_bytes'] >= 0 for result in results)
@@ -0,0 +1,128 @@
+'''
+Test that the cache of responses from Wikipedia is working properly.
+'''
+import time
+
+import pytest
+
+from cache import CachedWiki, CacheMiss, LRUStore, ResponseCache, request_key
+
+
+class CountingWiki:
+    '''
+    Stands in for a MediaWiki instance by returning a response built from the request, and
+    counting how many requests were sent.
+    '''
+
+    def __init__(self):
+        self.count = 0
+
+    def wiki_request(self, params):
+        '''
+        Count the request and return a response containing its continue parameter.
+        '''
+        self.count += 1
+        if params.get('gcmtitle') == 'Category:Broken':
+            # MediaWiki.wiki_request() returns this when the response isn't valid JSON
+            return {}
+        # MediaWiki.wiki_request() adds these to the parameters it is given
+        params['format'] = 'json'
+        params['action'] = 'query'
+        return {'query': {'pages': [{'title': params.get('gcmcontinue', 'first')}]}}
+
+
+def test_request_key():
+    '''
+    Check that the key ignores parameter order and the parameters MediaWiki fills in itself, but
+    not continue parameters.
+    '''
+    params = {'prop': 'pageviews|linkshere', 'gcmtitle': 'Category:American billionaires'}
+    assert request_key(params) == request_key(dict(reversed(list(params.items()))))
+    assert request_key(params) == request_key(dict(params, format='json', action='query'))
+    assert request_key(params) != request_key(dict(params, gcmcontinue='page|123'))
+
+
+def test_cached_wiki(tmp_path):
+    '''
+    Check that repeated requests are answered by the cache, even after reopening it.
+    '''
+    wiki = CountingWiki()
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+    cached_wiki = CachedWiki(wiki, cache)
+    first = cached_wiki.wiki_request({'gcmtitle': 'Category:A'})
+    second = cached_wiki.wiki_request({'gcmtitle': 'Category:A', 'gcmcontinue': 'page|1'})
+    assert cached_wiki.wiki_request({'gcmtitle': 'Category:A'}) == first
+    assert wiki.count == 2
+    cache.close()
+
+    offline_wiki = CachedWiki(None, ResponseCache(str(tmp_path / 'cache.sqlite')), offline=True)
+    assert offline_wiki.wiki_request({'gcmtitle': 'Category:A', 'gcmcontinue': 'page|1'}) == second
+    with pytest.raises(CacheMiss):
+        offline_wiki.wiki_request({'gcmtitle': 'Category:B'})
+
+
+def test_cached_wiki_incomplete(tmp_path):
+    '''
+    Check that errors and responses that couldn't be parsed aren't cached.
+    '''
+    wiki = CountingWiki()
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+    cached_wiki = CachedWiki(wiki, cache)
+    for _ in range(2):
+        assert cached_wiki.wiki_request({'gcmtitle': 'Category:Broken'}) == {}
+    assert wiki.count == 2
+    assert len(cache) == 0
+
+
+def test_cache_ttl(tmp_path):
+    '''
+    Check that responses older than the time to live are treated as missing.
+    '''
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), ttl=0.05)
+    cache.put({'a': 1}, {'b': 2})
+    assert cache.get({'a': 1}) == {'b': 2}
+    time.sleep(0.1)
+    assert cache.get({'a': 1}) is None
+    assert len(cache) == 0
+    assert cache.size() == 0
+
+
+def test_cache_lru_eviction(tmp_path):
+    '''
+    Check that the least recently used responses are removed when the cache is too big.
+    '''
+    response = {'query': {'pages': ['x' * 100]}}
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), max_bytes=400)
+    for index in range(3):
+        cache.put({'request': index}, response)
+        time.sleep(0.01)
+    # use the first response so the second one becomes the least recently used
+    assert cache.get({'request': 0}) == response
+    cache.put({'request': 3}, response)
+
+    assert cache.get({'request': 1}) is None
+    assert cache.get({'request': 0}) == response
+    assert cache.get({'request': 3}) == response
+    assert cache.size() <= 400
+
+
+def test_lru_store(tmp_path):
+    '''
+    Check that values can be removed by tag, that values too big for the store aren't stored,
+    and that the size is kept when the store is opened again.
+    '''
+    path = str(tmp_path / 'store.sqlite')
+    store = LRUStore(path, 'entries', max_bytes=100)
+    assert store.put('a', b'x' * 10, 'first')
+    assert store.put('b', b'y' * 20, 'first')
+    assert store.put('c', b'z' * 30, 'second')
+    assert not store.put('d', b'w' * 101)
+    assert store.get('d') is None
+    assert store.delete('first') == 2
+    assert (len(store), store.size()) == (1, 30)
+    store.close()
+
+    store = LRUStore(path, 'entries', max_bytes=100)
+    assert store.size() == 30
+    assert store.get('c') == b'z' * 30
+    store.close()
@@ -1,7 +1,19 @@
 '''
 Test that formatting the raw data is working properly.
 '''
-from get_data import format_data
+import os
+import time
+import signal
+import threading
+from datetime import date
+
+import pytest
+
+from cache import CachedWiki, ResponseCache
+from get_data import (CheckpointTimer, crawl_category, crawl_streams, finish_formatting,
+                      format_batches, format_data, get_multiple_data, get_parser,
+                      iter_generator, load_checkpoint, refresh_pageviews, run,
+                      walk_category_tree)
 
 FORMAT_DATA_CASE = [
     # Check that a standard return from Wikipedia is formatted properly. Wikipedia consistently
@@ -97,3 +109,548 @@ def test_format_data():
         formatted_dict: A properly formatted/filtered dataset.
     '''
     assert format_data(FORMAT_DATA_CASE[0]) == FORMAT_DATA_CASE[1]
+
+
+class FakeWiki:
+    '''
+    Stands in for a MediaWiki instance by returning canned API responses in order.
+    '''
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def wiki_request(self, params):
+        '''
+        Record the request parameters and return the next canned response.
+        '''
+        self.requests.append(dict(params))
+        return self.responses.pop(0)
+
+
+def split_responses(pages, batch_size):
+    '''
+    Split a list of pages into fake API responses chained together by continue parameters.
+    '''
+    responses = []
+    for start in range(0, len(pages), batch_size):
+        response = {'query': {'pages': pages[start:start + batch_size]}}
+        if start + batch_size < len(pages):
+            response['continue'] = {'gcmcontinue': str(start + batch_size), 'continue': 'gcm||'}
+        responses.append(response)
+    return responses
+
+
+def test_iter_generator():
+    '''
+    Check that iter_generator yields one batch per request and follows continue parameters.
+    '''
+    pages = FORMAT_DATA_CASE[0]
+    wiki = FakeWiki(split_responses(pages, 2))
+    batches = list(iter_generator(wiki, 'American_billionaires'))
+
+    assert [batch for batch, _ in batches] == [pages[0:2], pages[2:4]]
+    assert batches[0][1] == {'gcmcontinue': '2', 'continue': 'gcm||'}
+    assert batches[-1][1] == {}
+    assert 'gcmcontinue' not in wiki.requests[0]
+    assert wiki.requests[1]['gcmcontinue'] == '2'
+
+
+def test_format_batches():
+    '''
+    Check that formatting data one batch at a time gives the same result as format_data.
+    '''
+    pages = FORMAT_DATA_CASE[0]
+    batches = [pages[0:1], pages[1:3], pages[3:]]
+    assert format_batches(batches) == FORMAT_DATA_CASE[1]
+
+
+class FailingWiki(FakeWiki):
+    '''
+    A FakeWiki that raises an error once it has answered a set number of requests.
+    '''
+
+    def __init__(self, responses, fail_after):
+        super().__init__(responses)
+        self.fail_after = fail_after
+
+    def wiki_request(self, params):
+        '''
+        Raise a ConnectionError once fail_after requests have been answered.
+        '''
+        if len(self.requests) == self.fail_after:
+            raise ConnectionError('Simulated network failure')
+        return super().wiki_request(params)
+
+
+def test_crawl_category_resume(tmp_path):
+    '''
+    Check that an interrupted crawl saves a checkpoint and resumes from it without losing or
+    repeating any data.
+    '''
+    pages = FORMAT_DATA_CASE[0]
+    responses = split_responses(pages, 1)
+    checkpoint_path = str(tmp_path / 'data.pkl.checkpoint')
+
+    with pytest.raises(ConnectionError):
+        crawl_category(FailingWiki(responses, 2), 'American_billionaires',
+                       checkpoint_path=checkpoint_path, checkpoint_interval=100)
+    checkpoint = load_checkpoint(checkpoint_path)
+    assert checkpoint['continue'] == {'gcmcontinue': '2', 'continue': 'gcm||'}
+    assert list(checkpoint['data']) == ['Andrew Carnegie', 'Bill Gates']
+    assert (checkpoint['mode'], checkpoint['depth']) == ('generator', 0)
+
+    # the generator's continue parameters can't pick up a crawl of subcategories
+    with pytest.raises(ValueError, match='generator crawl with a depth of 0'):
+        crawl_category(FakeWiki(responses[2:]), 'American_billionaires',
+                       checkpoint_path=checkpoint_path, resume=True, depth=1)
+    with pytest.raises(ValueError, match='is for category'):
+        crawl_category(FakeWiki(responses[2:]), 'Science_communicators',
+                       checkpoint_path=checkpoint_path, resume=True)
+
+    wiki = FakeWiki(responses[2:])
+    formatted_data = crawl_category(wiki, 'American_billionaires',
+                                    checkpoint_path=checkpoint_path, resume=True)
+    assert wiki.requests[0]['gcmcontinue'] == '2'
+    assert finish_formatting(formatted_data) == FORMAT_DATA_CASE[1]
+    assert load_checkpoint(checkpoint_path) is None
+
+
+def test_checkpoint_timer(monkeypatch):
+    '''
+    Check that checkpoints are saved at most every interval seconds, and spaced out further when
+    saving takes a while.
+    '''
+    clock = [0.0]
+    monkeypatch.setattr('get_data.time.monotonic', lambda: clock[0])
+    saves = []
+
+    def save(seconds):
+        saves.append(clock[0])
+        clock[0] += seconds
+
+    timer = CheckpointTimer(30)
+    for now in (10, 29, 30, 45, 60, 61):
+        clock[0] = now
+        timer.save_if_due(lambda: save(0.5))
+    # the next save is due 30 seconds after the last one finished
+    assert saves == [30, 61]
+
+    # a save taking 5 seconds pushes the next one back to 10 times as long after it
+    clock[0] = 100
+    assert timer.save_if_due(lambda: save(5))
+    clock[0] = 140
+    assert not timer.save_if_due(lambda: save(5))
+    clock[0] = 155
+    assert timer.save_if_due(lambda: save(0))
+    assert saves == [30, 61, 100, 155]
+
+
+def test_get_multiple_data_merged(monkeypatch):
+    '''
+    Check that crawling several categories merges them into one dataset, with common links
+    found across every category and shared pages only included once.
+    '''
+    category_pages = {
+        'Cat_A': [
+            {'pageid': 1, 'title': 'Alice', 'linkshere': [{'title': 'Bob'}, {'title': 'Zed'}]},
+            {'pageid': 3, 'title': 'Carol', 'pageviews': {'2021-02-08': 5}},
+        ],
+        'Cat_B': [
+            {'pageid': 2, 'title': 'Bob', 'linkshere': [{'title': 'Alice'}]},
+            {'pageid': 3, 'title': 'Carol', 'pageviews': {'2021-02-08': 5}},
+        ],
+    }
+    monkeypatch.setattr('get_data.make_wiki', lambda *args: FakeWiki([]))
+    monkeypatch.setattr(
+        'get_data.iter_generator',
+        lambda wiki, category, cont=None: iter([(category_pages[category], {})]))
+
+    data = get_multiple_data(['Cat_A', 'Cat_B'], rate_limit=False)
+    assert list(data) == ['Alice', 'Carol', 'Bob']
+    assert data['Alice']['linkshere_within_category'] == ['Bob']
+    assert data['Bob']['linkshere_within_category'] == ['Alice']
+    assert data['Carol']['total_views'] == 5
+
+    separate = get_multiple_data(['Cat_A', 'Cat_B'], rate_limit=False, merge=False)
+    assert list(separate) == ['Cat_A', 'Cat_B']
+    assert separate['Cat_A']['Alice']['linkshere_within_category'] == []
+
+
+class TreeWiki:
+    '''
+    Stands in for a MediaWiki instance with a small tree of categories, answering category member
+    listings and title lookups, and counting how many times each title was requested.
+    '''
+
+    def __init__(self, categories):
+        self.categories = categories
+        self.title_requests = {}
+
+    def wiki_request(self, params):
+        '''
+        Answer a category member listing one member at a time, or a request for a list of titles.
+        '''
+        if params.get('list') == 'categorymembers':
+            members = self.categories[params['cmtitle']]
+            index = int(params.get('cmcontinue', 0))
+            response = {'query': {'categorymembers': members[index:index + 1]}}
+            if index + 1 < len(members):
+                response['continue'] = {'cmcontinue': str(index + 1), 'continue': '-||'}
+            return response
+        pages = []
+        for title in params['titles'].split('|'):
+            self.title_requests[title] = self.title_requests.get(title, 0) + 1
+            pages.append({'pageid': len(self.title_requests), 'title': title,
+                          'pageviews': {'2021-02-08': 1}})
+        return {'query': {'pages': pages}}
+
+
+CATEGORY_TREE = {
+    'Category:Root': [
+        {'ns': 0, 'title': 'Alice'},
+        {'ns': 14, 'title': 'Category:Child A'},
+        {'ns': 14, 'title': 'Category:Child B'},
+    ],
+    'Category:Child A': [
+        {'ns': 0, 'title': 'Bob'},
+        {'ns': 0, 'title': 'Alice'},
+        {'ns': 14, 'title': 'Category:Grandchild'},
+    ],
+    'Category:Child B': [
+        {'ns': 0, 'title': 'Carol'},
+        {'ns': 14, 'title': 'Category:Grandchild'},
+        {'ns': 14, 'title': 'Category:Root'},
+    ],
+    'Category:Grandchild': [
+        {'ns': 0, 'title': 'Bob'},
+        {'ns': 0, 'title': 'Dave'},
+    ],
+}
+
+
+@pytest.mark.parametrize('depth,categories,titles', [
+    (0, ['Category:Root'], ['Alice']),
+    (1, ['Category:Root', 'Category:Child A', 'Category:Child B'], ['Alice', 'Bob', 'Carol']),
+    (2, ['Category:Root', 'Category:Child A', 'Category:Child B', 'Category:Grandchild'],
+     ['Alice', 'Bob', 'Carol', 'Dave']),
+])
+def test_walk_category_tree(depth, categories, titles):
+    '''
+    Check that the category tree is walked breadth-first to the right depth, visiting each
+    category and finding each page only once.
+
+    Args:
+        depth: The maximum depth to walk to.
+        categories: The categories that should be visited, in order.
+        titles: The pages that should be found, in order.
+    '''
+    assert walk_category_tree(TreeWiki(CATEGORY_TREE), 'Root', depth) == (categories, titles)
+
+
+def test_crawl_category_depth(monkeypatch):
+    '''
+    Check that crawling with subcategories requests the data for every page exactly once.
+    '''
+    monkeypatch.setattr('get_data.TITLES_PER_REQUEST', 3)
+    wiki = TreeWiki(CATEGORY_TREE)
+    formatted_data = crawl_category(wiki, 'Root', depth=2)
+    assert list(formatted_data) == ['Alice', 'Bob', 'Carol', 'Dave']
+    assert wiki.title_requests == {'Alice': 1, 'Bob': 1, 'Carol': 1, 'Dave': 1}
+
+
+def test_refresh_pageviews():
+    '''
+    Check that refreshing a dataset only requests the missing days, merges them in, drops days
+    outside the window and only recalculates the totals of pages that changed.
+    '''
+    data = {
+        'Alice': {'linkshere': ['Bob'], 'pageid': 1, 'total_views': 6,
+                  'pageviews': {'2021-02-06': 1, '2021-02-07': 2, '2021-02-08': 3}},
+        'Bob': {'linkshere': [], 'pageid': 2, 'total_views': 15,
+                'pageviews': {'2021-02-07': 5, '2021-02-08': 10}},
+    }
+    wiki = FakeWiki([{'query': {'pages': [
+        {'pageid': 1, 'title': 'Alice', 'pageviews': {'2021-02-08': 4, '2021-02-09': 7}},
+        {'pageid': 2, 'title': 'Bob', 'pageviews': {'2021-02-08': 10, '2021-02-09': None}},
+    ]}}])
+
+    changed = refresh_pageviews(wiki, data, today=date(2021, 2, 9), window=2)
+
+    assert wiki.requests[0]['prop'] == 'pageviews'
+    assert wiki.requests[0]['pvipdays'] == 2
+    assert wiki.requests[0]['titles'] == 'Alice|Bob'
+    assert changed == {'Alice', 'Bob'}
+    assert data['Alice']['pageviews'] == {'2021-02-08': 4, '2021-02-09': 7}
+    assert data['Alice']['total_views'] == 11
+    assert data['Bob']['pageviews'] == {'2021-02-08': 10, '2021-02-09': None}
+    assert data['Bob']['total_views'] == 10
+    assert data['Alice']['linkshere'] == ['Bob']
+
+
+def test_refresh_pageviews_cached(tmp_path):
+    '''
+    Check that refreshing on another day gets the new page views instead of the cached ones, even
+    though the request is the same.
+    '''
+    data = {'Alice': {'linkshere': [], 'pageid': 1, 'total_views': 3,
+                      'pageviews': {'2021-02-07': 1, '2021-02-08': 2}}}
+    wiki = FakeWiki([{'query': {'pages': [
+        {'pageid': 1, 'title': 'Alice', 'pageviews': {'2021-02-08': 2, '2021-02-09': 4}},
+    ]}}, {'query': {'pages': [
+        {'pageid': 1, 'title': 'Alice', 'pageviews': {'2021-02-09': 4, '2021-02-10': 8}},
+    ]}}])
+    cached_wiki = CachedWiki(wiki, ResponseCache(str(tmp_path / 'cache.sqlite')))
+
+    refresh_pageviews(cached_wiki, data, today=date(2021, 2, 9), window=None)
+    assert refresh_pageviews(cached_wiki, data, today=date(2021, 2, 10), window=None) == {'Alice'}
+
+    assert wiki.requests[0] == wiki.requests[1]
+    assert data['Alice']['pageviews']['2021-02-10'] == 8
+    assert data['Alice']['total_views'] == 15
+    with pytest.raises(ValueError):
+        refresh_pageviews(CachedWiki(None, cached_wiki.cache, offline=True), data)
+
+
+class StreamWiki:
+    '''
+    Stands in for a MediaWiki instance for one stream of crawl_streams(), answering category
+    member listings, page view requests, and link requests one link at a time (like the long
+    lhcontinue tails of popular pages).
+    '''
+    MEMBERS = [{'ns': 0, 'title': 'Alice'}, {'ns': 0, 'title': 'Bob'}, {'ns': 0, 'title': 'Carol'},
+               {'ns': 14, 'title': 'Category:Sub'}]
+    LINKS = {'Alice': ['Bob', 'Zed', 'Carol'], 'Bob': ['Alice'], 'Carol': []}
+
+    def __init__(self, fail_after=None):
+        self.requests = []
+        self.fail_after = fail_after
+
+    def wiki_request(self, params):
+        '''
+        Answer a request, raising a ConnectionError once fail_after requests have been answered.
+        '''
+        if len(self.requests) == self.fail_after:
+            raise ConnectionError('Simulated network failure')
+        self.requests.append(dict(params))
+        if params.get('list') == 'categorymembers':
+            return {'query': {'categorymembers': self.MEMBERS}}
+        titles = params['titles'].split('|')
+        if params['prop'] == 'pageviews':
+            assert params['pvipdays'] == 60
+            return {'query': {'pages': [
+                {'pageid': len(title), 'title': title, 'pageviews': {'2021-02-08': len(title)}}
+                for title in titles]}}
+        # one link per response, going through the links of every title in turn
+        links = [(title, link) for title in titles for link in self.LINKS[title]]
+        index = int(params.get('lhcontinue', 0))
+        title, link = links[index]
+        response = {'query': {'pages': [
+            {'pageid': len(title), 'title': title, 'linkshere': [{'title': link}]}]}}
+        if index + 1 < len(links):
+            response['continue'] = {'lhcontinue': str(index + 1), 'continue': '||'}
+        return response
+
+
+STREAMS_RESULT = {
+    'Alice': {'linkshere': ['Bob', 'Zed', 'Carol'], 'pageviews': {'2021-02-08': 5},
+              'pageid': 5, 'total_views': 5, 'linkshere_within_category': ['Bob', 'Carol']},
+    'Bob': {'linkshere': ['Alice'], 'pageviews': {'2021-02-08': 3}, 'pageid': 3,
+            'total_views': 3, 'linkshere_within_category': ['Alice']},
+    'Carol': {'linkshere': [], 'pageviews': {'2021-02-08': 5}, 'pageid': 5, 'total_views': 5,
+              'linkshere_within_category': []},
+}
+
+
+def test_crawl_streams(monkeypatch):
+    '''
+    Check that crawling page views and links as separate streams gives the same data as a
+    single stream, listing the category's members only once.
+    '''
+    wikis = {'pageviews': StreamWiki(), 'linkshere': StreamWiki()}
+    assert finish_formatting(crawl_streams(wikis, 'Root')) == STREAMS_RESULT
+    assert len(wikis['pageviews'].requests) == 2
+    assert [request.get('lhcontinue') for request in wikis['linkshere'].requests] == [
+        None, '1', '2', '3']
+
+    limiters = []
+
+    def make_stream_wiki(limiter, *args):
+        limiters.append(limiter)
+        return StreamWiki()
+    monkeypatch.setattr('get_data.make_wiki', make_stream_wiki)
+    assert get_multiple_data(['Root'], split_streams=True, rate_limit=True,
+                             rate_limit_wait=0.001) == STREAMS_RESULT
+    # both streams share one request budget
+    assert len(limiters) == 2 and limiters[0] is limiters[1] is not None
+
+
+def test_split_streams_warning(monkeypatch, capsys):
+    '''
+    Check that splitting the streams under a fixed rate limit, where it can only be slower,
+    prints a warning.
+    '''
+    monkeypatch.setattr('get_data.get_multiple_data', lambda *args, **kwargs: {})
+    monkeypatch.setattr('get_data.save_data', lambda *args: None)
+    parser = get_parser('get_data.py')
+    for args, warned in ((['--split-streams'], True), (['--split-streams', '-a'], False),
+                         (['--split-streams', '--no-rate-limit'], False), ([], False)):
+        run(parser, parser.parse_args(['data.pkl'] + args))
+        assert ('Warning' in capsys.readouterr().out) == warned
+
+
+class SlowPageviewWiki(StreamWiki):
+    '''
+    A StreamWiki whose page view requests only return after another stream has failed, and then
+    take a moment longer.
+    '''
+
+    def __init__(self, failed):
+        super().__init__()
+        self.failed = failed
+
+    def wiki_request(self, params):
+        '''
+        Wait for the other stream to fail before answering page view requests.
+        '''
+        if params.get('prop') == 'pageviews':
+            assert self.failed.wait(5)
+            time.sleep(0.2)
+        return super().wiki_request(params)
+
+
+class SignallingWiki(StreamWiki):
+    '''
+    A StreamWiki that fails its first request, setting an event just before it does.
+    '''
+
+    def __init__(self, failed):
+        super().__init__(fail_after=0)
+        self.failed = failed
+
+    def wiki_request(self, params):
+        '''
+        Set the event and raise a ConnectionError.
+        '''
+        self.failed.set()
+        return super().wiki_request(params)
+
+
+def test_crawl_streams_first_error(tmp_path, monkeypatch):
+    '''
+    Check that an error in one stream stops the other one after its current request, instead of
+    waiting for it to finish.
+    '''
+    monkeypatch.setattr('get_data.TITLES_PER_REQUEST', 1)
+    failed = threading.Event()
+    wikis = {'pageviews': SlowPageviewWiki(failed), 'linkshere': SignallingWiki(failed)}
+    checkpoint_path = str(tmp_path / 'data.pkl.checkpoint')
+    with pytest.raises(ConnectionError):
+        crawl_streams(wikis, 'Root', checkpoint_path=checkpoint_path)
+    # one listing request, then only the page view request that was running at the time
+    assert [request.get('prop') for request in wikis['pageviews'].requests] == [None, 'pageviews']
+    assert load_checkpoint(checkpoint_path)['continue']['pageviews'] == {'batch': 1,
+                                                                         'continue': {}}
+
+
+def test_crawl_streams_resume(tmp_path):
+    '''
+    Check that an interrupted stream saves a checkpoint with the progress of every stream, and
+    resumes without repeating any requests.
+    '''
+    checkpoint_path = str(tmp_path / 'data.pkl.checkpoint')
+    wikis = {'pageviews': StreamWiki(), 'linkshere': StreamWiki(fail_after=2)}
+    with pytest.raises(ConnectionError):
+        crawl_streams(wikis, 'Root', checkpoint_path=checkpoint_path)
+    checkpoint = load_checkpoint(checkpoint_path)
+    assert checkpoint['titles'] == ['Alice', 'Bob', 'Carol']
+    assert checkpoint['continue'] == {'pageviews': None,
+                                      'linkshere': {'batch': 0, 'continue': {
+                                          'lhcontinue': '2', 'continue': '||'}}}
+
+    with pytest.raises(ValueError):
+        crawl_category(StreamWiki(), 'Root', checkpoint_path=checkpoint_path, resume=True)
+    wikis = {'pageviews': StreamWiki(), 'linkshere': StreamWiki()}
+    formatted_data = crawl_streams(wikis, 'Root', checkpoint_path=checkpoint_path, resume=True)
+    assert finish_formatting(formatted_data) == STREAMS_RESULT
+    assert wikis['pageviews'].requests == []
+    assert [request['lhcontinue'] for request in wikis['linkshere'].requests] == ['2', '3']
+    assert load_checkpoint(checkpoint_path) is None
+
+
+def test_rate_limit_flag():
+    '''
+    Check that rate limiting is on by default, and only turned off by --no-rate-limit.
+    '''
+    parser = get_parser('get_data.py')
+    assert parser.parse_args(['data.pkl']).rate_limit is True
+    assert parser.parse_args(['data.pkl', '-r']).rate_limit is True
+    assert parser.parse_args(['data.pkl', '--no-rate-limit']).rate_limit is False
+    with pytest.raises(SystemExit):
+        parser.parse_args(['data.pkl', '-r', 'False'])
+
+
+def test_category_flag():
+    '''
+    Check that -c takes one category at a time, so it can come before the output file, and can
+    be given more than once.
+    '''
+    parser = get_parser('get_data.py')
+    parsed_args = parser.parse_args(['-c', 'Cat', 'out.pkl'])
+    assert (parsed_args.category, parsed_args.filename) == (['Cat'], 'out.pkl')
+    parsed_args = parser.parse_args(['-c', 'A', '-c', 'B', 'out.pkl'])
+    assert (parsed_args.category, parsed_args.filename) == (['A', 'B'], 'out.pkl')
+    assert parser.parse_args(['out.pkl']).category is None
+
+
+class EndlessWiki:
+    '''
+    Stands in for a MediaWiki instance by answering category listings with one page per response,
+    without ever finishing. Once a set number of requests have been answered in total, Ctrl-C is
+    sent to the main thread.
+    '''
+    count = 0
+    lock = threading.Lock()
+
+    def __init__(self, interrupt_after):
+        self.interrupt_after = interrupt_after
+
+    def wiki_request(self, params):
+        '''
+        Return the next page of the category, pressing Ctrl-C once enough requests have been sent.
+        '''
+        with EndlessWiki.lock:
+            EndlessWiki.count += 1
+            if EndlessWiki.count == self.interrupt_after:
+                signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
+        time.sleep(0.01)
+        index = int(params.get('gcmcontinue', 0))
+        return {'query': {'pages': [{'pageid': index, 'ns': 0,
+                                     'title': f"{params['gcmtitle']} {index}"}]},
+                'continue': {'gcmcontinue': str(index + 1), 'continue': 'gcm||'}}
+
+
+def test_interrupt_threaded_crawl(tmp_path, monkeypatch):
+    '''
+    Check that Ctrl-C stops crawls running in other threads, and every one of them saves a
+    checkpoint first.
+    '''
+    monkeypatch.setattr(EndlessWiki, 'count', 0)
+    monkeypatch.setattr('get_data.make_wiki', lambda *args: EndlessWiki(interrupt_after=6))
+    categories = ['Cat_A', 'Cat_B']
+    checkpoint_paths = {category: str(tmp_path / f'data.pkl.{category}.checkpoint')
+                        for category in categories}
+    with pytest.raises(KeyboardInterrupt):
+        get_multiple_data(categories, rate_limit=False, checkpoint_paths=checkpoint_paths)
+    for category, path in checkpoint_paths.items():
+        assert os.path.exists(path)
+        checkpoint = load_checkpoint(path, category, 'generator', 0)
+        assert len(checkpoint['data']) >= 1
+        assert checkpoint['continue']['gcmcontinue'] == str(len(checkpoint['data']))
+
+    # a single category is crawled in the main thread, where Ctrl-C arrives directly
+    monkeypatch.setattr(EndlessWiki, 'count', 0)
+    path = str(tmp_path / 'data.pkl.checkpoint')
+    with pytest.raises(KeyboardInterrupt):
+        get_multiple_data(['Cat_C'], rate_limit=False, checkpoint_paths={'Cat_C': path})
+    assert len(load_checkpoint(path, 'Cat_C')['data']) >= 1
@@ -0,0 +1,155 @@
+'''
+Test that the compact graph representation gives the same results as the dictionary helpers.
+'''
+import copy
+import pickle
+
+import numpy as np
+import pytest
+
+from graph import CategoryGraph, RankedGraph, top_k
+from helpers import common_links, dict_to_nodes, sort_dict, trim_dict
+from test_helpers import COMMON_LINKS_CASES, DICT_TO_NODES_CASES, TRIM_DICT_CASES
+
+with open('data/billionairesdict.pkl', 'rb') as data_file:
+    FULL_DATASET = pickle.load(data_file)
+
+
+@pytest.mark.parametrize('data', [case[1] for case in COMMON_LINKS_CASES] + [FULL_DATASET])
+def test_round_trip(data):
+    '''
+    Check that converting a dictionary to a graph and back gives the same dictionary.
+
+    Args:
+        data: A dictionary of Wikipedia category data.
+    '''
+    converted = CategoryGraph.from_dict(data).to_dict()
+    assert converted == data
+    assert list(converted) == list(data)
+
+
+@pytest.mark.parametrize('raw_dict,formatted_dict', COMMON_LINKS_CASES)
+def test_common_links(raw_dict, formatted_dict):
+    '''
+    Check that common_links works the same on a graph as on a dictionary.
+
+    Args:
+        raw_dict: A dictionary used as the input for the function.
+        formatted_dict: The correct output of the function.
+    '''
+    graph = CategoryGraph.from_dict(copy.deepcopy(raw_dict))
+    assert common_links(graph).to_dict() == formatted_dict
+
+
+@pytest.mark.parametrize('raw_dict,length,formatted_dict', TRIM_DICT_CASES)
+def test_trim(raw_dict, length, formatted_dict):
+    '''
+    Check that trim_dict works the same on a graph as on a dictionary.
+
+    Args:
+        raw_dict: A dictionary used as the input for the function.
+        length: The length to trim to.
+        formatted_dict: The correct output of the function.
+    '''
+    graph = CategoryGraph.from_dict(copy.deepcopy(raw_dict))
+    trimmed = trim_dict(graph, length).to_dict()
+    assert trimmed == formatted_dict
+    assert list(trimmed) == list(formatted_dict)
+
+
+@pytest.mark.parametrize('raw_dict,formatted_dict', DICT_TO_NODES_CASES)
+def test_to_nodes(raw_dict, formatted_dict):
+    '''
+    Check that dict_to_nodes works the same on a graph as on a dictionary.
+
+    Args:
+        raw_dict: A dictionary used as the input for the function.
+        formatted_dict: The correct output of the function.
+    '''
+    assert dict_to_nodes(CategoryGraph.from_dict(raw_dict)) == formatted_dict
+
+
+@pytest.mark.parametrize('length', [0, 1, 50, 150, 900, 2000])
+def test_full_dataset(length):
+    '''
+    Check that the graph helpers give the same results as the dictionary helpers on the full
+    American billionaires dataset.
+
+    Args:
+        length: The length to trim to.
+    '''
+    graph = common_links(CategoryGraph.from_dict(FULL_DATASET))
+    expected = trim_dict(common_links(copy.deepcopy(FULL_DATASET)), length)
+    trimmed = trim_dict(graph, length)
+    assert trimmed.to_dict() == expected
+    assert list(trimmed.to_dict()) == list(expected)
+    assert dict_to_nodes(trimmed) == dict_to_nodes(expected)
+    assert list(sort_dict(graph, num_results=length).to_dict()) == list(
+        sort_dict(FULL_DATASET, 'total_views', length))
+
+
+@pytest.mark.parametrize('num_values,k', [
+    (1000, 0), (1000, 1), (1000, 10), (1000, 150), (1000, 249), (1000, 250), (1000, 1000),
+    (1000, 5000), (1000, None), (5, 1), (0, 3),
+])
+def test_top_k(num_values, k):
+    '''
+    Check that the partial sort gives the same positions as a stable sort of every value, even
+    with lots of ties.
+
+    Args:
+        num_values: The number of values to sort.
+        k: The number of largest values to find.
+    '''
+    values = np.random.default_rng(num_values).integers(0, 20, num_values)
+    expected = np.argsort(-values, kind='stable')
+    if k is not None:
+        expected = expected[:k]
+    assert top_k(values, k).tolist() == expected.tolist()
+
+
+def test_common_links_full_dataset():
+    '''
+    Check that finding common links in one process, in several processes and on a graph all give
+    the same result as the original dataset on the full American billionaires dataset.
+    '''
+    expected = [entry['linkshere_within_category'] for entry in FULL_DATASET.values()]
+    single = common_links(copy.deepcopy(FULL_DATASET))
+    multiple = common_links(copy.deepcopy(FULL_DATASET), processes=2, chunk_size=100)
+    graph = common_links(CategoryGraph.from_dict(FULL_DATASET)).to_dict()
+    for result in (single, multiple, graph):
+        assert [entry['linkshere_within_category'] for entry in result.values()] == expected
+
+
+def test_ranked_graph():
+    '''
+    Check that a ranked graph gives the same results as trim_dict and dict_to_nodes while
+    sweeping through different sizes, both growing and shrinking, without changing its input.
+    '''
+    data = common_links(copy.deepcopy(FULL_DATASET))
+    ranked = RankedGraph(data)
+    for size in [50, 100, 150, 500, 120, 0, 900, 3, 2000, 150]:
+        expected = trim_dict(copy.deepcopy(data), size)
+        trimmed = ranked.trim(size)
+        assert trimmed == expected
+        assert list(trimmed) == list(expected)
+        assert ranked.to_nodes(size) == dict_to_nodes(expected)
+        sources, targets = ranked.edges(size)
+        assert len(sources) == sum(len(entry['linkshere_within_category'])
+                                   for entry in expected.values())
+        assert sources.max(initial=-1) < size and targets.max(initial=-1) < size
+    assert data == common_links(copy.deepcopy(FULL_DATASET))
+
+
+@pytest.mark.parametrize('raw_dict,length,formatted_dict', TRIM_DICT_CASES)
+def test_ranked_graph_cases(raw_dict, length, formatted_dict):
+    '''
+    Check that a ranked graph trims the same as trim_dict, from a dictionary or a CategoryGraph.
+
+    Args:
+        raw_dict: A dictionary used as the input for the function.
+        length: The length to trim to.
+        formatted_dict: The correct output of the function.
+    '''
+    assert RankedGraph(copy.deepcopy(raw_dict)).trim(length) == formatted_dict
+    assert RankedGraph(CategoryGraph.from_dict(raw_dict)).trim(length) == formatted_dict
@@ -1,9 +1,14 @@
 '''
 Test that helper functions for illuminatimap are working properly.
 '''
+import copy
+
+import numpy as np
 import pytest
 
-from helpers import common_links, dict_to_nodes, sort_dict, trim_dict
+from graph import CategoryGraph
+from helpers import (common_links, dict_to_edge_arrays, dict_to_nodes, sort_dict, to_igraph,
+                     trim_dict)
 
 SORT_DICT_CASES = [
     # Checking that an ordered dictionary is returned as itself
@@ -200,6 +205,56 @@ SORT_DICT_CASES = [
         0
     ),
 
+    # Checking that asking for only a few results from a larger dictionary keeps ties in input
+    # order (this uses a partial sort instead of sorting the whole dictionary)
+    (
+        dict(
+            test1=1,
+            test2=3,
+            test3=2,
+            test4=3,
+            test5=1,
+            test6=2,
+            test7=3,
+            test8=1,
+            test9=2,
+            test10=1,
+            test11=0,
+            test12=0
+        ),
+        dict(
+            test2=3,
+            test4=3,
+        ),
+        None,
+        2
+    ),
+
+    # Checking the same for a nested dictionary
+    (
+        {
+            'outerdict1': {'innerprop': 1},
+            'outerdict2': {'innerprop': 2},
+            'outerdict3': {'innerprop': 3},
+            'outerdict4': {'innerprop': 2},
+            'outerdict5': {'innerprop': 3},
+            'outerdict6': {'innerprop': 1},
+            'outerdict7': {'innerprop': 2},
+            'outerdict8': {'innerprop': 0},
+            'outerdict9': {'innerprop': 1},
+            'outerdict10': {'innerprop': 1},
+            'outerdict11': {'innerprop': 2},
+            'outerdict12': {'innerprop': 0},
+        },
+        {
+            'outerdict3': {'innerprop': 3},
+            'outerdict5': {'innerprop': 3},
+            'outerdict2': {'innerprop': 2},
+        },
+        'innerprop',
+        3
+    ),
+
     # Checking the full list length can be returned
     (
         dict(
@@ -565,3 +620,57 @@ def test_dict_to_nodes(raw_dict, formatted_dict):
         formatted_dict: The correct output of the function.
     '''
     assert dict_to_nodes(raw_dict) == formatted_dict
+
+
+@pytest.mark.parametrize('raw_dict,formatted_dict', COMMON_LINKS_CASES)
+def test_common_links_processes(raw_dict, formatted_dict):
+    '''
+    Check that finding common links in several processes gives the same result.
+
+    Args:
+        raw_dict: A dictionary used as the input for the function.
+        formatted_dict: The correct output of the function.
+    '''
+    assert common_links(copy.deepcopy(raw_dict), processes=2, chunk_size=1) == formatted_dict
+
+
+@pytest.mark.parametrize('raw_dict,formatted_dict', DICT_TO_NODES_CASES)
+def test_dict_to_edge_arrays(raw_dict, formatted_dict):
+    '''
+    Check that dict_to_edge_arrays holds the same nodes and links as dict_to_nodes, for a
+    dictionary and for a CategoryGraph.
+
+    Args:
+        raw_dict: A dictionary used as the input for the function.
+        formatted_dict: The correct output of dict_to_nodes.
+    '''
+    for data in (raw_dict, CategoryGraph.from_dict(raw_dict)):
+        arrays = dict_to_edge_arrays(data)
+        assert arrays['edges'].dtype == np.int32
+        assert arrays['edges'].shape == (len(formatted_dict['links']), 2)
+        assert arrays['names'] == [node['name'] for node in formatted_dict['nodes']]
+        assert arrays['views'].tolist() == [node['group'] for node in formatted_dict['nodes']]
+        assert arrays['edges'].tolist() == [[link['source'], link['target']]
+                                            for link in formatted_dict['links']]
+        assert arrays['weights'].tolist() == [link['value'] for link in formatted_dict['links']]
+
+
+@pytest.mark.parametrize('raw_dict,formatted_dict', DICT_TO_NODES_CASES)
+def test_to_igraph(raw_dict, formatted_dict):
+    '''
+    Check that to_igraph builds the same graph as the notebook builds from dict_to_nodes.
+
+    Args:
+        raw_dict: A dictionary used as the input for the function.
+        formatted_dict: The correct output of dict_to_nodes.
+    '''
+    pytest.importorskip('igraph')
+    graph = to_igraph(raw_dict)
+    assert not graph.is_directed()
+    assert graph.vcount() == len(formatted_dict['nodes'])
+    # undirected edges are stored with the lower vertex first
+    assert graph.get_edgelist() == [tuple(sorted((link['source'], link['target'])))
+                                    for link in formatted_dict['links']]
+    assert graph.vs['name'] == [node['name'] for node in formatted_dict['nodes']]
+    assert graph.vs['views'] == [node['group'] for node in formatted_dict['nodes']]
+    assert graph.es['weight'] == [link['value'] for link in formatted_dict['links']]
@@ -0,0 +1,133 @@
+'''
+Test that graph layouts are cached and warm started properly.
+'''
+import numpy as np
+import pytest
+
+from helpers import dict_to_edge_arrays, dict_to_nodes
+from layout import (WARM_KK_ITERATIONS_PER_NODE, GraphLayout, LayoutCache, graph_key, layout_graph,
+                    seed_coords)
+
+igraph = pytest.importorskip('igraph')
+
+GRAPH = {
+    'A': {'total_views': 10, 'linkshere_within_category': ['B', 'C']},
+    'B': {'total_views': 8, 'linkshere_within_category': ['A']},
+    'C': {'total_views': 6, 'linkshere_within_category': ['D']},
+    'D': {'total_views': 4, 'linkshere_within_category': ['A']},
+}
+
+
+def test_graph_key():
+    '''
+    Check that the key of a graph only depends on its nodes, edges and dimensions, and that every
+    input format gives the same key.
+    '''
+    arrays = dict_to_edge_arrays(GRAPH)
+    key = graph_key(arrays['names'], arrays['edges'])
+    assert layout_graph(GRAPH).key == key
+    assert layout_graph(dict_to_nodes(GRAPH)).key == key
+    assert graph_key(arrays['names'], arrays['edges'][:-1]) != key
+    assert graph_key(arrays['names'][::-1], arrays['edges']) != key
+    assert graph_key(arrays['names'], arrays['edges'], dim=2) != key
+
+
+def test_layout_cache(tmp_path, monkeypatch):
+    '''
+    Check that a graph is only laid out once when a cache is used.
+    '''
+    cache = LayoutCache(str(tmp_path / 'layouts'))
+    first = layout_graph(GRAPH, cache=cache)
+    assert first.coords.shape == (4, 3)
+    assert first.algorithm == 'kk'
+
+    def fail(*args, **kwargs):
+        raise AssertionError('the graph should not be laid out again')
+    monkeypatch.setattr(igraph.Graph, 'layout_kamada_kawai', fail)
+    second = layout_graph(GRAPH, cache=LayoutCache(str(tmp_path / 'layouts')))
+    assert second.names == first.names
+    assert np.array_equal(second.coords, first.coords)
+    assert second.algorithm == 'kk'
+    assert second.key == first.key
+
+
+def test_layout_cache_algorithm(tmp_path):
+    '''
+    Check that a cached layout isn't returned for a call that would use another algorithm, or
+    start from somewhere else.
+    '''
+    cache = LayoutCache(str(tmp_path / 'layouts'))
+    kk = layout_graph(GRAPH, cache=cache)
+    fr = layout_graph(GRAPH, cache=cache, max_kk_nodes=3)
+    assert (kk.algorithm, fr.algorithm) == ('kk', 'fr')
+    assert kk.key == fr.key
+    assert layout_graph(GRAPH, cache=cache, max_kk_nodes=3).algorithm == 'fr'
+    assert layout_graph(GRAPH, cache=cache).algorithm == 'kk'
+
+    changed = dict(GRAPH, E={'total_views': 2, 'linkshere_within_category': ['D']})
+    cold = layout_graph(changed, cache=cache)
+    warm = layout_graph(changed, cache=cache, previous=kk, seed=0)
+    assert not np.array_equal(cold.coords, warm.coords)
+    assert np.array_equal(layout_graph(changed, cache=cache, previous=kk, seed=0).coords,
+                          warm.coords)
+
+
+def test_seed_coords():
+    '''
+    Check that nodes keep their old coordinates, and new nodes start next to their neighbours.
+    '''
+    previous = GraphLayout(['A', 'B'], np.array([[0.0, 0.0, 0.0], [2.0, 2.0, 2.0]]), '', 'kk')
+    names = ['B', 'A', 'C', 'D', 'E']
+    edges = np.array([[2, 0], [1, 2], [3, 2]])
+    coords = seed_coords(names, edges, previous, seed=0)
+    assert coords[:3].tolist() == [[2.0, 2.0, 2.0], [0.0, 0.0, 0.0], [1.0, 1.0, 1.0]]
+    assert coords[3].tolist() == [1.0, 1.0, 1.0]
+    # E isn't connected to anything, so it's put somewhere within the old layout
+    assert ((coords[4] >= 0) & (coords[4] <= 2)).all()
+
+
+def test_warm_start(monkeypatch):
+    '''
+    Check that laying out a changed graph starts from the previous layout, with fewer iterations.
+    '''
+    previous = layout_graph(GRAPH)
+    changed = dict(GRAPH, E={'total_views': 2, 'linkshere_within_category': ['D']})
+    calls = []
+    original = igraph.Graph.layout_kamada_kawai
+
+    def record_layout(graph, *args, **kwargs):
+        calls.append(kwargs)
+        return original(graph, *args, **kwargs)
+    monkeypatch.setattr(igraph.Graph, 'layout_kamada_kawai', record_layout)
+
+    warm = layout_graph(changed, previous=previous, seed=0)
+    assert warm.names == ['A', 'B', 'C', 'D', 'E']
+    assert warm.key != previous.key
+    assert calls[0]['seed'][:4] == previous.coords.tolist()
+    assert calls[0]['maxiter'] == WARM_KK_ITERATIONS_PER_NODE * 5
+    layout_graph(changed)
+    assert calls[1]['seed'] is None and calls[1]['maxiter'] is None
+    assert layout_graph(GRAPH, previous=previous) is previous
+
+
+def test_large_graph_fallback():
+    '''
+    Check that graphs above the size limit are laid out with Fruchterman-Reingold.
+    '''
+    result = layout_graph(GRAPH, max_kk_nodes=3)
+    assert result.algorithm == 'fr'
+    assert result.coords.shape == (4, 3)
+
+
+def test_very_large_graph_fallback():
+    '''
+    Check that graphs above the second size limit are laid out with DrL, including from a
+    previous layout.
+    '''
+    result = layout_graph(GRAPH, max_kk_nodes=2, max_fr_nodes=3)
+    assert result.algorithm == 'drl'
+    assert result.coords.shape == (4, 3)
+    changed = dict(GRAPH, E={'total_views': 2, 'linkshere_within_category': ['D']})
+    warm = layout_graph(changed, previous=result, max_kk_nodes=2, max_fr_nodes=3, seed=0)
+    assert warm.algorithm == 'drl'
+    assert warm.coords.shape == (5, 3)
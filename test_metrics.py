@@ -0,0 +1,157 @@
+'''
+Test that crawls are measured and the metrics are written properly.
+'''
+import json
+
+import pytest
+
+from get_data import crawl_category
+from metrics import CrawlMetrics, Histogram, MeteredWiki, query_key
+
+
+class ChainWiki:
+    '''
+    Stands in for a MediaWiki instance by answering each category listing with a chain of
+    responses linked by continue parameters, one page per response.
+    '''
+
+    def __init__(self, pages_per_category):
+        self.pages_per_category = pages_per_category
+
+    def wiki_request(self, params):
+        '''
+        Return the next page of a category, raising a ConnectionError for unknown categories.
+        '''
+        category = params['gcmtitle']
+        if category not in self.pages_per_category:
+            raise ConnectionError('Simulated network failure')
+        # MediaWiki.wiki_request() adds these to the parameters it is given
+        params['format'] = 'json'
+        params['action'] = 'query'
+        index = int(params.get('gcmcontinue', 0))
+        response = {'query': {'pages': [{'pageid': index, 'title': f'{category} {index}'}]}}
+        if index + 1 < self.pages_per_category[category]:
+            response['continue'] = {'gcmcontinue': str(index + 1), 'continue': 'gcm||'}
+        return response
+
+
+def test_histogram():
+    '''
+    Check that values are counted into the right buckets and quantiles are estimated from them.
+    '''
+    histogram = Histogram((1, 5, 10))
+    assert histogram.quantile(0.5) is None
+    for value in (0.5, 1, 3, 4, 20):
+        histogram.observe(value)
+    assert histogram.counts == [2, 2, 0, 1]
+    assert histogram.sum == 28.5
+    assert histogram.quantile(0.4) == 1
+    assert histogram.quantile(0.5) == 5
+    assert histogram.quantile(1) == float('inf')
+    assert histogram.to_dict()['mean'] == 28.5 / 5
+
+
+def test_query_key():
+    '''
+    Check that every request of one query has the same key, and different queries don't.
+    '''
+    params = {'gcmtitle': 'Category:A', 'prop': 'pageviews'}
+    continued = dict(params, gcmcontinue='1', format='json', action='query')
+    continued['continue'] = 'gcm||'
+    assert query_key(params) == query_key(continued)
+    assert query_key(params) != query_key(dict(params, gcmtitle='Category:B'))
+
+
+def test_metered_wiki():
+    '''
+    Check that requests, failures, bytes and continue requests are counted for each category.
+    '''
+    metrics = CrawlMetrics()
+    wiki = ChainWiki({'Category:A': 3, 'Category:B': 1})
+    for category, num_requests in (('A', 3), ('B', 1)):
+        metered = MeteredWiki(wiki, metrics, category)
+        cont = {}
+        for _ in range(num_requests):
+            result = metered.wiki_request(dict({'gcmtitle': f'Category:{category}'}, **cont))
+            cont = result.get('continue', {})
+    with pytest.raises(ConnectionError):
+        MeteredWiki(wiki, metrics, 'C').wiki_request({'gcmtitle': 'Category:C'})
+
+    snapshot = metrics.snapshot()
+    assert (snapshot['requests'], snapshot['errors']) == (4, 1)
+    assert snapshot['bytes'] > 0
+    assert snapshot['latency_seconds']['count'] == 4
+    # the chain for A needed 2 continue requests and B needed none
+    assert snapshot['continuation_depth']['counts'][:4] == [1, 0, 1, 0]
+    assert {category: counters['requests']
+            for category, counters in snapshot['categories'].items()} == {'A': 3, 'B': 1, 'C': 0}
+    assert snapshot['categories']['C']['errors'] == 1
+
+
+def test_crawl_progress():
+    '''
+    Check that crawl_category() records the pages it has found.
+    '''
+    metrics = CrawlMetrics()
+    wiki = MeteredWiki(ChainWiki({'Category:A': 4}), metrics, 'A')
+    formatted_data = crawl_category(wiki, 'A', metrics=metrics)
+    snapshot = metrics.snapshot()
+    assert snapshot['pages_done'] == len(formatted_data) == 4
+    # the size of a category isn't known when it's listed with a generator
+    assert snapshot['pages_total'] is None
+    assert snapshot['eta_seconds'] is None
+    assert snapshot['pages_per_second'] > 0
+
+
+def test_eta():
+    '''
+    Check that pages from a checkpoint don't count towards the pages per second, and the time
+    left is estimated from the pages still to go.
+    '''
+    metrics = CrawlMetrics()
+    metrics.progress('A', 100, 400)
+    metrics.progress('A', 200, 400)
+    metrics.progress('B', 0, 100)
+    snapshot = metrics.snapshot()
+    assert (snapshot['pages_done'], snapshot['pages_total']) == (200, 500)
+    assert snapshot['pages_per_second'] == pytest.approx(100 / snapshot['elapsed_seconds'])
+    assert snapshot['eta_seconds'] == pytest.approx(300 / snapshot['pages_per_second'])
+
+
+def test_write_json_lines(tmp_path):
+    '''
+    Check that each write appends a line of JSON, and writes are spaced out by the interval.
+    '''
+    path = str(tmp_path / 'metrics.jsonl')
+    metrics = CrawlMetrics(path, interval=3600)
+    metrics.progress('A', 1)
+    metrics.progress('A', 2)
+    metrics.write()
+    with open(path) as file:
+        lines = [json.loads(line) for line in file]
+    assert [line['pages_done'] for line in lines] == [1, 2]
+    assert lines[-1]['categories']['A']['pages_done'] == 2
+
+
+def test_write_prometheus(tmp_path):
+    '''
+    Check that the metrics are written in the Prometheus text format, with cumulative histogram
+    buckets and escaped labels.
+    '''
+    path = str(tmp_path / 'crawl.prom')
+    metrics = CrawlMetrics(path)
+    metrics.record_request({'gcmtitle': 'Category:A'}, 0.2, {'query': {}}, 'Say "hi"')
+    metrics.record_request({'gcmtitle': 'Category:A'}, 7.0, {'query': {}}, 'Say "hi"')
+    metrics.progress('Say "hi"', 3, 3)
+    metrics.write()
+    with open(path) as file:
+        lines = file.read().splitlines()
+    assert 'wiki_crawl_requests_total 2' in lines
+    assert '# TYPE wiki_crawl_request_duration_seconds histogram' in lines
+    assert 'wiki_crawl_request_duration_seconds_bucket{le="0.25"} 1' in lines
+    assert 'wiki_crawl_request_duration_seconds_bucket{le="10.0"} 2' in lines
+    assert 'wiki_crawl_request_duration_seconds_bucket{le="+Inf"} 2' in lines
+    assert 'wiki_crawl_request_duration_seconds_count 2' in lines
+    assert 'wiki_crawl_eta_seconds 0.0' in lines
+    assert 'wiki_crawl_category_pages_done{category="Say \\"hi\\""} 3' in lines
+    assert sum(line.startswith('# TYPE wiki_crawl_category_pages_done ') for line in lines) == 1
@@ -0,0 +1,108 @@
+'''
+Test that the page view store answers queries the same way as the page view dictionaries.
+'''
+import datetime
+import pickle
+
+import numpy as np
+import pytest
+
+from pageviews import PageviewStore
+from storage import save_dataset
+
+DATA = {
+    'A': {'total_views': 16, 'pageviews': {'2021-03-01': 1, '2021-03-02': 2, '2021-03-04': 13}},
+    'B': {'total_views': 30, 'pageviews': {'2021-03-01': 10, '2021-03-02': None,
+                                           '2021-03-03': 20}},
+    'C': {'total_views': 0, 'pageviews': {}},
+}
+
+with open('data/billionairesdict.pkl', 'rb') as file:
+    FULL_DATASET = pickle.load(file)
+
+
+def dict_total(data, start='0000-00-00', end='9999-99-99'):
+    '''
+    Totals each page's views between two dates the slow way, for comparison.
+    '''
+    return [sum(views for date, views in entry['pageviews'].items()
+                if views is not None and start <= date <= end) for entry in data.values()]
+
+
+def test_from_dict():
+    '''
+    Check that the store holds the same views as the dictionaries, and can be converted back.
+    '''
+    store = PageviewStore.from_dict(DATA)
+    assert store.titles == ['A', 'B', 'C']
+    assert np.datetime_as_string(store.dates).tolist() == [
+        '2021-03-01', '2021-03-02', '2021-03-03', '2021-03-04']
+    assert store.views.tolist() == [[1, 10, 0], [2, 0, 0], [0, 20, 0], [13, 0, 0]]
+    assert store.mask[:, 1].tolist() == [True, False, True, False]
+    assert store.to_dict() == {'A': DATA['A']['pageviews'],
+                               'B': {'2021-03-01': 10, '2021-03-03': 20}, 'C': {}}
+
+
+@pytest.mark.parametrize('start,end', [
+    (None, None),
+    ('2021-03-02', '2021-03-03'),
+    ('2021-02-01', '2021-03-01'),
+    ('2021-03-05', None),
+    (datetime.date(2021, 3, 3), np.datetime64('2021-03-04')),
+])
+def test_total(start, end):
+    '''
+    Check that totals over a range of dates match totaling the dictionaries.
+    '''
+    store = PageviewStore.from_dict(DATA)
+    expected = dict_total(DATA, str(start or '0000-00-00'), str(end or '9999-99-99'))
+    assert store.total(start, end).tolist() == expected
+
+
+def test_recent_views():
+    '''
+    Check the queries over the most recent days.
+    '''
+    store = PageviewStore.from_dict(DATA)
+    assert store.last(1).tolist() == [13, 0, 0]
+    assert store.last(2).tolist() == [13, 20, 0]
+    assert store.rolling(2).tolist() == [[1, 10, 0], [3, 10, 0], [2, 20, 0], [13, 20, 0]]
+    growth = store.growth(2)
+    assert growth[:2].tolist() == [(13 - 3) / 3, (20 - 10) / 10]
+    assert np.isnan(growth[2])
+    assert store.rank() == [('B', 30), ('A', 16), ('C', 0)]
+    assert store.rank(num_days=1, num_results=2) == [('A', 13), ('B', 0)]
+    assert PageviewStore.from_dict({}).last(7).tolist() == []
+
+
+def test_rolling_gaps():
+    '''
+    Check that rolling windows cover calendar days, even when some days are missing.
+    '''
+    data = {'A': {'total_views': 7, 'pageviews': {'2021-03-01': 1, '2021-03-02': 2,
+                                                  '2021-03-05': 4}}}
+    store = PageviewStore.from_dict(data)
+    # 2021-03-03 and 2021-03-04 aren't in the store, so the last window only holds 2021-03-05
+    assert store.rolling(2).tolist() == [[1], [3], [4]]
+    assert store.rolling(4)[-1].tolist() == store.total('2021-03-02', '2021-03-05').tolist() == [6]
+
+
+def test_full_dataset(tmp_path):
+    '''
+    Check the store against a real dataset, built from the dictionaries and loaded from a bundle.
+    '''
+    store = PageviewStore.from_dict(FULL_DATASET)
+    assert store.total().tolist() == [entry['total_views'] for entry in FULL_DATASET.values()]
+    last_date = max(date for entry in FULL_DATASET.values() for date in entry['pageviews'])
+    week_start = str(np.datetime64(last_date) - 6)
+    assert store.last(7).tolist() == dict_total(FULL_DATASET, week_start)
+
+    path = str(tmp_path / 'data.npz')
+    save_dataset(FULL_DATASET, path)
+    loaded = PageviewStore.load(path, top=50)
+    expected = sorted(FULL_DATASET, key=lambda title: FULL_DATASET[title]['total_views'],
+                      reverse=True)[:50]
+    assert loaded.titles == expected
+    assert loaded.to_dict() == {title: {date: views for date, views
+                                        in FULL_DATASET[title]['pageviews'].items()
+                                        if views is not None} for title in expected}
@@ -0,0 +1,109 @@
+'''
+Test that the network plot traces are built properly.
+'''
+import numpy as np
+
+import plots_config
+from plotting import (cap_labels, decimate_edges, edge_segments, network_figure, network_traces,
+                      scatter_trace)
+
+COORDS = np.array([[0.0, 1.0, 2.0], [3.0, 4.0, 5.0], [6.0, 7.0, 8.0]])
+EDGES = np.array([[0, 1], [2, 0]], dtype=np.int32)
+
+
+def test_edge_segments():
+    '''
+    Check that the segments match the coordinates the notebook built one edge at a time.
+    '''
+    expected = []
+    for source, target in EDGES.tolist():
+        expected += [COORDS[source].tolist(), COORDS[target].tolist(), [None] * 3]
+    segments = edge_segments(COORDS, EDGES)
+    assert segments.shape == (6, 3)
+    assert [[None if np.isnan(value) else value for value in row]
+            for row in segments.tolist()] == expected
+    assert edge_segments(COORDS, np.zeros((0, 2))).shape == (0, 3)
+
+
+def test_network_traces():
+    '''
+    Check that the traces use the plot config without changing it.
+    '''
+    original = repr(plots_config.network_plot_config)
+    edge_trace, node_trace = network_traces(COORDS, EDGES, views=[1000, 100, 10],
+                                            labels=['A', 'B', 'C'])
+    assert repr(plots_config.network_plot_config) == original
+    assert edge_trace.mode == 'lines'
+    assert len(edge_trace.x) == 6 and np.isnan(edge_trace.x[2])
+    assert node_trace.mode == 'markers'
+    assert list(node_trace.x) == [0.0, 3.0, 6.0]
+    assert list(node_trace.marker.color) == [3.0, 2.0, 1.0]
+    assert list(node_trace.text) == ['A', 'B', 'C']
+
+
+def test_network_figure():
+    '''
+    Check that the figure has both traces and the title can be changed.
+    '''
+    figure = network_figure(COORDS, EDGES, title='Test')
+    assert len(figure.data) == 2
+    assert figure.layout.title.text == 'Test'
+    assert figure.layout.scene.xaxis.showgrid is False
+
+
+def test_decimate_edges():
+    '''
+    Check that only the heaviest edges are kept (or an even sample, without weights), in order.
+    '''
+    edges = np.arange(20).reshape(10, 2)
+    assert decimate_edges(edges, None).tolist() == list(range(10))
+    assert decimate_edges(edges, 10).tolist() == list(range(10))
+    weights = np.array([1, 9, 3, 9, 5, 2, 7, 0, 9, 4])
+    assert decimate_edges(edges, 4, weights).tolist() == [1, 3, 6, 8]
+    assert decimate_edges(edges, 4).tolist() == [0, 3, 6, 9]
+
+
+def test_network_traces_large():
+    '''
+    Check that large network plots keep the links between the most viewed pages when no edge
+    weights are given.
+    '''
+    coords = np.arange(12, dtype=np.float64).reshape(4, 3)
+    edges = np.array([[0, 1], [2, 3], [1, 2], [3, 0]])
+    large_config = dict(plots_config.large_plot_config, max_edges=2)
+    edge_trace, _ = network_traces(coords, edges, views=[1, 100, 50, 2],
+                                   large_config=large_config)
+    # the links 1-2 and 0-1 have the most views between their pages
+    assert np.asarray(edge_trace.x)[[0, 1, 3, 4]].tolist() == [0.0, 3.0, 3.0, 6.0]
+    edge_trace, _ = network_traces(coords, edges, large_config=large_config)
+    # without page views, an even sample of the links is drawn
+    assert np.asarray(edge_trace.x)[[0, 1, 3, 4]].tolist() == [0.0, 3.0, 9.0, 0.0]
+
+
+def test_cap_labels():
+    '''
+    Check that hover text is shortened, and only kept for the most viewed points.
+    '''
+    labels = ['a', 'bbbbbb', 'cc', 'd']
+    assert cap_labels(labels) == labels
+    assert cap_labels(labels, max_length=4) == ['a', 'bbb…', 'cc', 'd']
+    assert cap_labels(labels, views=[1, 5, 3, 5], max_points=2) == ['', 'bbbbbb', '', 'd']
+    assert cap_labels(labels, max_points=3) == ['a', 'bbbbbb', 'cc', '']
+
+
+def test_large_plots():
+    '''
+    Check that large plots switch to WebGL and only draw some of the edges.
+    '''
+    large_config = dict(plots_config.large_plot_config, webgl_threshold=2, max_edges=1,
+                        max_hover_points=2)
+    assert type(scatter_trace([1, 2], [3, 4], large_config=large_config)).__name__ == 'Scatter'
+    trace = scatter_trace([1, 2, 3], [3, 5, 4], ['A', 'B', 'C'], large_config=large_config)
+    assert type(trace).__name__ == 'Scattergl'
+    assert list(trace.text) == ['', 'B', 'C']
+
+    edge_trace, node_trace = network_traces(COORDS, EDGES, views=[1, 2, 3], labels=['A', 'B', 'C'],
+                                            weights=[1, 3], large_config=large_config)
+    assert list(edge_trace.x[:2]) == [6.0, 0.0]
+    assert len(edge_trace.x) == 3
+    assert list(node_trace.text) == ['', 'B', 'C']
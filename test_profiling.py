@@ -0,0 +1,114 @@
+'''
+Test that traced functions are profiled properly, and only inside profile() blocks.
+'''
+import pytest
+
+from get_data import format_data
+from helpers import dict_to_nodes, trim_dict
+from profiling import load_records, profile, summarize, traced
+
+
+@traced()
+def allocate(num_bytes):
+    '''
+    Allocate a block of memory and return it.
+    '''
+    return bytearray(num_bytes)
+
+
+@traced(name='outer')
+def allocate_twice(num_bytes):
+    '''
+    Allocate and free a block of memory inside a traced call, then allocate a smaller one.
+    '''
+    allocate(num_bytes)
+    return allocate(num_bytes // 4)
+
+
+@traced()
+def fail(values):
+    '''
+    Raise an error.
+    '''
+    raise ValueError('Simulated failure')
+
+
+def test_untraced():
+    '''
+    Check that traced functions work the same outside of a profile() block, without being
+    recorded.
+    '''
+    with profile() as profiler:
+        pass
+    assert len(allocate(10)) == 10
+    assert allocate.__name__ == 'allocate'
+    assert profiler.records == []
+
+
+def test_profile_memory():
+    '''
+    Check that time, memory and sizes are recorded for each call, including the peak of calls
+    made inside another traced call.
+    '''
+    with profile() as profiler:
+        allocate_twice(4_000_000)
+    inner_large, inner_small, outer = profiler.records
+    assert [record['function'] for record in profiler.records] == [
+        'allocate', 'allocate', 'outer']
+    assert inner_large['input_size'] is None
+    assert inner_large['output_size'] == 4_000_000
+    assert inner_large['peak_bytes'] >= 4_000_000
+    assert 1_000_000 <= inner_small['allocated_bytes'] < 2_000_000
+    # the large block was freed, but it still counts towards the peak of the outer call
+    assert outer['peak_bytes'] >= 4_000_000
+    assert outer['allocated_bytes'] < 2_000_000
+    assert outer['seconds'] >= inner_large['seconds'] + inner_small['seconds']
+
+
+def test_profile_nested_blocks():
+    '''
+    Check that calls are recorded by every active block, and errors are recorded too.
+    '''
+    with profile(memory=False) as outer:
+        allocate(10)
+        with profile(memory=False) as inner:
+            with pytest.raises(ValueError):
+                fail([1, 2, 3])
+    assert len(outer.records) == 2
+    assert inner.records == outer.records[1:]
+    assert inner.records[0]['error'] == 'ValueError'
+    assert inner.records[0]['input_size'] == 3
+    assert inner.records[0]['allocated_bytes'] is None
+
+
+def test_helpers_profiled(tmp_path):
+    '''
+    Check that the processing functions are traced, and that records written over several runs
+    can be summarized together.
+    '''
+    pages = [{'pageid': i, 'ns': 0, 'title': title,
+              'linkshere': [{'title': link} for link in links],
+              'pageviews': {'2021-02-08': views}}
+             for i, (title, links, views) in enumerate([('Alice', ['Bob'], 3),
+                                                        ('Bob', ['Alice', 'Carol'], 2),
+                                                        ('Carol', ['Alice'], 1)])]
+    path = str(tmp_path / 'profile.jsonl')
+    for _ in range(2):
+        with profile() as profiler:
+            nodes = dict_to_nodes(trim_dict(format_data(pages), 2))
+        profiler.write(path)
+    assert len(nodes['links']) == 2
+
+    summary = profiler.summary()
+    assert set(summary) == {'format_data', 'finish_formatting', 'common_links', 'trim_dict',
+                            'sort_dict', 'dict_to_nodes'}
+    assert summary['format_data']['total_input_size'] == 3
+    assert summary['trim_dict']['total_output_size'] == 2
+    assert summary['dict_to_nodes']['total_output_size'] == 2
+    assert 'dict_to_nodes' in profiler.report()
+
+    combined = summarize(load_records(path))
+    assert combined['common_links']['calls'] == 2
+    assert combined['common_links']['total_seconds'] == pytest.approx(
+        sum(record['seconds'] for record in load_records(path)
+            if record['function'] == 'common_links'))
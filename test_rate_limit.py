@@ -0,0 +1,239 @@
+'''
+Test that the rate limiters for requests to Wikipedia are working properly.
+'''
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import pytest
+
+from rate_limit import (AdaptiveLimiter, AdaptiveWiki, RateLimitedWiki, Throttled, TokenBucket,
+                        TransientError)
+from wiki_client import WikiClient, parse_retry_after
+
+
+def test_token_bucket_spacing():
+    '''
+    Check that a token bucket with a capacity of 1 spaces requests out by 1/rate seconds.
+    '''
+    limiter = TokenBucket(rate=50)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    # the first token is already in the bucket, so 5 waits of 1/50 of a second are needed
+    assert time.monotonic() - start >= 5 / 50 * 0.9
+
+
+def test_token_bucket_burst():
+    '''
+    Check that a token bucket allows a burst up to its capacity without waiting.
+    '''
+    limiter = TokenBucket(rate=1, capacity=5)
+    assert sum(limiter.acquire() for _ in range(5)) == 0
+
+
+def test_token_bucket_shared_between_threads():
+    '''
+    Check that threads sharing a token bucket are limited to its total rate.
+    '''
+    limiter = TokenBucket(rate=100)
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda _: limiter.acquire(), range(21)))
+    assert time.monotonic() - start >= 20 / 100 * 0.9
+
+
+def test_token_bucket_invalid_rate():
+    '''
+    Check that a rate that isn't positive is rejected.
+    '''
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+class EchoWiki:
+    '''
+    Stands in for a MediaWiki instance by returning the parameters it was given.
+    '''
+    api_version = '1.36'
+
+    def wiki_request(self, params):
+        '''
+        Return the request parameters as the response.
+        '''
+        return params
+
+
+def test_rate_limited_wiki():
+    '''
+    Check that a RateLimitedWiki takes a token per request and passes everything else through.
+    '''
+    limiter = TokenBucket(rate=20, capacity=2)
+    wiki = RateLimitedWiki(EchoWiki(), limiter)
+    assert wiki.wiki_request({'a': 1}) == {'a': 1}
+    assert wiki.api_version == '1.36'
+    assert limiter.acquire() == 0
+    assert limiter.acquire() > 0
+
+
+def test_adaptive_limiter():
+    '''
+    Check that the rate goes up after successes and down after being pushed back, within its
+    limits, and that a push back pauses the next request.
+    '''
+    limiter = AdaptiveLimiter(rate=100, min_rate=30, max_rate=110, increase=5, jitter=0)
+    limiter.success()
+    assert limiter.rate == 105
+    limiter.success()
+    limiter.success()
+    assert limiter.rate == 110
+    assert limiter.push_back(retry_after=0.05) == 0.05
+    assert limiter.rate == 55
+    assert limiter.acquire() >= 0.05 * 0.9
+    limiter.push_back(throttled=False)
+    assert limiter.rate == 30
+
+    stats = limiter.stats()
+    assert stats['requests'] == 1
+    assert stats['successes'] == 3
+    assert (stats['retries'], stats['throttled'], stats['errors']) == (2, 1, 1)
+    assert stats['sleep_time'] >= 0.05 * 0.9
+    assert stats['requests_per_second'] > 0
+
+
+def test_adaptive_limiter_backoff():
+    '''
+    Check that pauses without a Retry-After double with each failure in a row, with jitter on
+    top, and start over after a success.
+    '''
+    limiter = AdaptiveLimiter(rate=1, backoff=1, max_backoff=3, jitter=0.5, seed=0)
+    pauses = [limiter.push_back() for _ in range(3)]
+    assert 1 <= pauses[0] <= 1.5 and 2 <= pauses[1] <= 3 and 3 <= pauses[2] <= 4.5
+    limiter.success()
+    assert limiter.push_back() <= 1.5
+
+
+@pytest.mark.parametrize('value,seconds', [(None, None), ('5', 5.0), ('0', 0.0), ('-1', 0.0),
+                                           ('Wed, 21 Oct 2015 07:28:00 GMT', None)])
+def test_parse_retry_after(value, seconds):
+    '''
+    Check that Retry-After headers in seconds are read, and other values are ignored.
+
+    Args:
+        value: The value of the header.
+        seconds: The number of seconds that should be read from it.
+    '''
+    assert parse_retry_after(value) == seconds
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    '''
+    Answers requests to the fake API with the server's scripted responses in order, then with a
+    normal response once they run out.
+    '''
+
+    def do_GET(self):
+        '''
+        Record the request parameters and send the next response.
+        '''
+        params = dict(parse_qsl(urlparse(self.path).query))
+        self.server.requests.append(params)
+        if self.server.script:
+            status, headers, body = self.server.script.pop(0)
+        else:
+            status, headers, body = 200, {}, {'query': {'pages': [{'title': params['titles']}]}}
+        encoded = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, *args):
+        '''
+        Keep the test output quiet.
+        '''
+
+
+@pytest.fixture
+def fake_api():
+    '''
+    Runs a local fake of the Wikipedia API that can be scripted to throttle or fail requests.
+    '''
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeAPIHandler)
+    server.requests = []
+    server.script = []
+    server.url = f'http://127.0.0.1:{server.server_address[1]}/w/api.php'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+MAXLAG_ERROR = {'error': {'code': 'maxlag', 'info': 'Waiting for a database server: 7 seconds '
+                                                    'lagged.', 'lag': 7}}
+
+
+def test_adaptive_wiki_retries(fake_api):
+    '''
+    Check that requests are retried through throttling and server errors, and that every kind
+    of push back is counted.
+    '''
+    fake_api.script = [
+        (429, {'Retry-After': '0'}, {}),
+        (503, {}, {}),
+        (200, {'Retry-After': '0'}, MAXLAG_ERROR),
+        (500, {}, {}),
+    ]
+    limiter = AdaptiveLimiter(rate=100, backoff=0.01, jitter=0)
+    wiki = AdaptiveWiki(WikiClient(fake_api.url), limiter)
+    assert wiki.wiki_request({'titles': 'Alice'}) == {'query': {'pages': [{'title': 'Alice'}]}}
+    assert len(fake_api.requests) == 5
+    assert all(request['maxlag'] == '5' and request['format'] == 'json'
+               for request in fake_api.requests)
+    stats = limiter.stats()
+    assert (stats['retries'], stats['throttled'], stats['errors']) == (4, 3, 1)
+    assert stats['successes'] == 1
+    assert limiter.rate < 100
+
+
+def test_adaptive_wiki_gives_up(fake_api):
+    '''
+    Check that a request is only retried max_retries times.
+    '''
+    fake_api.script = [(429, {'Retry-After': '0'}, {})] * 3
+    wiki = AdaptiveWiki(WikiClient(fake_api.url), AdaptiveLimiter(rate=100, jitter=0),
+                        max_retries=2)
+    with pytest.raises(Throttled):
+        wiki.wiki_request({'titles': 'Alice'})
+    assert len(fake_api.requests) == 3
+
+
+def test_adaptive_wiki_maxlag_response():
+    '''
+    Check that maxlag errors are retried for clients that return them instead of raising, like
+    MediaWiki.
+    '''
+    responses = [MAXLAG_ERROR, {'query': {}}]
+    limiter = AdaptiveLimiter(rate=100, max_backoff=0.01, jitter=0)
+    wiki = AdaptiveWiki(EchoWiki(), limiter)
+    wiki.wiki.wiki_request = lambda params: responses.pop(0)
+    assert wiki.wiki_request({}) == {'query': {}}
+    assert limiter.throttled == 1
+
+
+def test_wiki_client_connection_error():
+    '''
+    Check that a failed connection is reported as a transient error.
+    '''
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeAPIHandler)
+    url = f'http://127.0.0.1:{server.server_address[1]}/w/api.php'
+    server.server_close()
+    with pytest.raises(TransientError):
+        WikiClient(url, timeout=1).wiki_request({'titles': 'Alice'})
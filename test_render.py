@@ -0,0 +1,91 @@
+'''
+Test that figures are rendered from a dataset, and skipped when nothing has changed.
+'''
+import os
+import json
+import pickle
+
+import pytest
+
+import render
+
+pytest.importorskip('igraph')
+pytest.importorskip('matplotlib')
+
+DATA = {
+    'Jane Doe': {'pageid': 1, 'total_views': 300, 'pageviews': {'2021-01-01': 300},
+                 'linkshere': ['John Doe', 'Other'], 'linkshere_within_category': ['John Doe']},
+    'John Doe': {'pageid': 2, 'total_views': 200, 'pageviews': {'2021-01-01': 200},
+                 'linkshere': ['Jane Doe'], 'linkshere_within_category': ['Jane Doe']},
+    'Bob': {'pageid': 3, 'total_views': 50, 'pageviews': {'2021-01-01': 50},
+            'linkshere': ['Jane Doe', 'Alice'], 'linkshere_within_category': ['Jane Doe']},
+    # a page without any views has no area in the treemap
+    'Nobody': {'pageid': 5, 'total_views': 0, 'pageviews': {'2021-01-01': None},
+               'linkshere': ['Bob'], 'linkshere_within_category': ['Bob']},
+}
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    '''
+    Saves the test dataset, and returns its path.
+    '''
+    path = tmp_path / 'testdict.pkl'
+    with open(path, 'wb') as file:
+        pickle.dump(DATA, file)
+    return str(path)
+
+
+def test_render(tmp_path, data_path, monkeypatch):
+    '''
+    Check that every figure is rendered once, and only rendered again when its inputs change.
+    '''
+    output_dir = str(tmp_path / 'figures')
+    results = render.render(data_path, output_dir, max_workers=1)
+    assert all(rendered for _, rendered in results.values())
+    for figure, suffix in render.OUTPUT_SUFFIXES.items():
+        assert results[figure][0] == os.path.join(output_dir, 'testdict' + suffix)
+        assert os.path.getsize(results[figure][0]) > 0
+    with open(os.path.join(output_dir, render.MANIFEST_NAME)) as file:
+        assert len(json.load(file)) == 3
+
+    rendered = []
+    original_render_figure = render.render_figure
+
+    def record_render_figure(figure, *args):
+        rendered.append(figure)
+        return original_render_figure(figure, *args)
+    monkeypatch.setattr(render, 'render_figure', record_render_figure)
+
+    results = render.render(data_path, output_dir, max_workers=1)
+    assert not any(rendered for _, rendered in results.values())
+    assert rendered == []
+
+    # changing an option only renders the figures that use it
+    render.render(data_path, output_dir, num_nodes=2, max_workers=1)
+    assert rendered == ['network']
+
+    # changing the plot config renders the figures that use it
+    monkeypatch.setitem(render.plots_config.scatter_plot_config, 'marker_size', 5)
+    render.render(data_path, output_dir, num_nodes=2, max_workers=1)
+    assert rendered == ['network', 'scatter']
+    monkeypatch.setitem(render.plots_config.treemap_config, 'colormap', 'viridis')
+    render.render(data_path, output_dir, num_nodes=2, max_workers=1)
+    assert rendered == ['network', 'scatter', 'treemap']
+
+    # changing the data renders everything
+    with open(data_path, 'wb') as file:
+        pickle.dump(dict(DATA, Alice={**DATA['Bob'], 'pageid': 4}), file)
+    render.render(data_path, output_dir, num_nodes=2, max_workers=1)
+    assert rendered == ['network', 'scatter', 'treemap', 'network', 'scatter', 'treemap']
+
+
+def test_render_processes(tmp_path, data_path):
+    '''
+    Check that rendering figures in several processes gives the same files.
+    '''
+    output_dir = str(tmp_path / 'figures')
+    render.main(['render.py', data_path, '-o', output_dir, '-j', '2', '-f', 'scatter',
+                 'treemap'])
+    assert sorted(os.listdir(output_dir)) == [
+        render.MANIFEST_NAME, 'testdict_scatter.html', 'testdict_treemap.png']
@@ -0,0 +1,172 @@
+'''
+Test that the snapshot store saves, rebuilds and compares crawls properly.
+'''
+import pickle
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from snapshots import SnapshotStore, apply_delta, main, make_delta
+
+
+OLD = {
+    'Alice': {'linkshere': ['Bob', 'Outside', 'Carol'], 'pageid': 1, 'total_views': 3,
+              'pageviews': {'2021-02-06': 1, '2021-02-07': 2},
+              'linkshere_within_category': ['Bob', 'Carol']},
+    'Bob': {'linkshere': ['Alice'], 'pageid': 2, 'total_views': 5,
+            'pageviews': {'2021-02-06': 5, '2021-02-07': None},
+            'linkshere_within_category': ['Alice']},
+    'Carol': {'linkshere': ['Alice', 'Bob'], 'pageid': 3, 'total_views': 0, 'pageviews': {},
+              'linkshere_within_category': ['Alice', 'Bob']},
+}
+
+NEW = {
+    'Dave': {'linkshere': ['Alice'], 'pageid': 4, 'total_views': 4,
+             'pageviews': {'2021-02-08': 4}, 'linkshere_within_category': ['Alice']},
+    'Alice': {'linkshere': ['Outside', 'Bob', 'Dave'], 'pageid': 1, 'total_views': 9,
+              'pageviews': {'2021-02-07': 2, '2021-02-08': 7},
+              'linkshere_within_category': ['Bob', 'Dave']},
+    'Bob': {'linkshere': ['Alice'], 'pageid': 2, 'total_views': 8,
+            'pageviews': {'2021-02-07': 3, '2021-02-08': 5},
+            'linkshere_within_category': ['Alice']},
+}
+
+
+def test_delta():
+    '''
+    Check that a delta holds only what changed, and turns the old crawl into the new one.
+    '''
+    delta = make_delta(OLD, NEW)
+    assert list(delta['added']) == ['Dave']
+    assert delta['removed'] == ['Carol']
+    within = delta['links']['linkshere_within_category']
+    assert within['added'] == {'Dave': ['Alice'], 'Alice': ['Dave']}
+    assert within['removed'] == {'Carol': ['Alice', 'Bob'], 'Alice': ['Carol']}
+    assert within['lists'] == {}
+    # 'Outside' and 'Bob' swapped places, so the whole list has to be saved
+    assert delta['links']['linkshere']['lists'] == {'Alice': ['Outside', 'Bob', 'Dave']}
+    assert delta['pageviews']['Alice'] == ({'2021-02-08': 7}, ['2021-02-06'])
+    assert delta['pageviews']['Bob'] == ({'2021-02-07': 3, '2021-02-08': 5}, ['2021-02-06'])
+    assert delta['values'] == {'Alice': {'total_views': 9}, 'Bob': {'total_views': 8}}
+    assert delta['titles'] == ['Dave', 'Alice', 'Bob']
+
+    rebuilt = apply_delta({title: dict(entry) for title, entry in OLD.items()}, delta)
+    assert rebuilt == NEW
+    assert list(rebuilt) == list(NEW)
+    assert make_delta(NEW, NEW)['titles'] is None
+
+
+def evolve(data, day, rng):
+    '''
+    Make the next weekly crawl of a random category: remove and add a few pages, change some
+    links, and move the page views forward a week.
+    '''
+    titles = [title for title in data if rng.random() > 0.1]
+    titles += [f'Page {day}-{i}' for i in range(rng.randint(0, 4))]
+    dates = [(date(2021, 1, 1) + timedelta(days=day - i)).isoformat() for i in range(14)]
+    new = {}
+    for title in titles:
+        old_links = data.get(title, {}).get('linkshere', [])
+        links = [link for link in old_links if rng.random() > 0.2]
+        links += rng.sample(titles + ['Outside 1', 'Outside 2'], rng.randint(0, 3))
+        if rng.random() < 0.2:
+            rng.shuffle(links)
+        links = list(dict.fromkeys(link for link in links if link != title))
+        pageviews = {day: rng.choice([None, rng.randint(0, 100)]) for day in reversed(dates)}
+        new[title] = {'linkshere': links, 'pageid': len(title), 'pageviews': pageviews,
+                      'total_views': sum(views for views in pageviews.values() if views)}
+    for entry in new.values():
+        entry['linkshere_within_category'] = [link for link in entry['linkshere'] if link in new]
+    return new
+
+
+def edges(data):
+    '''
+    Get the set of links within the category of a crawl, as (title, linking title) tuples.
+    '''
+    return {(title, link) for title, entry in data.items()
+            for link in entry['linkshere_within_category']}
+
+
+@pytest.fixture
+def crawls():
+    '''
+    A series of random weekly crawls of a category.
+    '''
+    rng = random.Random(0)
+    series = [evolve({f'Start {i}': {} for i in range(20)}, 0, rng)]
+    for week in range(1, 7):
+        series.append(evolve(series[-1], 7 * week, rng))
+    return series
+
+
+def test_snapshot_store(tmp_path, crawls):
+    '''
+    Check that every snapshot is rebuilt exactly, including after reopening the store, and that
+    only every few snapshots are saved in full.
+    '''
+    store = SnapshotStore(str(tmp_path / 'snapshots'), keyframe_interval=3)
+    for index, data in enumerate(crawls):
+        assert store.add(data) == index
+    assert [info['keyframe'] for info in store.snapshots()] == [
+        True, False, False, True, False, False, True]
+    assert store.snapshots()[-1]['date'] == max(day for entry in crawls[-1].values()
+                                                for day in entry['pageviews'])
+
+    reopened = SnapshotStore(str(tmp_path / 'snapshots'))
+    assert len(reopened) == len(crawls)
+    for index, data in enumerate(crawls):
+        loaded = reopened.load(index)
+        assert loaded == data
+        assert list(loaded) == list(data)
+    assert reopened.load() == crawls[-1]
+
+    with pytest.raises(ValueError):
+        store.add(crawls[0])
+
+
+def test_snapshot_diff(tmp_path, crawls):
+    '''
+    Check that differences found from the deltas match the ones between the full crawls, and
+    that snapshots can be found by date.
+    '''
+    store = SnapshotStore(str(tmp_path / 'snapshots'), keyframe_interval=3)
+    for data in crawls:
+        store.add(data)
+
+    for start, end in ((0, 6), (1, 4), (2, 3), (5, 5)):
+        changes = store.diff(start, end)
+        assert changes['edges_gained'] == edges(crawls[end]) - edges(crawls[start])
+        assert changes['edges_lost'] == edges(crawls[start]) - edges(crawls[end])
+        assert changes['pages_added'] == set(crawls[end]) - set(crawls[start])
+        assert changes['pages_removed'] == set(crawls[start]) - set(crawls[end])
+
+    dates = [info['date'] for info in store.snapshots()]
+    assert store.index_of(dates[2]) == 2
+    day_after = (date.fromisoformat(dates[2]) + timedelta(days=1)).isoformat()
+    assert store.index_of(day_after) == 2
+    assert store.diff(day_after) == store.diff(2)
+    assert store.index_of(-1) == 6
+    with pytest.raises(IndexError):
+        store.index_of('2000-01-01')
+    with pytest.raises(IndexError):
+        store.index_of(7)
+    with pytest.raises(ValueError):
+        store.diff(3, 1)
+
+
+def test_main(tmp_path, capsys):
+    '''
+    Check that snapshots can be added and compared from the command line.
+    '''
+    path = str(tmp_path / 'snapshots')
+    for name, data in (('old', OLD), ('new', NEW)):
+        with open(tmp_path / f'{name}.pkl', 'wb') as file:
+            pickle.dump(data, file)
+        main(['snapshots.py', path, '-a', str(tmp_path / f'{name}.pkl')])
+    capsys.readouterr()
+    main(['snapshots.py', path, '-s', '0'])
+    output = capsys.readouterr().out
+    assert 'Links gained: 2, lost: 3' in output
+    assert '  + Dave -> Alice' in output
@@ -0,0 +1,132 @@
+'''
+Test that the results of processing stages are cached properly.
+'''
+import pickle
+
+import pytest
+
+from helpers import common_links, dict_to_nodes, trim_dict
+from stage_cache import StageCache, content_hash, file_hash, run_pipeline, stage_key
+from test_helpers import COMMON_LINKS_CASES
+
+RAW_DICT = COMMON_LINKS_CASES[1][0]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    '''
+    Opens an empty stage cache, and closes it after the test.
+    '''
+    stage_cache = StageCache(str(tmp_path / 'stages.sqlite'))
+    yield stage_cache
+    stage_cache.close()
+
+
+def test_run(cache):
+    '''
+    Check that a stage only runs once for the same input and parameters.
+    '''
+    calls = []
+
+    def stage(values, scale=1):
+        calls.append(scale)
+        return [value * scale for value in values]
+
+    assert cache.run('scale', stage, ([1, 2],), {'scale': 2})[0] == [2, 4]
+    result, key = cache.run('scale', stage, ([1, 2],), {'scale': 2})
+    assert result == [2, 4]
+    assert key == stage_key('scale', content_hash(([1, 2],)), {'scale': 2})
+    assert calls == [2]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.run('scale', stage, ([1, 2],), {'scale': 3})
+    cache.run('scale', stage, ([1, 3],), {'scale': 3})
+    assert calls == [2, 3, 3]
+    # a key from an earlier stage can stand in for hashing the input
+    cache.run('scale', stage, ([1, 3],), {'scale': 3}, input_key=key)
+    cache.run('scale', stage, ([5, 5],), {'scale': 3}, input_key=key)
+    assert calls == [2, 3, 3, 3]
+
+
+def test_persistence(tmp_path):
+    '''
+    Check that results are kept after closing the cache.
+    '''
+    path = str(tmp_path / 'stages.sqlite')
+    first = StageCache(path)
+    first.run('double', lambda value: value * 2, (21,))
+    first.close()
+    second = StageCache(path)
+    assert second.run('double', pytest.fail, (21,))[0] == 42
+    assert second.size() > 0
+    second.close()
+
+
+def test_invalidate(cache):
+    '''
+    Check that results can be removed by stage, by key or all at once.
+    '''
+    _, key = cache.run('a', str, (1,))
+    cache.run('a', str, (2,))
+    cache.run('b', str, (1,))
+    assert len(cache) == 3
+    assert cache.invalidate(key=key) == 1
+    assert cache.invalidate(stage='a') == 1
+    assert len(cache) == 1
+    assert cache.invalidate() == 1
+    assert len(cache) == 0 and cache.size() == 0
+
+
+def test_eviction(tmp_path):
+    '''
+    Check that the least recently used results are removed when the cache is too big.
+    '''
+    cache = StageCache(str(tmp_path / 'stages.sqlite'), max_bytes=2500)
+    _, first = cache.run('bytes', bytes, (1000,))
+    _, second = cache.run('bytes', bytes, (1001,))
+    assert cache.get(first)[0]
+    cache.run('bytes', bytes, (1002,))
+    assert cache.get(first)[0]
+    assert not cache.get(second)[0]
+    assert cache.size() <= 2500
+    # results bigger than the whole cache are never stored
+    cache.run('bytes', bytes, (3000,))
+    assert len(cache) == 2
+    cache.close()
+
+
+def test_run_pipeline(tmp_path, cache, monkeypatch):
+    '''
+    Check that the pipeline gives the same results as running the helpers directly, that a
+    second run only reads the result of the last stage, and that earlier results are only
+    loaded when they are needed.
+    '''
+    data_path = str(tmp_path / 'data.pkl')
+    with open(data_path, 'wb') as file:
+        pickle.dump(RAW_DICT, file)
+
+    results = run_pipeline(data_path, cache, length=3, layout=False)
+    assert cache.misses == 3
+    expected = common_links(pickle.loads(pickle.dumps(RAW_DICT)))
+    assert results['data'] == expected
+    assert results['trimmed'] == trim_dict(pickle.loads(pickle.dumps(expected)), 3)
+    assert results['nodes'] == dict_to_nodes(results['trimmed'])
+    assert list(results) == ['data', 'trimmed', 'nodes']
+    assert (cache.hits, cache.misses) == (0, 3)
+
+    read_keys = []
+    get = cache.get
+    monkeypatch.setattr(cache, 'get', lambda key: read_keys.append(key) or get(key))
+    monkeypatch.setattr('storage.load_data', pytest.fail)
+    warm = run_pipeline(data_path, cache, length=3, layout=False)
+    # the dataset returned by common_links isn't read from the cache until it's looked up
+    data_key = stage_key('common_links', file_hash(data_path))
+    assert data_key not in read_keys
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert warm['nodes'] == results['nodes']
+    assert warm == results
+    assert data_key in read_keys
+
+    # a new length only runs the stages after common_links
+    run_pipeline(data_path, cache, length=2, layout=False)
+    assert (cache.hits, cache.misses) == (4, 5)
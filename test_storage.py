@@ -0,0 +1,93 @@
+'''
+Test that saving and loading datasets in the compact format is working properly.
+'''
+import numpy as np
+import pytest
+
+from storage import load_data, load_dataset, save_data, save_dataset
+
+DATASET = {
+    'Mark Sommerville': {
+        'linkshere': ['Jeff Dusek', 'Outside Page'],
+        'pageviews': {'2021-02-06': 849, '2021-02-07': None},
+        'pageid': 1,
+        'total_views': 849,
+        'linkshere_within_category': ['Jeff Dusek']
+    },
+    'John Geddes': {
+        'linkshere': ['Jeff Dusek', 'Mark Sommerville', 'Outside Page'],
+        'pageviews': {'2021-02-07': 904, '2021-02-08': 1000},
+        'pageid': 2,
+        'total_views': 1904,
+        'linkshere_within_category': ['Jeff Dusek', 'Mark Sommerville']
+    },
+    'Jeff Dusek': {
+        'linkshere': [],
+        'pageviews': {},
+        'pageid': 3,
+        'total_views': 0,
+        'linkshere_within_category': []
+    },
+    'Jeff Duseké': {
+        'linkshere': ['John Geddes'],
+        'pageviews': {'2021-02-06': 849},
+        'pageid': 4,
+        'total_views': 849,
+        'linkshere_within_category': ['John Geddes']
+    },
+}
+
+
+@pytest.mark.parametrize('filename', ['data.npz', 'data.pkl'])
+def test_round_trip(tmp_path, filename):
+    '''
+    Check that a saved dataset is loaded back exactly, in its original order.
+
+    Args:
+        filename: The name of the file to save to, which picks the format.
+    '''
+    path = str(tmp_path / filename)
+    save_data(DATASET, path)
+    loaded = load_data(path)
+    assert loaded == DATASET
+    assert list(loaded) == list(DATASET)
+
+
+def test_load_top(tmp_path):
+    '''
+    Check that loading only the most viewed pages returns them in descending order of views,
+    keeping the original order for ties.
+    '''
+    path = str(tmp_path / 'data.npz')
+    save_dataset(DATASET, path)
+    loaded = load_dataset(path, top=3)
+    assert list(loaded) == ['John Geddes', 'Mark Sommerville', 'Jeff Duseké']
+    assert loaded['John Geddes'] == DATASET['John Geddes']
+    assert load_dataset(path, top=0) == {}
+    assert load_dataset(path, top=10) == DATASET
+
+
+def test_load_columns(tmp_path):
+    '''
+    Check that loading only some columns leaves the others out.
+    '''
+    path = str(tmp_path / 'data.npz')
+    save_dataset(DATASET, path)
+    loaded = load_dataset(path, top=1, columns=['total_views', 'linkshere_within_category'])
+    assert loaded == {'John Geddes': {'total_views': 1904,
+                                      'linkshere_within_category': ['Jeff Dusek',
+                                                                    'Mark Sommerville']}}
+    with pytest.raises(ValueError):
+        load_dataset(path, columns=['views'])
+
+
+def test_load_compressed(tmp_path):
+    '''
+    Check that bundles saved with compression (whose arrays can't be memory-mapped) still load.
+    '''
+    path = str(tmp_path / 'data.npz')
+    save_dataset(DATASET, path)
+    with np.load(path) as bundle:
+        np.savez_compressed(str(tmp_path / 'compressed.npz'), **bundle)
+    assert load_dataset(str(tmp_path / 'compressed.npz')) == DATASET
+    assert load_dataset(str(tmp_path / 'compressed.npz'), top=3) == load_dataset(path, top=3)
@@ -0,0 +1,103 @@
+'''
+Test that the treemap is laid out properly.
+'''
+import numpy as np
+import pytest
+
+from treemap import (OTHERS_LABEL, plot_treemap, squarify_rects, treemap_colors,
+                     treemap_data)
+
+squarify = pytest.importorskip('squarify')
+
+DATA = {
+    'A B': {'total_views': 5},
+    'C': {'total_views': 40},
+    'D': {'total_views': 10},
+    'E': {'total_views': 40},
+    'F': {'total_views': 1},
+}
+
+
+@pytest.mark.parametrize('values', [
+    [6, 6, 4, 3, 2, 2, 1],
+    [100],
+    np.sort(np.random.default_rng(0).lognormal(8, 2, 2000))[::-1],
+    np.sort(np.random.default_rng(1).integers(1, 5, 500))[::-1],
+])
+def test_squarify_rects(values):
+    '''
+    Check that the rectangles match the squarify library's.
+    '''
+    for dx, dy in ((100, 100), (160, 90)):
+        normalized = squarify.normalize_sizes(list(values), dx, dy)
+        expected = [[rect['x'], rect['y'], rect['dx'], rect['dy']]
+                    for rect in squarify.squarify(normalized, 0, 0, dx, dy)]
+        assert np.allclose(squarify_rects(values, dx=dx, dy=dy), expected)
+
+
+@pytest.mark.parametrize('values', [
+    np.sort(np.random.default_rng(seed).zipf(1.1, 3000).astype(np.float64))[::-1]
+    for seed in range(5)
+] + [[1e300, 1e-10, 1e-300], [1e308, 1e308, 1], [1e200] + [1] * 50])
+def test_squarify_rects_skewed(values):
+    '''
+    Check that very skewed values (where the smallest rectangles are far too small to see) are
+    laid out without errors, filling the whole treemap.
+    '''
+    rects = squarify_rects(values, dx=160, dy=90)
+    assert np.isfinite(rects).all()
+    assert (rects[:, 2:] >= 0).all()
+    assert (rects[:, 2] * rects[:, 3]).sum() == pytest.approx(160 * 90)
+
+
+def test_treemap_data():
+    '''
+    Check that tiles are sorted by views, and the least viewed pages are merged past the limit.
+    '''
+    names, views, others = treemap_data(DATA)
+    assert names == ['C', 'E', 'D', 'A B', 'F']
+    assert views.tolist() == [40, 40, 10, 5, 1]
+    assert others == 0
+
+    names, views, others = treemap_data(DATA, max_tiles=3)
+    assert names == ['C', 'E', f'{OTHERS_LABEL}\n(3 pages)']
+    assert views.tolist() == [40, 40, 16]
+    assert others == 3
+
+    # pages without views would be squares of zero area, which the layout can't divide by
+    names, views, others = treemap_data(dict(DATA, G={'total_views': 0}, H={'total_views': -1}))
+    assert names == ['C', 'E', 'D', 'A B', 'F']
+    assert treemap_data({'G': {'total_views': 0}})[0] == []
+
+
+def test_treemap_colors():
+    '''
+    Check that colors match calling the colormap on each value, like the notebook did.
+    '''
+    import matplotlib
+
+    views = np.array([40, 10, 5, 1])
+    norm = matplotlib.colors.LogNorm(vmin=1, vmax=40)
+    expected = [matplotlib.cm.twilight_shifted(norm(value)) for value in views]
+    assert np.allclose(treemap_colors(views), expected)
+
+
+def test_plot_treemap():
+    '''
+    Check that every tile is drawn in a single collection.
+    '''
+    matplotlib = pytest.importorskip('matplotlib')
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    figure, ax = plt.subplots()
+    plot_treemap(DATA, ax=ax, max_tiles=4, num_labels=2)
+    assert len(ax.collections) == 1
+    assert len(ax.collections[0].get_paths()) == 4
+    assert [text.get_text() for text in ax.texts] == ['C', 'E', f'{OTHERS_LABEL}\n(2 pages)']
+    plt.close(figure)
+
+    figure, ax = plt.subplots()
+    plot_treemap(dict(DATA, G={'total_views': 0}), ax=ax)
+    assert len(ax.collections[0].get_paths()) == len(DATA)
+    plt.close(figure)
@@ -0,0 +1,216 @@
+'''
+A fast treemap of the page views of a category's pages.
+
+The rectangles are laid out with the same squarified algorithm as the squarify library, but each
+row of rectangles is found in a single pass with running sums and placed with NumPy, instead of
+recomputing every rectangle in a row each time one is added. Colors are computed for every page
+at once, and all of the rectangles are drawn as one matplotlib collection. Past a set number of
+pages, the least viewed ones are merged into a single "others" tile.
+
+Authors: Jacob Smilg and Markus Leschly
+'''
+
+import numpy as np
+
+from graph import top_k
+
+
+DEFAULT_MAX_TILES = 2000
+DEFAULT_NUM_LABELS = 29
+DEFAULT_COLORMAP = 'twilight_shifted'
+OTHERS_LABEL = 'Others'
+OTHERS_COLOR = (0.35, 0.35, 0.35, 1.0)
+# the smallest side a row of rectangles is laid out along, as a fraction of the treemap's
+# shorter side
+MIN_SIDE = 1e-12
+
+
+def treemap_data(data, max_tiles=DEFAULT_MAX_TILES):
+    '''
+    Gets the tiles of a treemap of a category: its pages in descending order of total views,
+    with the least viewed pages merged into one tile if there are too many. Pages without any
+    views are left out, since they would have no area.
+
+    Parameters:
+        data: A dictionary of Wikipedia category data as formatted by get_data.py.
+        max_tiles: Optional. An int representing the most tiles to have, including the "others"
+            tile, or None for no limit. Defaults to DEFAULT_MAX_TILES.
+
+    Returns:
+        A tuple of (names, views, others), where names is a list of the name of each tile, views
+        is a float64 array of the total views of each tile, and others is the number of pages
+        merged into the last tile (0 if there is no "others" tile).
+    '''
+    titles = list(data)
+    total_views = np.fromiter((entry['total_views'] for entry in data.values()),
+                              dtype=np.float64, count=len(titles))
+    viewed = total_views > 0
+    if not viewed.all():
+        titles = [title for title, keep in zip(titles, viewed.tolist()) if keep]
+        total_views = total_views[viewed]
+    if max_tiles is None or len(titles) <= max_tiles:
+        order = top_k(total_views)
+        return [titles[i] for i in order.tolist()], total_views[order], 0
+
+    order = top_k(total_views, max_tiles - 1)
+    kept = np.zeros(len(titles), dtype=bool)
+    kept[order] = True
+    others = len(titles) - len(order)
+    names = [titles[i] for i in order.tolist()]
+    names.append(f'{OTHERS_LABEL}\n({others} pages)')
+    views = np.append(total_views[order], total_views[~kept].sum())
+    return names, views, others
+
+
+def squarify_rects(values, x=0.0, y=0.0, dx=100.0, dy=100.0):
+    '''
+    Lays out a squarified treemap, giving the same rectangles as squarify.squarify() on the
+    normalized values.
+
+    Parameters:
+        values: An array of the positive value of each rectangle, in descending order.
+        x: Optional. The x coordinate of the origin. Defaults to 0.
+        y: Optional. The y coordinate of the origin. Defaults to 0.
+        dx: Optional. The width of the treemap. Defaults to 100.
+        dy: Optional. The height of the treemap. Defaults to 100.
+
+    Returns:
+        A float64 array with a row of (x, y, dx, dy) for each rectangle. Rectangles far too small
+        to see (less than MIN_SIDE of the treemap across) may be given no area at all.
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    num_values = len(values)
+    rects = np.zeros((num_values, 4))
+    if num_values == 0:
+        return rects
+    # scale by the largest value first, so the sum of huge values can't overflow
+    values = values / values.max()
+    sizes = values * (dx * dy / values.sum())
+    size_list = sizes.tolist()
+    prefix = np.concatenate([[0.0], np.cumsum(sizes)])
+    min_side = MIN_SIDE * min(dx, dy)
+    min_size = min_side * min_side
+    tiny = np.finfo(np.float64).tiny
+
+    # find each row: keep adding rectangles while it makes the worst aspect ratio in the row
+    # better (or no worse). Since the sizes are in descending order, the worst ratio only
+    # depends on the first and last sizes in the row and the row's total.
+    rows = []
+    start = 0
+    while start < num_values:
+        side = min(dx, dy)
+        largest = size_list[start]
+        # with a very skewed distribution, the space left (or the rest of the rectangles) can
+        # get too small for the aspect ratios to be computed without underflowing. Nothing that
+        # small can be seen, so the rest of the rectangles are left with no area.
+        if side < min_side or largest < min_size:
+            break
+        side_squared = side * side
+        total = largest
+        worst = max(side_squared / largest, largest / side_squared)
+        end = start + 1
+        while end < num_values:
+            new_total = total + size_list[end]
+            squared_total = new_total * new_total
+            new_worst = max(largest * side_squared / squared_total,
+                            squared_total / max(size_list[end] * side_squared, tiny))
+            if worst < new_worst:
+                break
+            total, worst = new_total, new_worst
+            end += 1
+        thickness = total / side
+        rows.append((start, end, dx >= dy, x, y, thickness))
+        if dx >= dy:
+            x, dx = x + thickness, dx - thickness
+        else:
+            y, dy = y + thickness, dy - thickness
+        start = end
+    rects[start:, 0] = x
+    rects[start:, 1] = y
+
+    # place every rectangle from its row
+    starts, ends, columns, xs, ys, thicknesses = (np.array(column) for column in zip(*rows))
+    lengths = ends - starts
+    row_of = np.repeat(np.arange(len(rows)), lengths)
+    thickness = thicknesses[row_of]
+    offset = (prefix[:start] - prefix[starts][row_of]) / thickness
+    length = sizes[:start] / thickness
+    column = columns[row_of]
+    rects[:start, 0] = np.where(column, xs[row_of], xs[row_of] + offset)
+    rects[:start, 1] = np.where(column, ys[row_of] + offset, ys[row_of])
+    rects[:start, 2] = np.where(column, thickness, length)
+    rects[:start, 3] = np.where(column, length, thickness)
+    return rects
+
+
+def treemap_colors(views, colormap=DEFAULT_COLORMAP):
+    '''
+    Colors tiles on a log scale of their views.
+
+    Parameters:
+        views: An array of the views of each tile.
+        colormap: Optional. The name of the matplotlib colormap to use. Defaults to
+            DEFAULT_COLORMAP.
+
+    Returns:
+        A float64 array with a row of RGBA values for each tile.
+    '''
+    import matplotlib
+
+    views = np.maximum(np.asarray(views, dtype=np.float64), 1)
+    if len(views) == 0:
+        return np.zeros((0, 4))
+    norm = matplotlib.colors.LogNorm(vmin=views.min(), vmax=views.max())
+    return matplotlib.colormaps[colormap](norm(views))
+
+
+def plot_treemap(data, ax=None, max_tiles=DEFAULT_MAX_TILES, num_labels=DEFAULT_NUM_LABELS,
+                 colormap=DEFAULT_COLORMAP, text_kwargs=None):
+    '''
+    Draws a treemap of the total views of a category's pages.
+
+    Parameters:
+        data: A dictionary of Wikipedia category data as formatted by get_data.py.
+        ax: Optional. The matplotlib Axes to draw on. Defaults to None, which uses the current
+            Axes.
+        max_tiles: Optional. See treemap_data().
+        num_labels: Optional. An int representing the number of most viewed pages to label.
+            Defaults to DEFAULT_NUM_LABELS.
+        colormap: Optional. See treemap_colors().
+        text_kwargs: Optional. A dictionary of keyword arguments for the labels. Defaults to
+            None, which uses small white text.
+
+    Returns:
+        The matplotlib Axes that was drawn on.
+    '''
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import PolyCollection
+
+    if ax is None:
+        ax = plt.gca()
+    if text_kwargs is None:
+        text_kwargs = {'fontsize': 6, 'color': '#FFFFFF'}
+
+    names, views, others = treemap_data(data, max_tiles)
+    rects = squarify_rects(views)
+    colors = treemap_colors(views[:len(views) - 1] if others else views, colormap)
+    if others:
+        colors = np.vstack([colors, OTHERS_COLOR])
+
+    x, y, dx, dy = rects.T
+    corners = np.stack([np.column_stack([x, y]), np.column_stack([x + dx, y]),
+                        np.column_stack([x + dx, y + dy]), np.column_stack([x, y + dy])], axis=1)
+    ax.add_collection(PolyCollection(corners, facecolors=colors, edgecolors='none'))
+
+    labelled = list(range(min(num_labels, len(names))))
+    if others and len(names) - 1 not in labelled:
+        labelled.append(len(names) - 1)
+    for i in labelled:
+        # put first and last names on separate lines to make the labels cleaner
+        label = names[i] if others and i == len(names) - 1 else names[i].replace(' ', '\n')
+        ax.text(x[i] + dx[i] / 2, y[i] + dy[i] / 2, label, va='center', ha='center',
+                **text_kwargs)
+    ax.set_xlim(0, 100)
+    ax.set_ylim(0, 100)
+    ax.axis('off')
+    return ax
@@ -0,0 +1,112 @@
+'''
+A small client for the Wikipedia API, used in place of a MediaWiki instance when requests are
+adaptively rate limited.
+
+MediaWiki.wiki_request() hides the HTTP status and headers of a response, so there is no way to
+tell that Wikipedia has asked for requests to slow down. This client raises Throttled for those
+responses (along with how long to wait, from the Retry-After header) and TransientError for
+failures worth retrying, so rate_limit.AdaptiveWiki can react to them.
+
+Authors: Jacob Smilg and Markus Leschly
+'''
+
+import requests
+
+from rate_limit import THROTTLE_ERROR_CODES, Throttled, TransientError
+
+
+DEFAULT_API_URL = 'https://en.wikipedia.org/w/api.php'
+DEFAULT_USER_AGENT = 'illuminati-map'
+DEFAULT_TIMEOUT = 30.0  # seconds
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+def parse_retry_after(value):
+    '''
+    Reads a Retry-After header.
+
+    Parameters:
+        value: A string representing the value of the header, or None if there isn't one.
+
+    Returns:
+        A float representing the number of seconds to wait, or None if the header is missing or
+        isn't a number of seconds (such as an HTTP date).
+    '''
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class WikiClient:
+    '''
+    Sends requests to a MediaWiki API with a single requests session.
+
+    Attributes:
+        url: A string representing the URL of the API.
+        timeout: A float representing the number of seconds to wait for a response.
+        session: The requests.Session used to send requests.
+    '''
+
+    def __init__(self, url=DEFAULT_API_URL, user_agent=DEFAULT_USER_AGENT,
+                 timeout=DEFAULT_TIMEOUT):
+        '''
+        Creates a client. No requests are sent until wiki_request() is called.
+
+        Parameters:
+            url: Optional. The URL of the API. Defaults to DEFAULT_API_URL.
+            user_agent: Optional. The User-Agent header to send. Defaults to DEFAULT_USER_AGENT.
+            timeout: Optional. The number of seconds to wait for a response. Defaults to
+                DEFAULT_TIMEOUT.
+        '''
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = user_agent
+
+    def wiki_request(self, params):
+        '''
+        Sends a request to the API, the same way as MediaWiki.wiki_request().
+
+        Parameters:
+            params: A dictionary of API request parameters.
+
+        Returns:
+            A dictionary of the parsed JSON response.
+
+        Raises:
+            Throttled: If the server responded with HTTP 429 or 503, or with a maxlag or
+                ratelimited error.
+            TransientError: If the connection failed or timed out, or the server had an error.
+        '''
+        params = dict(params)
+        params['format'] = 'json'
+        params.setdefault('action', 'query')
+        try:
+            response = self.session.get(self.url, params=params, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as error:
+            raise TransientError(f'Request failed: {error}') from error
+
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if response.status_code in THROTTLE_STATUS_CODES:
+            raise Throttled(f'Wikipedia returned HTTP {response.status_code}', retry_after)
+        if response.status_code >= 500:
+            raise TransientError(f'Wikipedia returned HTTP {response.status_code}')
+        response.raise_for_status()
+        data = response.json()
+        # Wikipedia answers maxlag errors with HTTP 200 and a Retry-After header
+        error = data.get('error', {})
+        if error.get('code') in THROTTLE_ERROR_CODES:
+            if retry_after is None and error.get('lag') is not None:
+                retry_after = float(error['lag'])
+            raise Throttled(f"Wikipedia returned a {error['code']} error: {error.get('info', '')}",
+                            retry_after)
+        return data
+
+    def close(self):
+        '''
+        Closes the session.
+        '''
+        self.session.close()